@@ -0,0 +1,132 @@
+"""
+Mede a latência da busca de produtos (busca.IndiceProdutos) sobre um catálogo
+sintético e compara com a busca por LIKE que o banco faria sem índice de texto.
+
+Os nomes e as descrições são sorteados de um vocabulário com frequências de Zipf,
+como em um catálogo real: poucos termos muito comuns e muitos termos raros. As
+consultas combinam termos completos, um prefixo no último termo e erros de digitação.
+
+Uso (a partir da raiz do repositório):
+
+    python bench/busca.py --produtos 1000000 --consultas 2000
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import busca
+
+SILABAS = ["ba", "ca", "da", "fe", "go", "li", "ma", "no", "pa", "ra", "se", "ti", "vo", "xu", "ze", "lu", "mi", "po", "que", "tra"]
+
+
+def vocabulario(termos, aleatorio):
+    palavras = set()
+    while len(palavras) < termos:
+        palavras.add("".join(aleatorio.choice(SILABAS) for _ in range(aleatorio.randint(2, 5))))
+    palavras = sorted(palavras)
+    aleatorio.shuffle(palavras)
+    # Frequência do termo de posição k proporcional a 1/k
+    acumulado = list(itertools.accumulate(1 / k for k in range(1, termos + 1)))
+    return palavras, acumulado
+
+
+def sorteia(palavras, acumulado, aleatorio, quantidade):
+    return [palavras[bisect.bisect(acumulado, aleatorio.random() * acumulado[-1])] for _ in range(quantidade)]
+
+
+def produtos(total, palavras, acumulado, aleatorio, bloco=50000):
+    for inicio in range(0, total, bloco):
+        yield [
+            (produto_id, " ".join(sorteia(palavras, acumulado, aleatorio, 3)), " ".join(sorteia(palavras, acumulado, aleatorio, 10)), "ATIVO", 0)
+            for produto_id in range(inicio, min(inicio + bloco, total))
+        ]
+
+
+def erro_de_digitacao(termo, aleatorio):
+    i = aleatorio.randrange(len(termo) - 1)
+    return termo[:i] + termo[i + 1] + termo[i] + termo[i + 2:]
+
+
+def consultas(total, palavras, acumulado, aleatorio):
+    geradas = []
+    for i in range(total):
+        termos = sorteia(palavras, acumulado, aleatorio, aleatorio.randint(1, 3))
+        tipo = i % 3
+        if tipo == 1:
+            termos[-1] = termos[-1][:max(3, len(termos[-1]) - 2)]
+        elif tipo == 2:
+            termos[0] = erro_de_digitacao(termos[0], aleatorio)
+        geradas.append(" ".join(termos))
+    return geradas
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--produtos", type=int, default=1000000)
+    parser.add_argument("--termos", type=int, default=50000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--varredura", type=int, default=20, help="consultas medidas na busca por LIKE, que percorre o catálogo inteiro")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.seed)
+    palavras, acumulado = vocabulario(args.termos, aleatorio)
+    catalogo = []
+
+    def carrega(desde):
+        for bloco in produtos(args.produtos, palavras, acumulado, aleatorio):
+            catalogo.extend((nome.lower(), descricao.lower()) for _, nome, descricao, _, _ in bloco)
+            yield bloco
+
+    indice = busca.IndiceProdutos()
+    indice.sincroniza(0, carrega)
+    print(json.dumps({"carga": {**indice.stats(), "sincronizacao_segundos": round(indice.sincronizacao_segundos, 2)}}))
+
+    geradas = consultas(args.consultas, palavras, acumulado, aleatorio)
+    tempos = []
+    encontrados = 0
+    for consulta in geradas:
+        inicio = time.perf_counter()
+        resultado = indice.busca(consulta, args.limit)
+        tempos.append(time.perf_counter() - inicio)
+        encontrados += bool(resultado)
+    tempos.sort()
+    print(json.dumps({
+        "busca": "indice",
+        "consultas": len(geradas),
+        "com_resultado": encontrados,
+        "p50_ms": round(percentil(tempos, 0.5) * 1000, 3),
+        "p99_ms": round(percentil(tempos, 0.99) * 1000, 3),
+        "max_ms": round(tempos[-1] * 1000, 3),
+    }))
+
+    # Equivalente a WHERE nome LIKE '%termo%' OR descricao LIKE '%termo%' para cada termo
+    tempos = []
+    for consulta in geradas[:args.varredura]:
+        termos = consulta.lower().split()
+        inicio = time.perf_counter()
+        [i for i, (nome, descricao) in enumerate(catalogo) if all(termo in nome or termo in descricao for termo in termos)][:args.limit]
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    print(json.dumps({
+        "busca": "like",
+        "consultas": len(tempos),
+        "p50_ms": round(percentil(tempos, 0.5) * 1000, 3),
+        "p99_ms": round(percentil(tempos, 0.99) * 1000, 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
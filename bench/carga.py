@@ -0,0 +1,427 @@
+"""
+Teste de carga da API com cenários de tráfego montados a partir da coleção do Postman
+(rotas.json), em bancos descartáveis com dados sintéticos em várias escalas.
+
+Cada operação da coleção (por exemplo "vê um produto" ou "cria uma encomenda") vira
+um modelo de requisição: o método e o caminho vêm da coleção, os ids do caminho são
+sorteados entre os registros do banco e os corpos são gerados no formato atual dos
+schemas. Os cenários misturam as operações com pesos:
+
+* `catalogo`: navegação no catálogo de produtos;
+* `encomendas`: criação, consulta e atualização de encomendas;
+* `rastreamento`: pings de localização e consultas ao histórico;
+* `misto`: os três juntos.
+
+O app roda no mesmo processo (com o lifespan, como em um worker), sem servidor HTTP,
+com `--usuarios` clientes simultâneos. Cada escala roda em um processo próprio, com
+um SQLite temporário ou com `--database-url`, cujas tabelas são apagadas e recriadas:
+use apenas um banco descartável.
+
+O resultado é um JSON com latência (p50, p95, p99), requisições por segundo e
+consultas ao banco por requisição, por cenário e por operação. Com `--compara`, é
+comparado a um resultado anterior, por exemplo do commit de base.
+
+Uso (a partir da raiz do repositório):
+
+    python bench/carga.py --escalas pequena media --duracao 10 --saida carga.json
+    python bench/carga.py --compara carga.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(RAIZ, "src")
+sys.path.insert(0, SRC)
+
+ESCALAS = {
+    "pequena": {"clientes": 1000, "produtos": 500, "encomendas": 5000},
+    "media": {"clientes": 10000, "produtos": 5000, "encomendas": 50000},
+    "grande": {"clientes": 100000, "produtos": 20000, "encomendas": 500000},
+}
+PRODUTOS_POR_ENCOMENDA = 3
+PINGS_POR_ENCOMENDA = 5
+
+# Pesos das operações da coleção em cada cenário
+CENARIOS = {
+    "catalogo": {
+        "vê produtos": 3,
+        "vê um produto": 10,
+        "vê os produtos de uma encomenda": 2,
+    },
+    "encomendas": {
+        "cria uma encomenda": 4,
+        "vê uma encomenda": 4,
+        "vê encomendas": 1,
+        "vê encomendas de um cliente": 3,
+        "edita uma encomendas": 1,
+        "edita o status de uma encomenda": 2,
+    },
+    "rastreamento": {
+        "edita a localização de uma encomenda": 8,
+        "vê as localizações de uma encomenda": 3,
+        "vê uma encomenda": 2,
+    },
+}
+CENARIOS["misto"] = {
+    operacao: peso
+    for cenario in ("catalogo", "encomendas", "rastreamento")
+    for operacao, peso in CENARIOS[cenario].items()
+}
+
+# A coleção aponta "vê uma encomenda" para a listagem
+CORRECOES = {"vê uma encomenda": "/encomendas/1"}
+
+# Recursos cujos ids aparecem nos caminhos da coleção
+RECURSOS = ("clientes", "produtos", "encomendas")
+
+LOCAIS = ["São Paulo, SP", "Campinas, SP", "Curitiba, PR", "Rio de Janeiro, RJ", "Belo Horizonte, MG", "Centro de distribuição 3"]
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def carrega_colecao(caminho):
+    '''
+    Lê as operações da coleção do Postman: nome -> (método, caminho, corpo).
+    '''
+    with open(caminho, encoding="utf-8") as arquivo:
+        colecao = json.load(arquivo)
+
+    operacoes = {}
+
+    def percorre(itens):
+        for item in itens:
+            if "item" in item:
+                percorre(item["item"])
+                continue
+            requisicao = item["request"]
+            url = requisicao["url"]["raw"] if isinstance(requisicao["url"], dict) else requisicao["url"]
+            corpo = (requisicao.get("body") or {}).get("raw") or None
+            operacoes[item["name"]] = (requisicao["method"], CORRECOES.get(item["name"], urlsplit(url).path), json.loads(corpo) if corpo else None)
+
+    percorre(colecao["item"])
+    return operacoes
+
+
+class Modelo:
+    '''
+    Modelo de requisição de uma operação: os segmentos numéricos do caminho da
+    coleção são trocados por ids sorteados do recurso que os precede.
+    '''
+    def __init__(self, nome, metodo, caminho, corpo, app):
+        self.nome = nome
+        self.metodo = metodo
+        self.corpo = corpo
+        segmentos = caminho.strip("/").split("/")
+        # Cada parte é um literal ou o recurso cujo id é sorteado
+        self.partes = [
+            (None, segmentos[i - 1]) if segmento.isdigit() and i > 0 and segmentos[i - 1] in RECURSOS else (segmento, None)
+            for i, segmento in enumerate(segmentos)
+        ]
+        self.barra, self.rota = self._resolve(app, caminho)
+
+    def _resolve(self, app, caminho):
+        # Rota do app que atende o caminho, com ou sem a barra final, para não seguir o redirect
+        for candidato, barra in ((caminho.rstrip("/"), False), (caminho.rstrip("/") + "/", True)):
+            for rota in app.routes:
+                if self.metodo in getattr(rota, "methods", ()) and rota.path_regex.match(candidato):
+                    return barra, rota.path
+        raise ValueError(f"A operação {self.nome} ({self.metodo} {caminho}) não corresponde a nenhuma rota do app.")
+
+    def caminho(self, ids):
+        partes = [literal if recurso is None else str(ids[recurso]()) for literal, recurso in self.partes]
+        return "/" + "/".join(partes) + ("/" if self.barra else "")
+
+
+class Gerador:
+    '''
+    Sorteia ids e corpos das requisições a partir das quantidades semeadas no banco.
+    '''
+    def __init__(self, dados, aleatorio):
+        self.dados = dados
+        self.aleatorio = aleatorio
+        self.ids = {recurso: (lambda recurso=recurso: aleatorio.randint(1, dados[recurso])) for recurso in RECURSOS}
+
+    def corpo(self, nome, padrao):
+        aleatorio = self.aleatorio
+        if nome == "cria uma encomenda":
+            produtos = aleatorio.sample(range(1, self.dados["produtos"] + 1), aleatorio.randint(1, PRODUTOS_POR_ENCOMENDA))
+            return {
+                "cliente_id": self.ids["clientes"](),
+                "descricao": "Encomenda do teste de carga",
+                "produtos": {str(produto_id): aleatorio.randint(1, 5) for produto_id in produtos},
+                "localizacaoAtual": aleatorio.choice(LOCAIS),
+            }
+        if nome == "edita uma encomendas":
+            return {"descricao": f"Encomenda editada {aleatorio.randint(1, 10**6)}"}
+        if nome == "edita o status de uma encomenda":
+            return {"status": aleatorio.choice(["PENDENTE", "EM_PREPARACAO", "PRONTA", "ENTREGUE", "CANCELADA"])}
+        if nome == "edita a localização de uma encomenda":
+            return {"encomenda_id": self.ids["encomendas"](), "localizacao": aleatorio.choice(LOCAIS)}
+        return padrao
+
+
+def semeia(engine, escala, aleatorio):
+    from sqlalchemy import insert, update
+    from sqlalchemy.orm import Session
+
+    import crud
+    import models
+
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    status = ["PENDENTE", "EM_PREPARACAO", "PRONTA", "ENTREGUE", "CANCELADA"]
+    inicio = datetime.now() - timedelta(days=30)
+    bloco = 10000
+
+    with Session(engine) as sessao:
+        for primeiro in range(1, escala["clientes"] + 1, bloco):
+            sessao.execute(insert(models.Cliente), [
+                {"cliente_id": i, "nome": f"Cliente {i}", "email": f"c{i}@ej.com", "cpf": f"{i:011d}", "telefone": "(11) 99999-9999",
+                 "endereco": f"Rua {i}", "hash_password": "$2b$12$" + "x" * 53, "status": "ATIVO"}
+                for i in range(primeiro, min(primeiro + bloco, escala["clientes"] + 1))
+            ])
+        for primeiro in range(1, escala["produtos"] + 1, bloco):
+            sessao.execute(insert(models.Produto), [
+                {"produto_id": i, "nome": f"Produto {i}", "preco": round(aleatorio.uniform(1, 500), 2), "descricao": f"Descrição do produto {i}", "status": "ATIVO"}
+                for i in range(primeiro, min(primeiro + bloco, escala["produtos"] + 1))
+            ])
+        for primeiro in range(1, escala["encomendas"] + 1, bloco):
+            ids = range(primeiro, min(primeiro + bloco, escala["encomendas"] + 1))
+            sessao.execute(insert(models.Encomenda), [
+                {"encomenda_id": i, "cliente_id": aleatorio.randint(1, escala["clientes"]), "descricao": f"Encomenda {i}",
+                 "valor_total": round(aleatorio.uniform(10, 5000), 2), "status": aleatorio.choice(status), "data_criacao": inicio + timedelta(seconds=i)}
+                for i in ids
+            ])
+            sessao.execute(insert(models.EncomendaProduto), [
+                {"encomenda_id": i, "produto_id": produto_id, "quantidade": aleatorio.randint(1, 10)}
+                for i in ids
+                for produto_id in aleatorio.sample(range(1, escala["produtos"] + 1), PRODUTOS_POR_ENCOMENDA)
+            ])
+            sessao.execute(insert(models.EncomendaLocalizacao), [
+                {"encomenda_id": i, "localizacao": aleatorio.choice(LOCAIS), "data": inicio + timedelta(seconds=i, minutes=ping)}
+                for i in ids
+                for ping in range(PINGS_POR_ENCOMENDA)
+            ])
+        sessao.execute(update(models.Encomenda).values(localizacao_atual_id=crud._localizacao_mais_recente()))
+        sessao.commit()
+        crud.reconstroi_resumos(sessao)
+
+
+ROTA_ATUAL = contextvars.ContextVar("rota_atual", default=None)
+
+
+class ContadorConsultas:
+    '''
+    Conta as consultas ao banco de cada operação. O contexto da requisição chega às
+    consultas feitas dentro do run_sync; as de tarefas de fundo, como o flush do
+    buffer de localizações, ficam sem operação.
+    '''
+    def __init__(self):
+        self.consultas = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        operacao = ROTA_ATUAL.get()
+        self.consultas[operacao] = self.consultas.get(operacao, 0) + 1
+
+    def retira(self):
+        consultas, self.consultas = self.consultas, {}
+        return consultas
+
+
+async def usuario(cliente, modelos, pesos, gerador, aleatorio, fim, inicio_medicao, amostras, feitas):
+    nomes = list(pesos)
+    valores = [pesos[nome] for nome in nomes]
+    while time.perf_counter() < fim:
+        modelo = modelos[aleatorio.choices(nomes, weights=valores)[0]]
+        corpo = gerador.corpo(modelo.nome, modelo.corpo) if modelo.metodo in ("POST", "PUT") else None
+        ROTA_ATUAL.set(modelo.nome)
+        inicio = time.perf_counter()
+        resposta = await cliente.request(modelo.metodo, modelo.caminho(gerador.ids), json=corpo)
+        duracao = time.perf_counter() - inicio
+        feitas[modelo.nome] = feitas.get(modelo.nome, 0) + 1
+        if inicio >= inicio_medicao:
+            amostras.append((modelo.nome, duracao, resposta.status_code))
+
+
+def resume(medidas):
+    latencias = [duracao for duracao, _ in medidas]
+    return {
+        "requisicoes": len(medidas),
+        "erros": sum(1 for _, status in medidas if status >= 400),
+        "latencia_ms": {nome: round(percentil(latencias, p) * 1000, 3) for nome, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))} if latencias else {},
+    }
+
+
+async def executa_cenario(app, modelos, pesos, gerador, contador, args):
+    import httpx
+
+    amostras = []
+    feitas = {}
+    contador.retira()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://carga") as cliente:
+        inicio_medicao = time.perf_counter() + args.aquecimento
+        fim = inicio_medicao + args.duracao
+        await asyncio.gather(*(
+            usuario(cliente, modelos, pesos, gerador, random.Random(args.seed * 1000 + i), fim, inicio_medicao, amostras, feitas)
+            for i in range(args.usuarios)
+        ))
+    consultas = contador.retira()
+
+    por_operacao = {}
+    for nome, duracao, status in amostras:
+        por_operacao.setdefault(nome, []).append((duracao, status))
+
+    resultado = {
+        **resume([(duracao, status) for _, duracao, status in amostras]),
+        "requisicoes_por_segundo": round(len(amostras) / args.duracao, 1),
+        "operacoes": {},
+    }
+    for nome, medidas in sorted(por_operacao.items()):
+        resultado["operacoes"][nome] = {
+            "rota": f"{modelos[nome].metodo} {modelos[nome].rota}",
+            **resume(medidas),
+            # As consultas não são separadas por fase; a média inclui as requisições do aquecimento
+            "consultas_por_requisicao": round(consultas.get(nome, 0) / feitas[nome], 2),
+        }
+    return resultado
+
+
+async def executa(escala, args):
+    from sqlalchemy import event
+
+    import database
+    import main
+
+    aleatorio = random.Random(args.seed)
+    inicio = time.perf_counter()
+    semeia(database.engine, escala, aleatorio)
+    semeadura = time.perf_counter() - inicio
+
+    colecao = carrega_colecao(args.colecao)
+    modelos = {nome: Modelo(nome, *colecao[nome], main.app) for cenario in args.cenarios for nome in CENARIOS[cenario]}
+
+    contador = ContadorConsultas()
+    event.listen(database.engine, "before_cursor_execute", contador)
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", contador)
+
+    resultado = {"dados": {**escala, "semeadura_s": round(semeadura, 1)}, "cenarios": {}}
+    async with main.app.router.lifespan_context(main.app):
+        for cenario in args.cenarios:
+            resultado["cenarios"][cenario] = await executa_cenario(main.app, modelos, CENARIOS[cenario], Gerador(escala, aleatorio), contador, args)
+    return resultado
+
+
+def executa_escala(nome, args):
+    # Roda em um processo novo: database.py lê DATABASE_URL na importação
+    return asyncio.run(executa(ESCALAS[nome], args))
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def razao(atual, anterior):
+    return round(atual / anterior, 3) if anterior else None
+
+
+def compara(atual, anterior):
+    '''
+    Razões atual/anterior das latências e da vazão, e a diferença de consultas por
+    requisição, para as escalas, cenários e operações presentes nos dois resultados.
+    '''
+    comparacao = {}
+    for escala, dados in atual["escalas"].items():
+        for cenario, resultado in dados["cenarios"].items():
+            base = anterior.get("escalas", {}).get(escala, {}).get("cenarios", {}).get(cenario)
+            if base is None:
+                continue
+            item = {
+                "requisicoes_por_segundo": razao(resultado["requisicoes_por_segundo"], base["requisicoes_por_segundo"]),
+                "latencia_ms": {p: razao(valor, base["latencia_ms"].get(p)) for p, valor in resultado["latencia_ms"].items()},
+                "operacoes": {},
+            }
+            for nome, operacao in resultado["operacoes"].items():
+                operacao_base = base["operacoes"].get(nome)
+                if operacao_base is None:
+                    continue
+                item["operacoes"][nome] = {
+                    "latencia_ms": {p: razao(valor, operacao_base["latencia_ms"].get(p)) for p, valor in operacao["latencia_ms"].items()},
+                    "consultas_por_requisicao": round(operacao["consultas_por_requisicao"] - operacao_base["consultas_por_requisicao"], 2),
+                }
+            comparacao.setdefault(escala, {})[cenario] = item
+    return comparacao
+
+
+def dialeto(database_url):
+    return database_url.split(":", 1)[0].split("+", 1)[0] if database_url else "sqlite"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=["pequena"])
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--usuarios", type=int, default=8, help="clientes simultâneos")
+    parser.add_argument("--duracao", type=float, default=10, help="segundos medidos por cenário")
+    parser.add_argument("--aquecimento", type=float, default=2, help="segundos iniciais de cada cenário fora da medição")
+    parser.add_argument("--colecao", default=os.path.join(RAIZ, "rotas.json"))
+    parser.add_argument("--database-url", help="banco descartável; as tabelas são apagadas e recriadas (padrão: SQLite temporário)")
+    parser.add_argument("--saida", help="arquivo onde gravar o resultado")
+    parser.add_argument("--compara", help="resultado anterior a comparar com este")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    resultado = {
+        "commit": commit_atual(),
+        "usuarios": args.usuarios,
+        "duracao_s": args.duracao,
+        "banco": dialeto(args.database_url),
+        "escalas": {},
+    }
+    # Sem checagem de migrações: as tabelas vêm do create_all
+    os.environ["DB_CHECK_MIGRATIONS"] = "false"
+    contexto = multiprocessing.get_context("spawn")
+    for escala in args.escalas:
+        diretorio = None
+        if args.database_url:
+            os.environ["DATABASE_URL"] = args.database_url
+        else:
+            diretorio = tempfile.mkdtemp(prefix="carga-")
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'app.db')}"
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                resultado["escalas"][escala] = executor.submit(executa_escala, escala, args).result()
+        finally:
+            if diretorio:
+                shutil.rmtree(diretorio, ignore_errors=True)
+
+    if args.compara:
+        with open(args.compara, encoding="utf-8") as arquivo:
+            anterior = json.load(arquivo)
+        resultado["comparacao"] = {"commit": anterior.get("commit"), "razoes": compara(resultado, anterior)}
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Compara o perfil de índices antigo (um índice por coluna) com o atual
+(migração 0003_perfil_de_indices) em escrita e leitura.
+
+Os dois bancos são SQLite temporários com o mesmo esquema; o "antigo" recebe de volta
+os índices removidos pela migração e perde os compostos. A carga de escrita insere
+clientes, produtos, encomendas, itens e localizações e atualiza status; a de leitura
+repete as consultas de crud.py que os índices atendem.
+
+Uso (a partir da raiz do repositório):
+
+    python bench/indices.py --encomendas 20000
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(RAIZ, "..", "src")
+sys.path.insert(0, SRC)
+
+BANCO_DIR = tempfile.mkdtemp(prefix="bench-indices-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(BANCO_DIR, 'app.db')}")
+
+from sqlalchemy import bindparam, create_engine, insert, select, update, text
+
+import models
+
+
+def carrega_migracao():
+    caminho = os.path.join(SRC, "migrations", "versions", "0003_perfil_de_indices.py")
+    spec = importlib.util.spec_from_file_location("perfil_de_indices", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def cria_banco(nome, perfil_antigo, migracao):
+    engine = create_engine(f"sqlite:///{os.path.join(BANCO_DIR, nome + '.db')}")
+    models.Base.metadata.create_all(engine)
+    if perfil_antigo:
+        with engine.begin() as conn:
+            for indice, (tabela, _) in migracao.INDICES_COMPOSTOS.items():
+                conn.execute(text(f"DROP INDEX {indice}"))
+            for tabela, colunas in migracao.INDICES_REMOVIDOS.items():
+                for coluna in colunas:
+                    conn.execute(text(f"CREATE INDEX ix_{tabela}_{coluna} ON {tabela} ({coluna})"))
+            conn.execute(text("CREATE INDEX ix_encomendas_localizacoes_localizacao_id ON encomendas_localizacoes (localizacao_id)"))
+    return engine
+
+
+def cronometra(func):
+    inicio = time.perf_counter()
+    func()
+    return time.perf_counter() - inicio
+
+
+def escrita(engine, args):
+    aleatorio = random.Random(42)
+    status = ["PENDENTE", "EM_PREPARACAO", "PRONTA", "ENTREGUE", "CANCELADA"]
+    tempos = {}
+
+    with engine.begin() as conn:
+        tempos["clientes"] = cronometra(lambda: conn.execute(insert(models.Cliente), [
+            {"cliente_id": i, "nome": f"Cliente {i}", "email": f"c{i}@ej.com", "cpf": f"{i:011d}", "telefone": "(11) 99999-9999",
+             "endereco": f"Rua {i}", "hash_password": "$2b$12$" + "x" * 53, "status": aleatorio.choice(["ATIVO", "INATIVO"])}
+            for i in range(1, args.clientes + 1)
+        ]))
+        tempos["produtos"] = cronometra(lambda: conn.execute(insert(models.Produto), [
+            {"produto_id": i, "nome": f"Produto {i}", "preco": round(aleatorio.uniform(1, 500), 2), "descricao": f"Descrição {i}", "status": "ATIVO"}
+            for i in range(1, args.produtos + 1)
+        ]))
+        tempos["encomendas"] = cronometra(lambda: conn.execute(insert(models.Encomenda), [
+            {"encomenda_id": i, "cliente_id": aleatorio.randint(1, args.clientes), "descricao": f"Encomenda {i}",
+             "valor_total": round(aleatorio.uniform(10, 5000), 2), "status": aleatorio.choice(status)}
+            for i in range(1, args.encomendas + 1)
+        ]))
+        tempos["encomendas_produtos"] = cronometra(lambda: conn.execute(insert(models.EncomendaProduto), [
+            {"encomenda_id": i, "produto_id": produto_id, "quantidade": aleatorio.randint(1, 10)}
+            for i in range(1, args.encomendas + 1)
+            for produto_id in aleatorio.sample(range(1, args.produtos + 1), 3)
+        ]))
+        tempos["encomendas_localizacoes"] = cronometra(lambda: conn.execute(insert(models.EncomendaLocalizacao), [
+            {"encomenda_id": aleatorio.randint(1, args.encomendas), "localizacao": f"Ponto {i}"}
+            for i in range(args.encomendas * args.pings)
+        ]))
+        encomendas = models.Encomenda.__table__
+        tempos["update_status"] = cronometra(lambda: conn.execute(
+            update(encomendas).where(encomendas.c.encomenda_id == bindparam("id")).values(status=bindparam("novo_status")),
+            [{"id": aleatorio.randint(1, args.encomendas), "novo_status": aleatorio.choice(status)} for _ in range(args.encomendas // 2)]
+        ))
+    return tempos
+
+
+def leitura(engine, args):
+    consultas = {
+        "clientes_por_status": select(models.Cliente).where(models.Cliente.status == "ATIVO", models.Cliente.cliente_id > args.clientes // 2).order_by(models.Cliente.cliente_id).limit(101),
+        "produtos_por_preco": select(models.Produto).where(models.Produto.preco >= 100, models.Produto.preco <= 200).order_by(models.Produto.preco, models.Produto.produto_id).limit(101),
+        "encomendas_por_status": select(models.Encomenda).where(models.Encomenda.status == "ENTREGUE", models.Encomenda.encomenda_id > args.encomendas // 2).order_by(models.Encomenda.encomenda_id).limit(101),
+        "encomendas_do_cliente": select(models.Encomenda).where(models.Encomenda.cliente_id == 7),
+        "produtos_da_encomenda": select(models.EncomendaProduto).where(models.EncomendaProduto.encomenda_id == 7),
+        "historico_da_encomenda": select(models.EncomendaLocalizacao).where(models.EncomendaLocalizacao.encomenda_id == 7).order_by(models.EncomendaLocalizacao.data, models.EncomendaLocalizacao.localizacao_id),
+    }
+    tempos = {}
+    with engine.connect() as conn:
+        for nome, consulta in consultas.items():
+            conn.execute(consulta).all()
+            tempos[nome] = cronometra(lambda: [conn.execute(consulta).all() for _ in range(args.repeticoes)]) / args.repeticoes
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--produtos", type=int, default=2000)
+    parser.add_argument("--encomendas", type=int, default=20000)
+    parser.add_argument("--pings", type=int, default=5, help="localizações por encomenda")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    migracao = carrega_migracao()
+    resultado = {}
+    try:
+        for perfil, antigo in (("antigo", True), ("atual", False)):
+            engine = cria_banco(perfil, antigo, migracao)
+            resultado[perfil] = {"escrita_s": escrita(engine, args), "leitura_ms": {k: v * 1000 for k, v in leitura(engine, args).items()}}
+            engine.dispose()
+    finally:
+        shutil.rmtree(BANCO_DIR, ignore_errors=True)
+
+    resultado["razao_atual_sobre_antigo"] = {
+        grupo: {k: round(resultado["atual"][grupo][k] / resultado["antigo"][grupo][k], 3) for k in resultado["atual"][grupo]}
+        for grupo in ("escrita_s", "leitura_ms")
+    }
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compara o custo de serializar uma página de encomendas (com produtos e localização
+atual) e o tamanho da resposta com e sem compressão.
+
+Caminhos de serialização:
+
+* `padrao`: o que as listagens faziam, validando com o schema e codificando com
+  jsonable_encoder e o json da stdlib (JSONResponse);
+* `orjson`: a validação do schema seguida de orjson (ORJSONResponse, usado agora nas
+  rotas com response_model);
+* `type_adapter`: serializacao.dump_json, com TypeAdapter em cache e os bytes gerados
+  direto pelo pydantic-core (caminho rápido das listagens).
+
+Em seguida o JSON do caminho rápido é comprimido com gzip e brotli, nos níveis usados
+por compressao.CompressaoMiddleware.
+
+Uso (a partir da raiz do repositório):
+
+    python bench/serializacao.py --encomendas 100 --produtos 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+import compressao
+import serializacao
+from schemas.encomenda.Encomenda import Encomenda
+from schemas.paginacao.Pagina import Pagina
+
+
+def pagina_de_encomendas(encomendas, produtos):
+    # Objetos com os mesmos atributos dos modelos do ORM, lidos com from_attributes
+    agora = datetime.now()
+    itens = [
+        SimpleNamespace(
+            encomenda_id=i,
+            cliente_id=1 + i % 50,
+            descricao=f"Encomenda {i} do marketplace parceiro",
+            valor_total=123.45 + i,
+            status="PENDENTE",
+            localizacao_atual=SimpleNamespace(encomenda_id=i, localizacao=f"Centro de distribuição {i % 7}, doca {i % 12}", data=agora),
+            produtos=[SimpleNamespace(encomenda_id=i, produto_id=p, quantidade=1 + p % 3) for p in range(1, produtos + 1)],
+        )
+        for i in range(1, encomendas + 1)
+    ]
+    return {"itens": itens, "proximo_cursor": "WzEwMF0"}
+
+
+def padrao(pagina):
+    modelo = Pagina[Encomenda].model_validate(pagina, from_attributes=True)
+    return json.dumps(jsonable_encoder(modelo), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def via_orjson(pagina):
+    return orjson.dumps(Pagina[Encomenda].model_validate(pagina, from_attributes=True).model_dump(mode="json"))
+
+
+def type_adapter(pagina):
+    return serializacao.dump_json(Pagina[Encomenda], pagina)
+
+
+def mede(func, repeticoes):
+    func()
+    inicio = time.process_time()
+    for _ in range(repeticoes):
+        resultado = func()
+    return resultado, (time.process_time() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encomendas", type=int, default=100)
+    parser.add_argument("--produtos", type=int, default=5)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    pagina = pagina_de_encomendas(args.encomendas, args.produtos)
+
+    for nome, func in (("padrao", padrao), ("orjson", via_orjson), ("type_adapter", type_adapter)):
+        corpo, cpu = mede(lambda: func(pagina), args.repeticoes)
+        print(json.dumps({"serializacao": nome, "bytes": len(corpo), "cpu_ms_por_resposta": round(cpu * 1000, 3)}))
+
+    corpo = type_adapter(pagina)
+    middleware = compressao.CompressaoMiddleware(None)
+    codificacoes = ["gzip"] + (["br"] if compressao.brotli is not None else [])
+    for codificacao in codificacoes:
+        def comprime():
+            compressor = middleware.compressor(codificacao)
+            return compressor.process(corpo) + compressor.finish()
+
+        comprimido, cpu = mede(comprime, args.repeticoes)
+        print(json.dumps({
+            "compressao": codificacao,
+            "bytes": len(comprimido),
+            "razao": round(len(comprimido) / len(corpo), 3),
+            "cpu_ms_por_resposta": round(cpu * 1000, 3),
+        }))
+
+
+if __name__ == "__main__":
+    main()
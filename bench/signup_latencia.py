@@ -0,0 +1,86 @@
+"""
+Mede como uma rajada de cadastros (hash bcrypt) afeta a latência das outras rotas
+de um worker.
+
+Cada cenário dispara `--signups` hashes concorrentes enquanto uma sonda mede o atraso
+do event loop a cada 5 ms. Esse atraso é somado à latência de qualquer outra rota
+atendida pelo mesmo worker. O cenário `inline` reproduz o comportamento antigo
+(hash no event loop); os demais usam o pool de threads de hashing.PasswordHasher.
+
+Uso (a partir da raiz do repositório):
+
+    python bench/signup_latencia.py --signups 40 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import hashing
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def sonda(intervalo, atrasos, parar):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        atrasos.append(time.perf_counter() - inicio - intervalo)
+
+
+async def cenario(nome, hasher, signups):
+    atrasos = []
+    parar = asyncio.Event()
+    tarefa_sonda = asyncio.create_task(sonda(0.005, atrasos, parar))
+    await asyncio.sleep(0.05)
+
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(hasher.hash(f"senha-{i}") for i in range(signups)), return_exceptions=True)
+    duracao = time.perf_counter() - inicio
+
+    parar.set()
+    await tarefa_sonda
+    hasher.shutdown()
+
+    concluidos = sum(1 for r in resultados if isinstance(r, str))
+    return {
+        "cenario": nome,
+        "workers": hasher.workers,
+        "rounds": hasher.rounds,
+        "signups": signups,
+        "concluidos": concluidos,
+        "recusados": signups - concluidos,
+        "signups_por_segundo": round(concluidos / duracao, 2),
+        "atraso_outras_rotas_ms": {
+            "p50": round(percentil(atrasos, 0.50) * 1000, 2),
+            "p99": round(percentil(atrasos, 0.99) * 1000, 2),
+            "max": round(max(atrasos) * 1000, 2),
+            "media": round(statistics.mean(atrasos) * 1000, 2),
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=hashing.BCRYPT_ROUNDS)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    cenarios = [("inline", hashing.PasswordHasher(workers=0, rounds=args.rounds))]
+    cenarios += [(f"pool-{w}", hashing.PasswordHasher(workers=w, max_pending=args.signups, rounds=args.rounds)) for w in args.workers]
+
+    for nome, hasher in cenarios:
+        print(json.dumps(await cenario(nome, hasher, args.signups)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
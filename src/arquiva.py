@@ -0,0 +1,57 @@
+"""
+Move para as tabelas de arquivo (encomendas_arquivo, encomendas_produtos_arquivo e
+encomendas_localizacoes_arquivo) as encomendas ENTREGUE ou CANCELADA sem alterações
+há mais de --dias dias, com os seus itens e localizações.
+
+Cada lote de até --lote encomendas é movido em uma transação própria e curta, para não
+travar as tabelas de encomendas por muito tempo; --pausa espaça os lotes para dar
+folga às réplicas. Encomendas travadas por outra transação ficam para a próxima
+execução. Cada lote é impresso como uma linha JSON e o total sai em stderr.
+
+Uso (a partir de src/):
+
+    python arquiva.py --dias 180
+    python arquiva.py --dias 180 --lote 1000 --pausa 0.5 --max-lotes 100
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+import crud
+from database import SessionLocal
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, required=True, help="idade mínima, em dias desde a última alteração, das encomendas arquivadas")
+    parser.add_argument("--lote", type=int, default=500, help="encomendas movidas por transação")
+    parser.add_argument("--pausa", type=float, default=0.0, help="segundos de espera entre os lotes")
+    parser.add_argument("--max-lotes", type=int, default=None, help="para depois desta quantidade de lotes")
+    args = parser.parse_args()
+
+    antes_de = datetime.now() - timedelta(days=args.dias)
+    total = {"lotes": 0, "encomendas": 0, "itens": 0, "localizacoes": 0}
+    inicio = time.perf_counter()
+    depois_de = 0
+
+    with SessionLocal() as db:
+        while args.max_lotes is None or total["lotes"] < args.max_lotes:
+            resultado = crud.arquiva_encomendas(db, antes_de, args.lote, depois_de)
+            if resultado is None:
+                break
+            movidas, depois_de = resultado
+            total["lotes"] += 1
+            for tabela, linhas in movidas.items():
+                total[tabela] += linhas
+            print(json.dumps({"lote": total["lotes"], "ate_encomenda_id": depois_de, **movidas}))
+            if args.pausa:
+                time.sleep(args.pausa)
+
+    print(json.dumps({**total, "segundos": round(time.perf_counter() - inicio, 1)}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
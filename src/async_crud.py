@@ -0,0 +1,134 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import json
+
+import crud
+from schemas.produto.ProdutoIn import ProdutoIn
+from schemas.produto.ProdutoUpdate import ProdutoUpdate
+from schemas.cliente.ClienteIn import ClienteIn
+from schemas.encomenda.EncomendaIn import EncomendaIn
+from schemas.encomenda.EncomendaUpdate import EncomendaUpdate
+from schemas.encomenda.EncomendaLocalizacao import EncomendaLocalizacao
+
+# As funções abaixo executam as funções de crud.py com AsyncSession.run_sync:
+# o código do ORM continua o mesmo, mas cada ida ao banco usa o driver assíncrono
+# e devolve o controle ao event loop enquanto espera, sem ocupar uma thread.
+
+def _com_relacoes(func):
+    '''
+    Carrega as relações serializadas no schema Encomenda ainda dentro do run_sync,
+    já que o lazy loading não pode acontecer fora dele. As leituras já trazem as
+    relações com crud.ENCOMENDA_RELACOES; isto só é usado nas rotas de escrita.
+    '''
+    def wrapper(session, *args, **kwargs):
+        resultado = func(session, *args, **kwargs)
+        encomendas = resultado if isinstance(resultado, list) else [resultado]
+        for encomenda in encomendas:
+            encomenda.localizacao_atual
+            encomenda.produtos
+        return resultado
+    return wrapper
+
+async def get_cliente(db: AsyncSession, cliente_id: int):
+    return await db.run_sync(crud.get_cliente, cliente_id)
+
+async def get_cliente_by_cpf(db: AsyncSession, cpf: str):
+    return await db.run_sync(crud.get_cliente_by_cpf, cpf)
+
+async def get_clientes(db: AsyncSession, cursor: Optional[tuple] = None, limit: int = 100):
+    return await db.run_sync(crud.get_clientes, cursor, limit)
+
+async def get_clientes_by_status(db: AsyncSession, status: str, cursor: Optional[tuple] = None, limit: int = 100):
+    return await db.run_sync(crud.get_clientes_by_status, status, cursor, limit)
+
+async def create_cliente(db: AsyncSession, cliente: ClienteIn, hash_password: Optional[str] = None):
+    return await db.run_sync(crud.create_cliente, cliente, hash_password)
+
+async def update_cliente(db: AsyncSession, cliente_id: int, clienteUpdate: ClienteIn, hash_password: Optional[str] = None):
+    return await db.run_sync(crud.update_cliente, cliente_id, clienteUpdate, hash_password)
+
+async def delete_cliente(db: AsyncSession, cliente_id: int):
+    return await db.run_sync(crud.delete_cliente, cliente_id)
+
+async def get_produto(db: AsyncSession, produto_id: int):
+    return await db.run_sync(crud.get_produto, produto_id)
+
+async def get_produto_by_nome(db: AsyncSession, nome: str):
+    return await db.run_sync(crud.get_produto_by_nome, nome)
+
+async def get_produtos(db: AsyncSession, cursor: Optional[tuple] = None, limit: int = 100, min_price: Optional[float] = None, max_price: Optional[float] = None):
+    return await db.run_sync(crud.get_produtos, cursor, limit, min_price, max_price)
+
+async def create_produto(db: AsyncSession, produto: ProdutoIn):
+    return await db.run_sync(crud.create_produto, produto)
+
+async def update_produto(db: AsyncSession, produto_id: int, produtoUpdate: ProdutoUpdate):
+    return await db.run_sync(crud.update_produto, produto_id, produtoUpdate)
+
+async def delete_produto(db: AsyncSession, produto_id: int):
+    return await db.run_sync(crud.delete_produto, produto_id)
+
+async def busca_produtos(db: AsyncSession, q: str, limit: int = 20):
+    return await db.run_sync(crud.busca_produtos, q, limit)
+
+async def sincroniza_indice_produtos(db: AsyncSession):
+    return await db.run_sync(crud.sincroniza_indice_produtos)
+
+async def get_encomenda(db: AsyncSession, encomenda_id: int):
+    return await db.run_sync(crud.get_encomenda, encomenda_id)
+
+async def get_encomendas(db: AsyncSession, cursor: Optional[tuple] = None, limit: int = 100):
+    return await db.run_sync(crud.get_encomendas, cursor, limit)
+
+async def get_encomendas_by_status(db: AsyncSession, status: str, cursor: Optional[tuple] = None, limit: int = 100):
+    return await db.run_sync(crud.get_encomendas_by_status, status, cursor, limit)
+
+async def create_encomenda(db: AsyncSession, encomenda: EncomendaIn):
+    return await db.run_sync(_com_relacoes(crud.create_encomenda), encomenda)
+
+async def create_encomendas_batch(db: AsyncSession, encomendas: list[EncomendaIn], chunk_size: int = 500):
+    return await db.run_sync(crud.create_encomendas_batch, encomendas, chunk_size)
+
+async def update_encomenda(db: AsyncSession, encomenda_id: int, encomenda: EncomendaUpdate):
+    return await db.run_sync(_com_relacoes(crud.update_encomenda), encomenda_id, encomenda)
+
+async def update_encomenda_status(db: AsyncSession, encomenda_id: int, status: str):
+    return await db.run_sync(_com_relacoes(crud.update_encomenda_status), encomenda_id, status)
+
+async def delete_encomenda(db: AsyncSession, encomenda_id: int):
+    return await db.run_sync(crud.delete_encomenda, encomenda_id)
+
+async def update_localizacao_encomenda(db: AsyncSession, localizacao: EncomendaLocalizacao):
+    return await db.run_sync(_com_relacoes(crud.update_localizacao_encomenda), localizacao)
+
+async def get_encomenda_localizacao(db: AsyncSession, encomenda_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: Optional[int] = None):
+    return await db.run_sync(crud.get_encomenda_localizacao, encomenda_id, since, until, limit)
+
+async def encomenda_existe(db: AsyncSession, encomenda_id: int):
+    return await db.run_sync(crud.encomenda_existe, encomenda_id)
+
+async def stream_encomenda_localizacao(sessoes: async_sessionmaker, encomenda_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: Optional[int] = None, chunk_size: int = 1000):
+    '''
+    Gera o histórico de localizações como NDJSON (um objeto por linha), lendo de um
+    cursor do lado do servidor em blocos de chunk_size linhas. Usa uma sessão própria,
+    aberta com `sessoes` (o primário ou uma réplica), que vive enquanto a resposta é enviada.
+    '''
+    query = crud.encomenda_localizacao_query(encomenda_id, since, until, limit).execution_options(yield_per=chunk_size)
+    async with sessoes() as db:
+        resultado = await db.stream_scalars(query)
+        async for bloco in resultado.partitions():
+            yield "".join(
+                json.dumps({"encomenda_id": localizacao.encomenda_id, "localizacao": localizacao.localizacao, "data": localizacao.data.isoformat()}, ensure_ascii=False) + "\n"
+                for localizacao in bloco
+            )
+            db.expunge_all()
+
+async def get_encomenda_produtos(db: AsyncSession, encomenda_id: int):
+    return await db.run_sync(crud.get_encomenda_produtos, encomenda_id)
+
+async def get_cliente_encomendas(db: AsyncSession, cliente_id: int):
+    return await db.run_sync(crud.get_cliente_encomendas, cliente_id)
+
+async def get_cliente_resumo(db: AsyncSession, cliente_id: int):
+    return await db.run_sync(crud.get_cliente_resumo, cliente_id)
@@ -0,0 +1,134 @@
+from collections import OrderedDict, deque
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+logger = logging.getLogger(__name__)
+
+AUTH_SECRET = os.getenv("AUTH_SECRET") or None
+if not AUTH_SECRET:
+    # Uma chave gerada por worker faria cada worker recusar os tokens emitidos pelos outros
+    logger.error("AUTH_SECRET não definido: o login e as rotas autenticadas responderão 503.")
+
+AUTH_TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", "3600"))
+LOGIN_MAX_FALHAS = int(os.getenv("LOGIN_MAX_FALHAS", "5"))
+LOGIN_MAX_FALHAS_IP = int(os.getenv("LOGIN_MAX_FALHAS_IP", "20"))
+LOGIN_JANELA = int(os.getenv("LOGIN_JANELA", "300"))
+
+_CHAVE = AUTH_SECRET.encode("utf-8") if AUTH_SECRET else None
+
+
+class AuthNaoConfigurado(Exception):
+    pass
+
+
+def _b64encode(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).decode("ascii").rstrip("=")
+
+def _b64decode(dados: str) -> bytes:
+    return base64.urlsafe_b64decode(dados + "=" * (-len(dados) % 4))
+
+def _assinatura(payload: str) -> str:
+    if _CHAVE is None:
+        raise AuthNaoConfigurado("AUTH_SECRET não definido: tokens de acesso indisponíveis.")
+    return _b64encode(hmac.new(_CHAVE, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def create_token(cliente_id: int, ttl: int = AUTH_TOKEN_TTL) -> str:
+    '''
+    Emite um token assinado com HMAC-SHA256 no formato <payload>.<assinatura>, em que o
+    payload é o JSON {"sub": cliente_id, "exp": expiração} em base64.
+    '''
+    payload = _b64encode(json.dumps({"sub": cliente_id, "exp": int(time.time()) + ttl}, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_assinatura(payload)}"
+
+def verify_token(token: str) -> int:
+    '''
+    Confere a assinatura e a validade do token e retorna o id do cliente. Não consulta
+    o banco nem calcula bcrypt.
+    '''
+    try:
+        payload, assinatura = token.split(".")
+    except ValueError:
+        raise ValueError("Token mal formado.")
+
+    if not hmac.compare_digest(assinatura, _assinatura(payload)):
+        raise ValueError("Assinatura do token inválida.")
+
+    dados = json.loads(_b64decode(payload))
+    if dados["exp"] < time.time():
+        raise ValueError("Token expirado.")
+
+    return dados["sub"]
+
+
+class LoginRateLimiter:
+    '''
+    Conta as falhas de login por chave (CPF ou IP) em uma janela deslizante. Uma chave
+    bloqueada é recusada antes de qualquer cálculo de bcrypt. O estado é de cada worker
+    e guarda no máximo max_chaves chaves: ao passar do limite, as chaves com a falha
+    mais antiga são descartadas.
+    '''
+    def __init__(self, janela: int = LOGIN_JANELA, max_chaves: int = 100000):
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self.bloqueios = 0
+        self.descartadas = 0
+        # Ordenado pela falha mais recente de cada chave
+        self._falhas: OrderedDict[str, deque] = OrderedDict()
+
+    def _recentes(self, chave: str, agora: float) -> Optional[deque]:
+        falhas = self._falhas.get(chave)
+        if falhas is None:
+            return None
+        while falhas and falhas[0] <= agora - self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self._falhas[chave]
+            return None
+        return falhas
+
+    def retry_after(self, chave: str, limite: int) -> int:
+        '''
+        Retorna quantos segundos faltam para a chave voltar a tentar, ou 0 se ela não está bloqueada.
+        '''
+        agora = time.monotonic()
+        falhas = self._recentes(chave, agora)
+        if falhas is None or len(falhas) < limite:
+            return 0
+        self.bloqueios += 1
+        return int(falhas[-limite] + self.janela - agora) + 1
+
+    def registra_falha(self, chave: str):
+        self._falhas.setdefault(chave, deque()).append(time.monotonic())
+        self._falhas.move_to_end(chave)
+        while len(self._falhas) > self.max_chaves:
+            self._falhas.popitem(last=False)
+            self.descartadas += 1
+
+    def limpa(self, chave: str):
+        self._falhas.pop(chave, None)
+
+
+login_limiter = LoginRateLimiter()
+
+_bearer = HTTPBearer(auto_error=False)
+
+async def get_cliente_autenticado(credenciais: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> int:
+    if credenciais is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de acesso não informado", headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        return verify_token(credenciais.credentials)
+    except AuthNaoConfigurado as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"{e}")
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"{e}", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,329 @@
+from typing import Callable, Iterable, Optional
+from threading import Lock
+import bisect
+import heapq
+import math
+import os
+import re
+import time
+import unicodedata
+
+# Peso de um termo no nome do produto em relação a um termo na descrição
+BUSCA_PESO_NOME = float(os.getenv("BUSCA_PESO_NOME", "3"))
+# Tamanho mínimo do último termo para que ele seja buscado também como prefixo
+BUSCA_MIN_PREFIXO = int(os.getenv("BUSCA_MIN_PREFIXO", "2"))
+# Tamanho mínimo de um termo para que ele seja buscado com um erro de digitação
+BUSCA_MIN_FUZZY = int(os.getenv("BUSCA_MIN_FUZZY", "4"))
+# Termos do vocabulário considerados para cada prefixo ou erro de digitação
+BUSCA_MAX_EXPANSOES = int(os.getenv("BUSCA_MAX_EXPANSOES", "32"))
+# Termos lidos em ordem alfabética ao expandir um prefixo, antes de escolher os mais frequentes
+BUSCA_MAX_VARREDURA = 1024
+# Com até esse número de produtos no termo mais raro da consulta, os produtos dele são
+# pontuados um a um, sem percorrer as combinações de grupos
+BUSCA_PONTUACAO_DIRETA = 128
+# Percorrer uma combinação de grupos custa mais ou menos o mesmo que pontuar esse número
+# de produtos; quando as combinações mais relevantes não têm produtos em comum, a busca
+# passa à pontuação direta depois de gastar nelas o custo que a pontuação direta teria
+PRODUTOS_POR_COMBINACAO = 2
+# Produtos lidos do banco por consulta ao sincronizar o índice
+BUSCA_CARGA_BLOCO = 10000
+
+# Fração da relevância de um termo encontrado por prefixo ou com erro de digitação
+FATOR_PREFIXO = 0.6
+FATOR_FUZZY = 0.4
+
+_PALAVRA = re.compile(r"\w+")
+
+
+def tokeniza(texto: Optional[str]) -> list[str]:
+    '''
+    Separa o texto em termos minúsculos e sem acentos.
+    '''
+    if not texto:
+        return []
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return _PALAVRA.findall("".join(c for c in texto if not unicodedata.combining(c)))
+
+def _delecoes(termo: str) -> set[str]:
+    return {termo[:i] + termo[i + 1:] for i in range(len(termo))}
+
+def _a_um_erro(a: str, b: str) -> bool:
+    '''
+    Indica se b difere de a por uma inserção, remoção, troca ou transposição de
+    letras vizinhas.
+    '''
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+
+
+class IndiceProdutos:
+    '''
+    Índice invertido em memória sobre o nome e a descrição dos produtos ativos de um
+    worker, com relevância BM25 simplificada: termos raros valem mais, e um termo no
+    nome vale BUSCA_PESO_NOME vezes um termo na descrição.
+
+    Os produtos de cada termo ficam agrupados pelo peso do termo no produto, e todos os
+    produtos de uma combinação de grupos (um por termo da consulta) têm a mesma
+    relevância. A busca percorre as combinações da mais relevante para a menos
+    relevante e para ao encontrar limit produtos, em vez de pontuar todos os produtos
+    que contêm um termo comum. Quando algum termo da consulta é raro, ou quando as
+    combinações mais relevantes não têm produtos em comum, os produtos do termo mais
+    raro que contêm os demais termos são pontuados diretamente.
+
+    Cada escrita no catálogo grava no produto a versão do catálogo (versao_catalogo)
+    da transação. O índice guarda a versão do catálogo já aplicada e, quando ela muda,
+    relê apenas os produtos gravados depois dela.
+    '''
+    def __init__(self):
+        self.versao: Optional[int] = None
+        self.consultas = 0
+        self.atualizacoes = 0
+        self.sincronizacao_segundos: Optional[float] = None
+        # produto_id -> {termo: peso do termo no produto, já saturado}
+        self._documentos: dict[int, dict[str, float]] = {}
+        self._versoes: dict[int, int] = {}
+        # termo -> {peso saturado: produtos em que o termo tem esse peso}
+        self._postings: dict[str, dict[float, set[int]]] = {}
+        self._vocabulario: list[str] = []
+        self._delecoes: dict[str, set[str]] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._documentos)
+
+    def sincroniza(self, versao: int, carrega: Callable[[Optional[int]], Iterable[list]]):
+        '''
+        Aplica os produtos gravados depois da versão já indexada, ou todos na primeira
+        chamada. versao é a versão do catálogo lida antes da carga; carrega(desde) gera
+        blocos de linhas (produto_id, nome, descricao, status, versao_catalogo). Os
+        blocos são lidos fora do lock; uma linha mais antiga que a já aplicada ao
+        produto é ignorada, então sincronizações concorrentes não desfazem uma à outra.
+        '''
+        with self._lock:
+            if self.versao is not None and versao <= self.versao:
+                return
+            desde = self.versao
+
+        inicio = time.perf_counter()
+        # Na carga inicial o vocabulário é ordenado uma única vez, no fim
+        ordena = desde is not None
+        for bloco in carrega(desde):
+            with self._lock:
+                for produto_id, nome, descricao, status, versao_catalogo in bloco:
+                    if versao_catalogo < self._versoes.get(produto_id, -1):
+                        continue
+                    self._versoes[produto_id] = versao_catalogo
+                    self._remove(produto_id)
+                    if status == "ATIVO":
+                        self._adiciona(produto_id, nome, descricao, ordena)
+                    self.atualizacoes += 1
+
+        with self._lock:
+            if not ordena:
+                self._vocabulario = sorted(self._postings)
+            # Linhas gravadas depois de versao podem ter ficado para trás durante a
+            # carga; elas são relidas na próxima sincronização
+            self.versao = versao if self.versao is None else max(self.versao, versao)
+            self.sincronizacao_segundos = time.perf_counter() - inicio
+
+    def _adiciona(self, produto_id: int, nome: Optional[str], descricao: Optional[str], ordena: bool = True):
+        pesos: dict[str, float] = {}
+        for termo in tokeniza(nome):
+            pesos[termo] = pesos.get(termo, 0) + BUSCA_PESO_NOME
+        for termo in tokeniza(descricao):
+            pesos[termo] = pesos.get(termo, 0) + 1
+        documento = self._documentos[produto_id] = {termo: self._saturacao(peso) for termo, peso in pesos.items()}
+
+        for termo, saturado in documento.items():
+            postings = self._postings.get(termo)
+            if postings is None:
+                postings = self._postings[termo] = {}
+                if ordena:
+                    bisect.insort(self._vocabulario, termo)
+                if len(termo) >= BUSCA_MIN_FUZZY:
+                    for delecao in _delecoes(termo):
+                        self._delecoes.setdefault(delecao, set()).add(termo)
+            grupo = postings.get(saturado)
+            if grupo is None:
+                grupo = postings[saturado] = set()
+            grupo.add(produto_id)
+
+    def _remove(self, produto_id: int):
+        documento = self._documentos.pop(produto_id, None)
+        if documento is None:
+            return
+
+        for termo, saturado in documento.items():
+            postings = self._postings[termo]
+            grupo = postings[saturado]
+            grupo.discard(produto_id)
+            if not grupo:
+                del postings[saturado]
+            if not postings:
+                del self._postings[termo]
+                posicao = bisect.bisect_left(self._vocabulario, termo)
+                if posicao < len(self._vocabulario) and self._vocabulario[posicao] == termo:
+                    del self._vocabulario[posicao]
+                if len(termo) >= BUSCA_MIN_FUZZY:
+                    for delecao in _delecoes(termo):
+                        termos = self._delecoes[delecao]
+                        termos.discard(termo)
+                        if not termos:
+                            del self._delecoes[delecao]
+
+    def _frequencia(self, termo: str) -> int:
+        return sum(map(len, self._postings[termo].values()))
+
+    def _mais_frequentes(self, termos: Iterable[str]) -> list[str]:
+        return heapq.nlargest(BUSCA_MAX_EXPANSOES, termos, key=self._frequencia)
+
+    def _expande(self, termo: str, ultimo: bool) -> dict[str, float]:
+        '''
+        Termos do vocabulário que atendem a um termo da consulta, com o fator de cada
+        um: o próprio termo, os termos que começam com ele (só para o último termo,
+        que pode estar incompleto) e, sem correspondência exata, os termos a um erro
+        de digitação.
+        '''
+        expansoes = {}
+        if termo in self._postings:
+            expansoes[termo] = 1.0
+
+        if ultimo and len(termo) >= BUSCA_MIN_PREFIXO:
+            inicio = bisect.bisect_right(self._vocabulario, termo)
+            prefixados = []
+            for candidato in self._vocabulario[inicio:inicio + BUSCA_MAX_VARREDURA]:
+                if not candidato.startswith(termo):
+                    break
+                prefixados.append(candidato)
+            for candidato in self._mais_frequentes(prefixados):
+                expansoes[candidato] = FATOR_PREFIXO
+
+        if termo not in self._postings and len(termo) >= BUSCA_MIN_FUZZY:
+            candidatos = set(self._delecoes.get(termo, ()))
+            for delecao in _delecoes(termo):
+                if delecao in self._postings:
+                    candidatos.add(delecao)
+                candidatos.update(self._delecoes.get(delecao, ()))
+            for candidato in self._mais_frequentes(c for c in candidatos if c not in expansoes and _a_um_erro(termo, c)):
+                expansoes[candidato] = FATOR_FUZZY
+
+        return expansoes
+
+    def _idf(self, termo: str) -> float:
+        frequencia = self._frequencia(termo)
+        return math.log(1 + (len(self._documentos) - frequencia + 0.5) / (frequencia + 0.5))
+
+    @staticmethod
+    def _saturacao(peso: float) -> float:
+        # Repetir um termo aumenta a relevância cada vez menos
+        return peso / (peso + 1.2)
+
+    def busca(self, consulta: str, limit: int = 20) -> list[tuple[int, float]]:
+        '''
+        Retorna até limit pares (produto_id, relevância) dos produtos que contêm todos os
+        termos da consulta, do mais relevante para o menos relevante. Entre produtos de
+        mesma relevância no limite da lista, os retornados não seguem uma ordem definida.
+        '''
+        termos = list(dict.fromkeys(tokeniza(consulta)))
+        if not termos or limit < 1:
+            return []
+
+        with self._lock:
+            self.consultas += 1
+            expansoes = [self._expande(termo, i == len(termos) - 1) for i, termo in enumerate(termos)]
+            if not all(expansoes):
+                return []
+            pesos = [{candidato: fator * self._idf(candidato) for candidato, fator in expansao.items()} for expansao in expansoes]
+
+            frequencias = [sum(self._frequencia(candidato) for candidato in expansao) for expansao in pesos]
+            raro = frequencias.index(min(frequencias))
+            encontrados = None
+            if frequencias[raro] > BUSCA_PONTUACAO_DIRETA:
+                encontrados = self._combina(pesos, limit, frequencias[raro] // PRODUTOS_POR_COMBINACAO)
+            if encontrados is None:
+                encontrados = self._pontua(raro, pesos, limit)
+
+        return sorted(encontrados.items(), key=lambda item: (-item[1], item[0]))
+
+    @staticmethod
+    def _contribuicao(documento: dict[str, float], expansao: dict[str, float]) -> float:
+        # Maior contribuição de um termo da consulta ao produto, ou 0 se nenhum candidato dele aparece
+        if len(expansao) < len(documento):
+            return max((peso * documento[candidato] for candidato, peso in expansao.items() if candidato in documento), default=0)
+        return max((expansao[termo] * saturado for termo, saturado in documento.items() if termo in expansao), default=0)
+
+    def _grupos(self, expansao: dict[str, float]):
+        return (grupo for candidato in expansao for grupo in self._postings[candidato].values())
+
+    def _pontua(self, raro: int, pesos: list[dict[str, float]], limit: int) -> dict[int, float]:
+        # Os demais termos filtram os produtos do termo mais raro por interseções feitas
+        # pelo próprio set; só os produtos que contêm todos os termos são pontuados
+        produtos = set().union(*self._grupos(pesos[raro]))
+        for j, expansao in enumerate(pesos):
+            if j != raro and produtos:
+                produtos = set().union(*(produtos & grupo for grupo in self._grupos(expansao)))
+
+        relevancias = {}
+        for produto_id in produtos:
+            documento = self._documentos[produto_id]
+            relevancias[produto_id] = sum(self._contribuicao(documento, expansao) for expansao in pesos)
+        return dict(heapq.nlargest(limit, relevancias.items(), key=lambda item: (item[1], -item[0])))
+
+    def _combina(self, pesos: list[dict[str, float]], limit: int, max_combinacoes: int) -> Optional[dict[int, float]]:
+        # Grupos de cada termo da consulta, com a contribuição deles à relevância, do maior para o menor
+        grupos = [
+            sorted(
+                ((peso * saturado, produtos) for candidato, peso in expansao.items() for saturado, produtos in self._postings[candidato].items()),
+                key=lambda grupo: grupo[0], reverse=True,
+            )
+            for expansao in pesos
+        ]
+
+        # Combinações em ordem decrescente de relevância: a próxima é sempre uma das
+        # vizinhas (um índice a mais) das já visitadas. Um produto aparece primeiro na
+        # combinação dos seus grupos de maior contribuição, que dá a relevância dele.
+        inicio = (0,) * len(grupos)
+        fila = [(-sum(grupo[0][0] for grupo in grupos), inicio)]
+        visitadas = {inicio}
+        encontrados: dict[int, float] = {}
+        while fila and len(encontrados) < limit:
+            if len(visitadas) > max_combinacoes:
+                return None
+            negativo, indices = heapq.heappop(fila)
+            conjuntos = sorted((grupos[j][i][1] for j, i in enumerate(indices)), key=len)
+            # Interseção feita pelo próprio set, a partir do menor
+            for produto_id in conjuntos[0].intersection(*conjuntos[1:]):
+                if produto_id not in encontrados:
+                    encontrados[produto_id] = -negativo
+                    if len(encontrados) == limit:
+                        break
+
+            for j, i in enumerate(indices):
+                if i + 1 < len(grupos[j]):
+                    vizinha = indices[:j] + (i + 1,) + indices[j + 1:]
+                    if vizinha not in visitadas:
+                        visitadas.add(vizinha)
+                        heapq.heappush(fila, (negativo + grupos[j][i][0] - grupos[j][i + 1][0], vizinha))
+        return encontrados
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "versao": self.versao,
+                "produtos": len(self._documentos),
+                "termos": len(self._postings),
+                "consultas": self.consultas,
+                "atualizacoes": self.atualizacoes,
+                "sincronizacao_segundos": self.sincronizacao_segundos,
+            }
+
+
+indice = IndiceProdutos()
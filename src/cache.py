@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+import os
+import time
+
+CACHE_MAX_SIZE = int(os.getenv("PRODUTO_CACHE_MAX_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("PRODUTO_CACHE_TTL", "60"))
+# Intervalo mínimo, em segundos, entre duas leituras da versão do catálogo no banco
+CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("PRODUTO_CACHE_VERSION_CHECK_INTERVAL", "1"))
+
+_AUSENTE = object()
+
+
+class TTLCache:
+    '''
+    Cache LRU com tamanho máximo e expiração por tempo de vida (TTL).
+    '''
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._itens: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, chave: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE or item[0] < time.monotonic():
+                if item is not _AUSENTE:
+                    del self._itens[chave]
+                self.misses += 1
+                return default
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[1]
+
+    def set(self, chave: Hashable, valor: Any):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_size:
+                self._itens.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, chave: Hashable):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._itens),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class CatalogoCache:
+    '''
+    Cache do catálogo de produtos de um worker: produtos por id e páginas da listagem.
+
+    Cada escrita no catálogo incrementa a versão gravada em catalogo_versao na mesma
+    transação. Os workers leem essa versão no máximo uma vez por intervalo e descartam
+    o cache quando ela muda, sem precisar se comunicar entre si.
+    '''
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL, version_check_interval: float = CACHE_VERSION_CHECK_INTERVAL):
+        self.produtos = TTLCache(max_size, ttl)
+        self.paginas = TTLCache(max_size, ttl)
+        self.version_check_interval = version_check_interval
+        self.versao: Optional[int] = None
+        self.invalidacoes = 0
+        self._proxima_verificacao = 0.0
+        self._lock = Lock()
+
+    def check_version(self, get_versao: Callable[[], Optional[int]]):
+        agora = time.monotonic()
+        with self._lock:
+            if agora < self._proxima_verificacao:
+                return
+            self._proxima_verificacao = agora + self.version_check_interval
+
+        versao = get_versao() or 0
+        with self._lock:
+            if versao != self.versao:
+                if self.versao is not None:
+                    self.invalidacoes += 1
+                self.produtos.clear()
+                self.paginas.clear()
+                self.versao = versao
+
+    def invalidate(self, produto_id: Optional[int] = None):
+        '''
+        Invalida o cache local após uma escrita feita por este worker. A versão é
+        relida na próxima consulta, já que este worker acabou de incrementá-la.
+        '''
+        if produto_id is not None:
+            self.produtos.pop(produto_id)
+        self.paginas.clear()
+        with self._lock:
+            self._proxima_verificacao = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "versao": self.versao,
+            "invalidacoes": self.invalidacoes,
+            "produtos": self.produtos.stats(),
+            "paginas": self.paginas.stats(),
+        }
+
+
+catalogo = CatalogoCache()
@@ -0,0 +1,148 @@
+from typing import Optional
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # sem o pacote brotli as respostas são comprimidas apenas com gzip
+    brotli = None
+
+# Respostas menores que isso (em bytes) são enviadas sem compressão
+COMPRESSAO_MIN_SIZE = int(os.getenv("COMPRESSAO_MIN_SIZE", "1024"))
+COMPRESSAO_GZIP_LEVEL = int(os.getenv("COMPRESSAO_GZIP_LEVEL", "6"))
+COMPRESSAO_BROTLI_QUALITY = int(os.getenv("COMPRESSAO_BROTLI_QUALITY", "4"))
+
+# Fluxos de eventos não são comprimidos: a compressão atrasaria a entrega de cada evento.
+# Parquet já vem comprimido por coluna
+TIPOS_EXCLUIDOS = ("text/event-stream", "application/vnd.apache.parquet")
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        # wbits=31: cabeçalho e rodapé gzip
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, dados: bytes) -> bytes:
+        return self._compressor.compress(dados)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def escolhe_codificacao(accept_encoding: str) -> Optional[str]:
+    '''
+    Escolhe br ou gzip a partir do Accept-Encoding, preferindo br quando o cliente
+    aceita os dois. Codificações com q=0 são recusadas.
+    '''
+    aceitas = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                continue
+        if nome:
+            aceitas[nome.strip().lower()] = q
+
+    for codificacao in ("br", "gzip"):
+        if codificacao == "br" and brotli is None:
+            continue
+        if aceitas.get(codificacao, aceitas.get("*", 0)) > 0:
+            return codificacao
+    return None
+
+
+class CompressaoMiddleware:
+    '''
+    Comprime as respostas com brotli ou gzip, conforme o Accept-Encoding, a partir de
+    minimum_size bytes. Respostas em streaming são comprimidas bloco a bloco, com um
+    flush a cada bloco para que o cliente não espere o fim do fluxo.
+    '''
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSAO_MIN_SIZE, gzip_level: int = COMPRESSAO_GZIP_LEVEL, brotli_quality: int = COMPRESSAO_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressor(self, codificacao: str):
+        if codificacao == "br":
+            return brotli.Compressor(quality=self.brotli_quality)
+        return _Gzip(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codificacao = escolhe_codificacao(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _RespostaComprimida(self, codificacao, send).run(self.app, scope, receive)
+
+
+class _RespostaComprimida:
+    def __init__(self, middleware: CompressaoMiddleware, codificacao: str, send: Send):
+        self.middleware = middleware
+        self.codificacao = codificacao
+        self.send = send
+        self.inicio: Optional[Message] = None
+        self.compressor = None
+        self.repassa = False
+
+    async def run(self, app: ASGIApp, scope: Scope, receive: Receive):
+        await app(scope, receive, self.envia)
+
+    async def envia(self, message: Message):
+        if message["type"] == "http.response.start":
+            # O início só é enviado com o primeiro bloco, quando se sabe se haverá compressão
+            self.inicio = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        corpo = message.get("body", b"")
+        mais = message.get("more_body", False)
+
+        if self.inicio is not None:
+            inicio, self.inicio = self.inicio, None
+            headers = MutableHeaders(raw=inicio["headers"])
+            tipo = headers.get("content-type", "")
+            if "content-encoding" in headers or tipo.startswith(TIPOS_EXCLUIDOS):
+                self.repassa = True
+            else:
+                headers.add_vary_header("Accept-Encoding")
+                self.repassa = not mais and len(corpo) < self.middleware.minimum_size
+
+            if not self.repassa:
+                self.compressor = self.middleware.compressor(self.codificacao)
+                headers["Content-Encoding"] = self.codificacao
+                if mais:
+                    del headers["Content-Length"]
+                    corpo = self.compressor.process(corpo) + self.compressor.flush()
+                else:
+                    corpo = self.compressor.process(corpo) + self.compressor.finish()
+                    headers["Content-Length"] = str(len(corpo))
+                message = {**message, "body": corpo}
+
+            await self.send(inicio)
+            await self.send(message)
+            return
+
+        if not self.repassa:
+            corpo = self.compressor.process(corpo)
+            corpo += self.compressor.flush() if mais else self.compressor.finish()
+            message = {**message, "body": corpo}
+        await self.send(message)
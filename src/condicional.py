@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Mapping, Optional
+import hashlib
+
+from fastapi import Request, Response
+
+# Requisições condicionais (RFC 9110): as leituras enviam ETag e, quando houver,
+# Last-Modified. Um cliente que reenvia esses valores em If-None-Match ou
+# If-Modified-Since recebe 304, sem que a resposta seja serializada.
+
+def etag(*partes: Any) -> str:
+    '''
+    ETag fraco derivado das partes que determinam o corpo da resposta, em geral o
+    tipo do recurso e os pares (id, versao) dos registros. Fraco para continuar válido
+    quando a resposta é comprimida.
+    '''
+    return f'W/"{hashlib.blake2b(repr(partes).encode("utf-8"), digest_size=12).hexdigest()}"'
+
+def _opaco(valor: str) -> str:
+    valor = valor.strip()
+    return valor[2:] if valor.startswith("W/") else valor
+
+def _utc(data: datetime) -> datetime:
+    # As datas do banco são gravadas sem fuso, na hora local do servidor
+    return data.astimezone(timezone.utc).replace(microsecond=0)
+
+def nao_modificado(headers: Mapping[str, str], etag_atual: str, ultima_modificacao: Optional[datetime] = None) -> bool:
+    '''
+    Indica se a cópia do cliente ainda é válida. If-None-Match tem precedência e é
+    comparado de forma fraca; If-Modified-Since só é considerado sem ele.
+    '''
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaco(etag_atual) in {_opaco(valor) for valor in if_none_match.split(",")}
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or ultima_modificacao is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    return _utc(ultima_modificacao) <= desde
+
+def cabecalhos(etag_atual: str, ultima_modificacao: Optional[datetime] = None) -> dict[str, str]:
+    # no-cache: o cliente pode guardar a resposta, mas revalida antes de reutilizá-la
+    headers = {"ETag": etag_atual, "Cache-Control": "no-cache"}
+    if ultima_modificacao is not None:
+        headers["Last-Modified"] = format_datetime(_utc(ultima_modificacao), usegmt=True)
+    return headers
+
+def responde(request: Request, response: Response, etag_atual: str, ultima_modificacao: Optional[datetime] = None) -> Optional[Response]:
+    '''
+    Retorna uma resposta 304 se a cópia do cliente ainda é válida. Caso contrário,
+    adiciona os cabeçalhos de validação à resposta da rota e retorna None.
+
+    Last-Modified só deve ser informado para um único registro: uma listagem muda
+    quando um item sai dela, sem que a data de nenhum dos itens restantes mude.
+    '''
+    headers = cabecalhos(etag_atual, ultima_modificacao)
+    if nao_modificado(request.headers, etag_atual, ultima_modificacao):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def etag_pagina(recurso: str, pagina: dict, chave: str) -> str:
+    '''
+    ETag de uma página de paginacao.pagina, pelos ids e versões dos itens e pelo cursor
+    da próxima página.
+    '''
+    return etag(recurso, [(getattr(item, chave), item.versao) for item in pagina["itens"]], pagina["proximo_cursor"])
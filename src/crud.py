@@ -1,7 +1,15 @@
-from datetime import datetime
-from sqlalchemy.orm import Session
-
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+import uuid
+from sqlalchemy import delete, func, insert, literal, select, update, or_, and_, union_all
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import busca
+import cache
 import models
+from schemas.produto.Produto import Produto
 from schemas.produto.ProdutoIn import ProdutoIn
 from schemas.produto.ProdutoUpdate import ProdutoUpdate
 from schemas.cliente.ClienteIn import ClienteIn
@@ -9,6 +17,7 @@ from schemas.cliente.Cliente import Cliente
 from schemas.encomenda.EncomendaIn import EncomendaIn
 from schemas.encomenda.EncomendaUpdate import EncomendaUpdate
 from schemas.encomenda.EncomendaLocalizacao import EncomendaLocalizacao
+from schemas.encomenda.EncomendaStatus import EncomendaStatus
 
 def get_cliente(db: Session, cliente_id: int):
     db_cliente = db.query(models.Cliente).filter(models.Cliente.cliente_id == cliente_id).first()
@@ -21,16 +30,28 @@ def get_cliente(db: Session, cliente_id: int):
 def get_cliente_by_cpf(db: Session, cpf: str):
     return db.query(models.Cliente).filter(models.Cliente.cpf == cpf).first()
 
-def get_clientes(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Cliente).offset(skip).limit(limit).all()
+# As listagens usam paginação por chave (keyset): cursor é a chave de ordenação do
+# último item já visto e são retornados até limit + 1 itens, para indicar se há próxima página.
+
+def get_clientes(db: Session, cursor: Optional[tuple] = None, limit: int = 100):
+    query = db.query(models.Cliente)
+    if cursor is not None:
+        query = query.filter(models.Cliente.cliente_id > cursor[0])
+    return query.order_by(models.Cliente.cliente_id).limit(limit + 1).all()
+
+def get_clientes_by_status(db: Session, status: str, cursor: Optional[tuple] = None, limit: int = 100):
+    query = db.query(models.Cliente).filter(models.Cliente.status == status)
+    if cursor is not None:
+        query = query.filter(models.Cliente.cliente_id > cursor[0])
+    return query.order_by(models.Cliente.cliente_id).limit(limit + 1).all()
 
-def get_clientes_by_status(db: Session, status: str, skip: int = 0, limit: int = 100):
-    return db.query(models.Cliente).filter(models.Cliente.status == status).offset(skip).limit(limit).all()
+# O hash da senha pode vir pronto (calculado fora do event loop por hashing.hasher);
+# sem ele, é calculado aqui mesmo.
 
-def create_cliente(db: Session, cliente: ClienteIn):
+def create_cliente(db: Session, cliente: ClienteIn, hash_password: Optional[str] = None):
     db_cliente = models.Cliente(
         **cliente.model_dump(exclude=['password']), 
-        hash_password=Cliente.hash_pswd(cliente.password)
+        hash_password=hash_password or Cliente.hash_pswd(cliente.password)
     )
     
     db.add(db_cliente)
@@ -38,7 +59,7 @@ def create_cliente(db: Session, cliente: ClienteIn):
     db.refresh(db_cliente)
     return db_cliente
 
-def update_cliente(db: Session, cliente_id:int, clienteUpdate: ClienteIn):
+def update_cliente(db: Session, cliente_id:int, clienteUpdate: ClienteIn, hash_password: Optional[str] = None):
     db_cliente = db.query(models.Cliente).filter(models.Cliente.cliente_id == cliente_id).first()
     if clienteUpdate.nome is not None:
         db_cliente.nome = clienteUpdate.nome
@@ -51,7 +72,7 @@ def update_cliente(db: Session, cliente_id:int, clienteUpdate: ClienteIn):
     if clienteUpdate.endereco is not None:
         db_cliente.endereco = clienteUpdate.endereco
     if clienteUpdate.password is not None:
-        db_cliente.hash_password = Cliente.hash_pswd(clienteUpdate.password)
+        db_cliente.hash_password = hash_password or Cliente.hash_pswd(clienteUpdate.password)
     db.commit()
     db.refresh(db_cliente)
     return db_cliente
@@ -62,17 +83,92 @@ def delete_cliente(db: Session, cliente_id: int):
     db.commit()
     db.refresh(db_cliente)
 
+# Os produtos lidos passam pelo cache do catálogo (cache.catalogo) e são retornados como
+# snapshots do schema Produto, que podem ser compartilhados entre sessões.
+
+def _get_catalogo_versao(db: Session):
+    return db.scalar(select(models.CatalogoVersao.versao).where(models.CatalogoVersao.catalogo_id == 1))
+
+def _incrementa_catalogo_versao(db: Session):
+    # A linha catalogo_id=1 é criada junto com a tabela (migração 0002 ou create_all)
+    db.execute(update(models.CatalogoVersao).where(models.CatalogoVersao.catalogo_id == 1).values(versao=models.CatalogoVersao.versao + 1))
+
+def _marca_versao_catalogo(db_produto: models.Produto):
+    # Chamado depois de _incrementa_catalogo_versao: lê, na mesma transação, a versão desta escrita
+    db_produto.versao_catalogo = select(models.CatalogoVersao.versao).where(models.CatalogoVersao.catalogo_id == 1).scalar_subquery()
+
+def _get_precos_ativos(db: Session, produto_ids):
+    produtos = _get_produtos_por_id(db, produto_ids)
+    return {produto_id: produto.preco for produto_id, produto in produtos.items() if produto.status == "ATIVO"}
+
+def _get_produtos_por_id(db: Session, produto_ids):
+    cache.catalogo.check_version(lambda: _get_catalogo_versao(db))
+
+    produtos = {}
+    faltando = []
+    for produto_id in produto_ids:
+        produto = cache.catalogo.produtos.get(produto_id)
+        if produto is None:
+            faltando.append(produto_id)
+        else:
+            produtos[produto_id] = produto
+
+    # Os produtos fora do cache são buscados em uma única consulta
+    if faltando:
+        for db_produto in db.query(models.Produto).filter(models.Produto.produto_id.in_(faltando)).all():
+            produto = Produto.model_validate(db_produto, from_attributes=True)
+            cache.catalogo.produtos.set(produto.produto_id, produto)
+            produtos[produto.produto_id] = produto
+
+    return produtos
+
 def get_produto(db: Session, produto_id: int):
-    prod = db.query(models.Produto).filter(models.Produto.produto_id == produto_id).first()
+    cache.catalogo.check_version(lambda: _get_catalogo_versao(db))
+
+    prod = cache.catalogo.produtos.get(produto_id)
     if prod is None:
-        raise ValueError(f"Produto de id {produto_id} não encontrado")
+        db_produto = db.query(models.Produto).filter(models.Produto.produto_id == produto_id).first()
+        if db_produto is None:
+            raise ValueError(f"Produto de id {produto_id} não encontrado")
+        prod = Produto.model_validate(db_produto, from_attributes=True)
+        cache.catalogo.produtos.set(produto_id, prod)
     return prod
 
 def get_produto_by_nome(db: Session, nome: str):
     return db.query(models.Produto).filter(models.Produto.nome == nome).first()
 
-def get_produtos(db: Session, skip: int = 0, limit: int = 100, min_price: float = 0.0, max_price: float = 1000000.0):
-    return db.query(models.Produto).filter(models.Produto.preco >= min_price, models.Produto.preco <= max_price).offset(skip).limit(limit).all()
+def get_produtos(db: Session, cursor: Optional[tuple] = None, limit: int = 100, min_price: Optional[float] = None, max_price: Optional[float] = None):
+    cache.catalogo.check_version(lambda: _get_catalogo_versao(db))
+
+    chave = (cursor, limit, min_price, max_price)
+    produtos = cache.catalogo.paginas.get(chave)
+    if produtos is None:
+        produtos = [Produto.model_validate(db_produto, from_attributes=True) for db_produto in _query_produtos(db, cursor, limit, min_price, max_price)]
+        cache.catalogo.paginas.set(chave, produtos)
+    return produtos
+
+def _query_produtos(db: Session, cursor: Optional[tuple], limit: int, min_price: Optional[float], max_price: Optional[float]):
+    query = db.query(models.Produto)
+
+    # Sem filtro de preço a ordenação é pelo id; com filtro, por (preco, produto_id)
+    if min_price is None and max_price is None:
+        if cursor is not None:
+            query = query.filter(models.Produto.produto_id > cursor[0])
+        return query.order_by(models.Produto.produto_id).limit(limit + 1).all()
+
+    if min_price is not None:
+        query = query.filter(models.Produto.preco >= min_price)
+    if max_price is not None:
+        query = query.filter(models.Produto.preco <= max_price)
+    if cursor is not None:
+        preco, produto_id = cursor
+        # O preço vem do JSON do cursor; como Decimal é comparado sem erro de ponto flutuante
+        preco = Decimal(str(preco))
+        query = query.filter(or_(
+            models.Produto.preco > preco,
+            and_(models.Produto.preco == preco, models.Produto.produto_id > produto_id)
+        ))
+    return query.order_by(models.Produto.preco, models.Produto.produto_id).limit(limit + 1).all()
 
 def create_produto(db: Session, produto: ProdutoIn):
     existe = get_produto_by_nome(db, produto.nome)
@@ -80,10 +176,13 @@ def create_produto(db: Session, produto: ProdutoIn):
         if existe.status != 'INATIVO':
             raise ValueError(f"Produto de nome {produto.nome} já existe.")
     
+    _incrementa_catalogo_versao(db)
     db_produto = models.Produto(**produto.model_dump())
+    _marca_versao_catalogo(db_produto)
     db.add(db_produto)
     db.commit()
     db.refresh(db_produto)
+    cache.catalogo.invalidate()
     return db_produto
 
 def update_produto(db: Session, produto_id:int, produtoUpdate: ProdutoUpdate):
@@ -92,6 +191,7 @@ def update_produto(db: Session, produto_id:int, produtoUpdate: ProdutoUpdate):
     if db_produto is None:
         raise ValueError(f"Produto com id {produto_id} não encontrado.")
 
+    _incrementa_catalogo_versao(db)
     if produtoUpdate.nome is not None:
         db_produto.nome = produtoUpdate.nome
     if produtoUpdate.preco is not None:
@@ -99,8 +199,10 @@ def update_produto(db: Session, produto_id:int, produtoUpdate: ProdutoUpdate):
     if produtoUpdate.descricao is not None:
         db_produto.descricao = produtoUpdate.descricao
     db_produto.ultima_atualizacao = datetime.now()
+    _marca_versao_catalogo(db_produto)
     db.commit()
     db.refresh(db_produto)
+    cache.catalogo.invalidate(produto_id)
     return db_produto
 
 def delete_produto(db: Session, produto_id: int):
@@ -109,121 +211,290 @@ def delete_produto(db: Session, produto_id: int):
     if db_produto is None:
         raise ValueError(f"Produto com id {produto_id} não encontrado.")
 
+    _incrementa_catalogo_versao(db)
     db_produto.status = 'INATIVO'
+    _marca_versao_catalogo(db_produto)
 
     db.commit()
     db.refresh(db_produto)
-
+    cache.catalogo.invalidate(produto_id)
+
+
+# A busca usa o índice em memória de busca.py, sincronizado com os produtos gravados
+# depois da última versão do catálogo aplicada a ele.
+
+def carrega_indice_produtos(db: Session, desde: Optional[int], bloco: int = busca.BUSCA_CARGA_BLOCO):
+    '''
+    Gera, em blocos paginados por id, os produtos gravados depois da versão do catálogo
+    desde, ou todos com desde None, no formato lido por busca.IndiceProdutos.sincroniza.
+    '''
+    query = select(models.Produto.produto_id, models.Produto.nome, models.Produto.descricao, models.Produto.status, models.Produto.versao_catalogo)
+    if desde is not None:
+        query = query.where(models.Produto.versao_catalogo > desde)
+
+    ultimo = None
+    while True:
+        pagina = query if ultimo is None else query.where(models.Produto.produto_id > ultimo)
+        linhas = db.execute(pagina.order_by(models.Produto.produto_id).limit(bloco)).all()
+        if not linhas:
+            return
+        yield [tuple(linha) for linha in linhas]
+        if len(linhas) < bloco:
+            return
+        ultimo = linhas[-1].produto_id
+
+def sincroniza_indice_produtos(db: Session):
+    cache.catalogo.check_version(lambda: _get_catalogo_versao(db))
+    busca.indice.sincroniza(cache.catalogo.versao or 0, lambda desde: carrega_indice_produtos(db, desde))
+
+def busca_produtos(db: Session, q: str, limit: int = 20):
+    sincroniza_indice_produtos(db)
+
+    encontrados = busca.indice.busca(q, limit)
+    produtos = _get_produtos_por_id(db, [produto_id for produto_id, _ in encontrados])
+    # Um produto inativado depois da última sincronização fica de fora
+    return [
+        {**produtos[produto_id].model_dump(), "relevancia": relevancia}
+        for produto_id, relevancia in encontrados
+        if produto_id in produtos and produtos[produto_id].status == "ATIVO"
+    ]
+
+
+# Relações serializadas pelo schema Encomenda. A localização atual (muitos-para-um) vem
+# no mesmo SELECT via JOIN; os produtos vêm em uma única consulta IN para todas as
+# encomendas carregadas, então uma página custa sempre o mesmo número de consultas.
+ENCOMENDA_RELACOES = (
+    joinedload(models.Encomenda.localizacao_atual),
+    selectinload(models.Encomenda.produtos),
+)
 
 def get_encomenda(db: Session, encomenda_id: int):
-    db_encomenda = db.query(models.Encomenda).filter(models.Encomenda.encomenda_id == encomenda_id).first()
+    db_encomenda = db.query(models.Encomenda).options(*ENCOMENDA_RELACOES).filter(models.Encomenda.encomenda_id == encomenda_id).first()
 
     if db_encomenda is None:
         raise ValueError(f"Encomenda com id {encomenda_id} não encontrada.")
     
     return db_encomenda
 
-def get_encomendas(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Encomenda).offset(skip).limit(limit).all()
+def get_encomendas(db: Session, cursor: Optional[tuple] = None, limit: int = 100):
+    query = db.query(models.Encomenda).options(*ENCOMENDA_RELACOES)
+    if cursor is not None:
+        query = query.filter(models.Encomenda.encomenda_id > cursor[0])
+    return query.order_by(models.Encomenda.encomenda_id).limit(limit + 1).all()
 
-def get_encomendas_by_status(db: Session, status: str, skip: int = 0, limit: int = 100):
-    return db.query(models.Encomenda).filter(models.Encomenda.status == status).offset(skip).limit(limit).all()
+def get_encomendas_by_status(db: Session, status: str, cursor: Optional[tuple] = None, limit: int = 100):
+    query = db.query(models.Encomenda).options(*ENCOMENDA_RELACOES).filter(models.Encomenda.status == status)
+    if cursor is not None:
+        query = query.filter(models.Encomenda.encomenda_id > cursor[0])
+    return query.order_by(models.Encomenda.encomenda_id).limit(limit + 1).all()
 
 def create_encomenda(db: Session, encomenda: EncomendaIn):
-    db_encomenda = models.Encomenda(**encomenda.model_dump(exclude=['produtos', 'localizacaoAtual']))
-
     db_cliente = db.query(models.Cliente).filter(models.Cliente.cliente_id == encomenda.cliente_id).first()
 
     if db_cliente is None:
         raise ValueError(f"Cliente com id {encomenda.cliente_id} não encontrado.")
 
-    valor_total = 0
-    
-    encomenda_produtos = []
-    for produto_id, quantidade in encomenda.produtos.items():
-        db_produto = db.query(models.Produto).filter((models.Produto.produto_id == int(produto_id)) & (models.Produto.status == "ATIVO")).first()
-        
-        if db_produto is None:
+    quantidades = {int(produto_id): quantidade for produto_id, quantidade in encomenda.produtos.items()}
+
+    # Busca os produtos da encomenda no cache e os restantes em uma única consulta
+    precos = _get_precos_ativos(db, quantidades.keys())
+
+    for produto_id in quantidades:
+        if produto_id not in precos:
             raise ValueError(f"Produto com id {produto_id} não encontrado ou não é mais ativo.")
-        
-        valor_total += db_produto.preco * quantidade
 
-        db_encomenda_produto = models.EncomendaProduto(encomenda_id=db_encomenda.encomenda_id, produto_id=produto_id, quantidade=quantidade)
-        encomenda_produtos.append(db_encomenda_produto)
-    
-    db_encomenda.valor_total = valor_total
+    db_encomenda = models.Encomenda(**encomenda.model_dump(exclude=['produtos', 'localizacaoAtual']))
+    db_encomenda.valor_total = sum(precos[produto_id] * quantidade for produto_id, quantidade in quantidades.items())
 
-    db.add(db_encomenda)
-    db.commit()
-    db.refresh(db_encomenda)
+    # Encomenda, produtos e localização inicial são gravados em uma única transação
+    try:
+        db.add(db_encomenda)
+        db.flush()
 
-    for encomenda_produto in encomenda_produtos:
-        encomenda_produto.encomenda_id = db_encomenda.encomenda_id
-        db.add(encomenda_produto)
+        db.execute(insert(models.EncomendaProduto), [
+            {"encomenda_id": db_encomenda.encomenda_id, "produto_id": produto_id, "quantidade": quantidade}
+            for produto_id, quantidade in quantidades.items()
+        ])
 
-    # Cria EncomendaLocalizacao
-    db_localizacao = models.EncomendaLocalizacao(encomenda_id=db_encomenda.encomenda_id, localizacao=encomenda.localizacaoAtual)
-    db.add(db_localizacao)
-    db.commit()
-    db.refresh(db_localizacao)
+        db_localizacao = models.EncomendaLocalizacao(encomenda_id=db_encomenda.encomenda_id, localizacao=encomenda.localizacaoAtual)
+        db.add(db_localizacao)
+        db.flush()
 
-    db_encomenda.localizacao_atual_id = db_localizacao.localizacao_id
-    
-    db.add(db_encomenda)
-    db.commit()
-    db.refresh(db_encomenda)
+        db_encomenda.localizacao_atual_id = db_localizacao.localizacao_id
+        _aplica_resumos(db, _conta_resumo({}, db_encomenda.cliente_id, db_encomenda.status, 1, db_encomenda.valor_total))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
     return db_encomenda
 
+def _localizacao_mais_recente():
+    '''
+    Subconsulta correlacionada com o id da localização mais recente de cada encomenda do
+    UPDATE. Pelo índice (encomenda_id, data) o banco lê apenas a última entrada da
+    encomenda, em vez de percorrer todo o histórico como faria um MAX(localizacao_id).
+    '''
+    return (
+        select(models.EncomendaLocalizacao.localizacao_id)
+        .where(models.EncomendaLocalizacao.encomenda_id == models.Encomenda.encomenda_id)
+        .order_by(models.EncomendaLocalizacao.data.desc(), models.EncomendaLocalizacao.localizacao_id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+def create_encomendas_batch(db: Session, encomendas: list[EncomendaIn], chunk_size: int = 500):
+    resultados = []
+    for inicio in range(0, len(encomendas), chunk_size):
+        resultados.extend(_create_encomendas_chunk(db, encomendas[inicio:inicio + chunk_size], inicio))
+    return resultados
+
+def _create_encomendas_chunk(db: Session, encomendas: list[EncomendaIn], inicio: int):
+    resultados = [{"indice": inicio + i, "encomenda_id": None, "erro": None} for i in range(len(encomendas))]
+    quantidades = [{int(produto_id): quantidade for produto_id, quantidade in encomenda.produtos.items()} for encomenda in encomendas]
+
+    # Valida clientes e produtos de todo o bloco com uma consulta para cada (produtos em cache são reaproveitados)
+    cliente_ids = {encomenda.cliente_id for encomenda in encomendas}
+    clientes = set(db.scalars(select(models.Cliente.cliente_id).where(models.Cliente.cliente_id.in_(cliente_ids))))
+
+    precos = _get_precos_ativos(db, set().union(*quantidades))
+
+    validas = []
+    for resultado, encomenda, quantidade_produtos in zip(resultados, encomendas, quantidades):
+        if encomenda.cliente_id not in clientes:
+            resultado["erro"] = f"Cliente com id {encomenda.cliente_id} não encontrado."
+            continue
+
+        faltando = [produto_id for produto_id in quantidade_produtos if produto_id not in precos]
+        if faltando:
+            resultado["erro"] = f"Produto com id {faltando[0]} não encontrado ou não é mais ativo."
+            continue
+
+        validas.append((resultado, encomenda, quantidade_produtos, {
+            **encomenda.model_dump(exclude=['produtos', 'localizacaoAtual']),
+            "valor_total": sum(precos[produto_id] * quantidade for produto_id, quantidade in quantidade_produtos.items()),
+            "chave_lote": uuid.uuid4().hex,
+        }))
+
+    if not validas:
+        return resultados
+
+    try:
+        # As encomendas são inseridas com um executemany, sem ler o id de cada linha. Os
+        # ids gerados são recuperados depois em uma consulta pela chave_lote de cada uma
+        db.execute(insert(models.Encomenda), [linha for _, _, _, linha in validas])
+        ids = dict(db.execute(
+            select(models.Encomenda.chave_lote, models.Encomenda.encomenda_id)
+            .where(models.Encomenda.chave_lote.in_([linha["chave_lote"] for _, _, _, linha in validas]))
+        ).all())
+        for _, _, _, linha in validas:
+            linha["encomenda_id"] = ids[linha["chave_lote"]]
+
+        db.execute(insert(models.EncomendaProduto), [
+            {"encomenda_id": linha["encomenda_id"], "produto_id": produto_id, "quantidade": quantidade}
+            for _, _, quantidade_produtos, linha in validas
+            for produto_id, quantidade in quantidade_produtos.items()
+        ])
+        db.execute(insert(models.EncomendaLocalizacao), [
+            {"encomenda_id": linha["encomenda_id"], "localizacao": encomenda.localizacaoAtual}
+            for _, encomenda, _, linha in validas
+        ])
+
+        # Aponta a localização atual de todas as encomendas do bloco com um único UPDATE
+        encomenda_ids = [linha["encomenda_id"] for _, _, _, linha in validas]
+        db.execute(
+            update(models.Encomenda).where(models.Encomenda.encomenda_id.in_(encomenda_ids)).values(localizacao_atual_id=_localizacao_mais_recente()),
+            execution_options={"synchronize_session": False}
+        )
+
+        resumos = {}
+        for _, encomenda, _, linha in validas:
+            _conta_resumo(resumos, encomenda.cliente_id, EncomendaStatus.PENDENTE.value, 1, linha["valor_total"])
+        _aplica_resumos(db, resumos)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        for resultado, _, _, _ in validas:
+            resultado["erro"] = f"Erro ao criar encomenda: {e}"
+        return resultados
+
+    for resultado, _, _, linha in validas:
+        resultado["encomenda_id"] = linha["encomenda_id"]
+
+    return resultados
+
 def update_encomenda(db: Session, encomenda_id: int, encomenda: EncomendaUpdate):
     db_encomenda = db.query(models.Encomenda).filter(models.Encomenda.encomenda_id == encomenda_id).first()
 
     if db_encomenda is None:
         raise ValueError(f"Encomenda com id {encomenda_id} não encontrada.")
-    if encomenda.clienteId is not None:
-        db_cliente = db.query(models.Cliente).filter(models.Cliente.cliente_id == encomenda.clienteId).first()
-        if db_cliente is None:
-            raise ValueError(f"Cliente com id {encomenda.clienteId} não encontrado.")
-        db_encomenda.cliente_id = encomenda.clienteId
-    if encomenda.descricao is not None:
-        db_encomenda.descricao = encomenda.descricao
-    if encomenda.produtos is not None:
-        new_valor_total = 0
-        old_produtos = db.query(models.EncomendaProduto).filter(models.EncomendaProduto.encomenda_id == encomenda_id).all()
-
-        # Deleta os produtos antigos
-        for old_produto in old_produtos:
-            db.delete(old_produto)
-        db.commit()
-
-        new_encomenda_produto = []
-
-        for produto_id, quantidade in encomenda.produtos.items():
-            db_produto = db.query(models.Produto).filter(models.Produto.produto_id == int(produto_id)).first()
-            
-            if db_produto is None:
-                raise ValueError(f"Produto com id {produto_id} não encontrado.")
-
-            db_encomenda_produto = models.EncomendaProduto(encomenda_id=encomenda_id, produto_id=produto_id, quantidade=quantidade)
-            new_encomenda_produto.append(db_encomenda_produto)
-            new_valor_total += db_produto.preco * quantidade
-        
-        db_encomenda.valor_total = new_valor_total
-        
-        for new_produto in new_encomenda_produto:
-            db.add(new_produto)
-
-    if encomenda.localizacaoAtual is not None:
-        db_localizacao = models.EncomendaLocalizacao(encomenda_id=encomenda_id, localizacao=encomenda.localizacaoAtual)
-        db.add(db_localizacao)
 
+    resumos = _conta_resumo({}, db_encomenda.cliente_id, db_encomenda.status, -1, db_encomenda.valor_total)
+
+    # A encomenda, seus produtos, a localização e o resumo do cliente são gravados em uma única transação
+    try:
+        if encomenda.clienteId is not None:
+            db_cliente = db.query(models.Cliente).filter(models.Cliente.cliente_id == encomenda.clienteId).first()
+            if db_cliente is None:
+                raise ValueError(f"Cliente com id {encomenda.clienteId} não encontrado.")
+            db_encomenda.cliente_id = encomenda.clienteId
+        if encomenda.descricao is not None:
+            db_encomenda.descricao = encomenda.descricao
+        if encomenda.produtos is not None:
+            quantidades = {int(produto_id): quantidade for produto_id, quantidade in encomenda.produtos.items()}
+
+            # Valida os produtos no cache e os restantes em uma única consulta
+            produtos = _get_produtos_por_id(db, quantidades.keys())
+            for produto_id in quantidades:
+                if produto_id not in produtos:
+                    raise ValueError(f"Produto com id {produto_id} não encontrado.")
+
+            # Só as linhas que mudaram são gravadas: removidas, novas e com outra quantidade
+            atuais = dict(db.execute(
+                select(models.EncomendaProduto.produto_id, models.EncomendaProduto.quantidade)
+                .where(models.EncomendaProduto.encomenda_id == encomenda_id)
+            ).all())
+            removidos = [produto_id for produto_id in atuais if produto_id not in quantidades]
+            novos = [
+                {"encomenda_id": encomenda_id, "produto_id": produto_id, "quantidade": quantidade}
+                for produto_id, quantidade in quantidades.items() if produto_id not in atuais
+            ]
+            alterados = [
+                {"encomenda_id": encomenda_id, "produto_id": produto_id, "quantidade": quantidade}
+                for produto_id, quantidade in quantidades.items() if produto_id in atuais and atuais[produto_id] != quantidade
+            ]
+
+            if removidos:
+                db.execute(delete(models.EncomendaProduto).where(
+                    models.EncomendaProduto.encomenda_id == encomenda_id,
+                    models.EncomendaProduto.produto_id.in_(removidos),
+                ))
+            if novos:
+                db.execute(insert(models.EncomendaProduto), novos)
+            if alterados:
+                # UPDATE em lote pela chave primária (encomenda_id, produto_id)
+                db.execute(update(models.EncomendaProduto), alterados)
+
+            db_encomenda.valor_total = sum(produtos[produto_id].preco * quantidade for produto_id, quantidade in quantidades.items())
+            if removidos or novos or alterados:
+                # Os itens ficam em outra tabela: a versão da encomenda é incrementada mesmo que o total não mude
+                db_encomenda.versao = models.Encomenda.versao + 1
+
+        if encomenda.localizacaoAtual is not None:
+            db_localizacao = models.EncomendaLocalizacao(encomenda_id=encomenda_id, localizacao=encomenda.localizacaoAtual)
+            db.add(db_localizacao)
+            db.flush()
+
+            db_encomenda.localizacao_atual_id = db_localizacao.localizacao_id
+
+        db.add(db_encomenda)
+        _conta_resumo(resumos, db_encomenda.cliente_id, db_encomenda.status, 1, db_encomenda.valor_total)
+        _aplica_resumos(db, resumos)
         db.commit()
-        db.refresh(db_localizacao)
+    except Exception:
+        db.rollback()
+        raise
 
-        db_encomenda.localizacao_atual_id = db_localizacao.localizacao_id
-
-    db.add(db_encomenda)
-    db.commit()
     db.refresh(db_encomenda)
 
     return db_encomenda
@@ -232,7 +503,10 @@ def update_encomenda_status(db: Session, encomenda_id: int, status: str):
     db_encomenda = db.query(models.Encomenda).filter(models.Encomenda.encomenda_id == encomenda_id).first()
     if db_encomenda is None:
         raise ValueError(f"Encomenda com id {encomenda_id} não encontrada.")
+    resumos = _conta_resumo({}, db_encomenda.cliente_id, db_encomenda.status, -1, db_encomenda.valor_total)
     db_encomenda.status = status
+    _conta_resumo(resumos, db_encomenda.cliente_id, status, 1, db_encomenda.valor_total)
+    _aplica_resumos(db, resumos)
     db.commit()
     db.refresh(db_encomenda)
     return db_encomenda
@@ -242,24 +516,169 @@ def delete_encomenda(db: Session, encomenda_id: int):
 
     if db_encomenda is None:
         raise ValueError(f"Encomenda com id {encomenda_id} não encontrada.")
-    
-    db_encomenda.localizacao_atual_id = None
-    db.add(db_encomenda)
-    db.commit()
-    
-    db_encomenda_produtos = db.query(models.EncomendaProduto).filter(models.EncomendaProduto.encomenda_id == encomenda_id).all()
-    db_encomenda_localizacao = db.query(models.EncomendaLocalizacao).filter(models.EncomendaLocalizacao.encomenda_id == encomenda_id).all()
 
-    for produto in db_encomenda_produtos:
-        db.delete(produto)
-    
-    for localizacao in db_encomenda_localizacao:
-        db.delete(localizacao)
-
-    db.commit()
+    try:
+        _aplica_resumos(db, _conta_resumo({}, db_encomenda.cliente_id, db_encomenda.status, -1, db_encomenda.valor_total))
+        _remove_encomendas(db, [encomenda_id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _remove_encomendas(db: Session, encomenda_ids: list[int]):
+    '''
+    Apaga as encomendas, os seus itens e as suas localizações com um DELETE por tabela,
+    sem carregar as linhas. A localização atual é desligada antes, já que encomendas e
+    localizações apontam umas para as outras.
+    '''
+    db.execute(
+        update(models.Encomenda).where(models.Encomenda.encomenda_id.in_(encomenda_ids)).values(localizacao_atual_id=None),
+        execution_options={"synchronize_session": False}
+    )
+    for modelo in (models.EncomendaProduto, models.EncomendaLocalizacao, models.Encomenda):
+        db.execute(delete(modelo).where(modelo.encomenda_id.in_(encomenda_ids)))
+
+ARQUIVAVEIS = (EncomendaStatus.ENTREGUE.value, EncomendaStatus.CANCELADA.value)
+
+def arquiva_encomendas(db: Session, antes_de: datetime, lote: int = 500, depois_de: int = 0):
+    '''
+    Move um lote de até `lote` encomendas ENTREGUE ou CANCELADA, sem alterações desde
+    antes_de, com ids maiores que depois_de, para as tabelas de arquivo, junto com os
+    itens e as localizações, em uma transação curta. As encomendas do lote são travadas
+    com SKIP LOCKED: uma encomenda sendo alterada fica para a próxima execução, em vez
+    de o arquivamento esperar por ela. O resumo do cliente não muda: as encomendas
+    arquivadas continuam contadas em clientes_resumos.
+
+    Retorna as linhas movidas de cada tabela e o último id do lote, a partir do qual o
+    próximo lote é buscado, ou None se não houver mais encomendas a arquivar.
+    '''
+    alteracao = func.coalesce(models.Encomenda.ultima_atualizacao, models.Encomenda.data_criacao)
+    ids = db.scalars(
+        select(models.Encomenda.encomenda_id)
+        .where(
+            models.Encomenda.status.in_(ARQUIVAVEIS),
+            models.Encomenda.encomenda_id > depois_de,
+            # Encomendas gravadas antes das colunas de data não têm nenhuma das duas
+            or_(alteracao.is_(None), alteracao < antes_de),
+        )
+        .order_by(models.Encomenda.encomenda_id)
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        db.rollback()
+        return None
+
+    def copia(arquivo, origem, colunas, filtro, **extras):
+        return db.execute(insert(arquivo).from_select(
+            colunas + list(extras),
+            select(*(getattr(origem, coluna) for coluna in colunas), *(literal(valor) for valor in extras.values())).where(filtro),
+        )).rowcount
+
+    try:
+        movidas = {
+            "encomendas": copia(
+                models.EncomendaArquivo, models.Encomenda,
+                ["encomenda_id", "cliente_id", "descricao", "valor_total", "status", "localizacao_atual_id", "data_criacao", "ultima_atualizacao"],
+                models.Encomenda.encomenda_id.in_(ids), arquivado_em=datetime.now(),
+            ),
+            "itens": copia(
+                models.EncomendaProdutoArquivo, models.EncomendaProduto,
+                ["encomenda_id", "produto_id", "quantidade"],
+                models.EncomendaProduto.encomenda_id.in_(ids),
+            ),
+            "localizacoes": copia(
+                models.EncomendaLocalizacaoArquivo, models.EncomendaLocalizacao,
+                ["localizacao_id", "encomenda_id", "localizacao", "data"],
+                models.EncomendaLocalizacao.encomenda_id.in_(ids),
+            ),
+        }
+        _remove_encomendas(db, ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return movidas, ids[-1]
+
+# Localizações apagadas por DELETE na compactação do histórico
+LOCALIZACOES_POR_DELETE = 1000
+
+def compacta_localizacoes(db: Session, politicas: dict[str, tuple[int, int]], lote: int = 500, depois_de: int = 0, agora: Optional[datetime] = None):
+    '''
+    Reduz o histórico de localizações de um lote de até `lote` encomendas com ids maiores
+    que depois_de. politicas associa um status a (dias, minutos): as encomendas nesse
+    status sem alterações há mais de `dias` dias ficam com a primeira e a última
+    localização e com uma a cada `minutos` minutos (só a primeira e a última com 0).
+    Encomendas em status sem política mantêm o histórico completo. A localização atual
+    de cada encomenda nunca é apagada, e as encomendas do lote são travadas com SKIP
+    LOCKED, então o ponteiro não muda durante a compactação. Compactar de novo um
+    histórico já compactado não apaga nada.
+
+    Retorna as encomendas, localizações lidas e localizações removidas do lote e o
+    último id, a partir do qual o próximo lote é buscado, ou None se não houver mais
+    encomendas a compactar.
+    '''
+    agora = agora or datetime.now()
+    alteracao = func.coalesce(models.Encomenda.ultima_atualizacao, models.Encomenda.data_criacao)
+    encomendas = db.execute(
+        select(models.Encomenda.encomenda_id, models.Encomenda.status, models.Encomenda.localizacao_atual_id)
+        .where(
+            models.Encomenda.encomenda_id > depois_de,
+            or_(*(
+                and_(models.Encomenda.status == status, or_(alteracao.is_(None), alteracao < agora - timedelta(days=dias)))
+                for status, (dias, _) in politicas.items()
+            )),
+        )
+        .order_by(models.Encomenda.encomenda_id)
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not encomendas:
+        db.rollback()
+        return None
+
+    por_encomenda = {encomenda.encomenda_id: encomenda for encomenda in encomendas}
+    historicos = {}
+    for localizacao_id, encomenda_id, data in db.execute(
+        select(models.EncomendaLocalizacao.localizacao_id, models.EncomendaLocalizacao.encomenda_id, models.EncomendaLocalizacao.data)
+        .where(models.EncomendaLocalizacao.encomenda_id.in_(por_encomenda))
+        .order_by(models.EncomendaLocalizacao.encomenda_id, models.EncomendaLocalizacao.data, models.EncomendaLocalizacao.localizacao_id)
+    ):
+        historicos.setdefault(encomenda_id, []).append((localizacao_id, data))
+
+    removidas = []
+    for encomenda_id, historico in historicos.items():
+        encomenda = por_encomenda[encomenda_id]
+        intervalo = timedelta(minutes=politicas[encomenda.status][1])
+        ultima_mantida = None
+        for i, (localizacao_id, data) in enumerate(historico):
+            mantem = (
+                i == 0 or i == len(historico) - 1
+                or localizacao_id == encomenda.localizacao_atual_id
+                or (intervalo and (data is None or ultima_mantida is None or data - ultima_mantida >= intervalo))
+            )
+            if mantem:
+                ultima_mantida = data
+            else:
+                removidas.append(localizacao_id)
+
+    try:
+        for inicio in range(0, len(removidas), LOCALIZACOES_POR_DELETE):
+            db.execute(
+                delete(models.EncomendaLocalizacao).where(models.EncomendaLocalizacao.localizacao_id.in_(removidas[inicio:inicio + LOCALIZACOES_POR_DELETE])),
+                execution_options={"synchronize_session": False}
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-    db.delete(db_encomenda)
-    db.commit()
+    return {
+        "encomendas": len(encomendas),
+        "localizacoes_lidas": sum(len(historico) for historico in historicos.values()),
+        "localizacoes_removidas": len(removidas),
+    }, encomendas[-1].encomenda_id
 
 def update_localizacao_encomenda(db: Session, localizacao: EncomendaLocalizacao):
     db_encomenda = db.query(models.Encomenda).filter(models.Encomenda.encomenda_id == localizacao.encomenda_id).first()
@@ -279,10 +698,60 @@ def update_localizacao_encomenda(db: Session, localizacao: EncomendaLocalizacao)
     db.refresh(db_encomenda)
     return db_encomenda
 
-def get_encomenda_localizacao(db: Session, encomenda_id: int):
-    localizacoes = db.query(models.EncomendaLocalizacao).filter(models.EncomendaLocalizacao.encomenda_id == encomenda_id).all()
+def flush_localizacoes(db: Session, localizacoes: list[tuple[int, str, datetime]]):
+    '''
+    Grava em lote localizações (encomenda_id, localizacao, data) enfileiradas pelo
+    localizacao_buffer. Localizações de encomendas inexistentes são descartadas.
+    Retorna as localizações gravadas, em ordem de data.
+    '''
+    encomenda_ids = {encomenda_id for encomenda_id, _, _ in localizacoes}
+    existentes = set(db.scalars(select(models.Encomenda.encomenda_id).where(models.Encomenda.encomenda_id.in_(encomenda_ids))))
+
+    # Ordena por data para que os pings de cada encomenda sejam gravados em ordem
+    linhas = sorted(
+        ({"encomenda_id": encomenda_id, "localizacao": localizacao, "data": data} for encomenda_id, localizacao, data in localizacoes if encomenda_id in existentes),
+        key=lambda linha: linha["data"]
+    )
+    if not linhas:
+        return []
+
+    try:
+        db.execute(insert(models.EncomendaLocalizacao), linhas)
 
-    if not localizacoes:
+        # Cada encomenda tem a localização atual atualizada uma única vez, para o último ping do lote
+        db.execute(
+            update(models.Encomenda).where(models.Encomenda.encomenda_id.in_(existentes)).values(localizacao_atual_id=_localizacao_mais_recente()),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return [(linha["encomenda_id"], linha["localizacao"], linha["data"]) for linha in linhas]
+
+def encomenda_localizacao_query(encomenda_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: Optional[int] = None):
+    '''
+    Monta o SELECT do histórico de localizações de uma encomenda, em ordem cronológica,
+    usando o índice (encomenda_id, data).
+    '''
+    query = select(models.EncomendaLocalizacao).where(models.EncomendaLocalizacao.encomenda_id == encomenda_id)
+    if since is not None:
+        query = query.where(models.EncomendaLocalizacao.data >= since)
+    if until is not None:
+        query = query.where(models.EncomendaLocalizacao.data < until)
+    query = query.order_by(models.EncomendaLocalizacao.data, models.EncomendaLocalizacao.localizacao_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def encomenda_existe(db: Session, encomenda_id: int) -> bool:
+    return db.scalar(select(models.Encomenda.encomenda_id).where(models.Encomenda.encomenda_id == encomenda_id)) is not None
+
+def get_encomenda_localizacao(db: Session, encomenda_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: Optional[int] = None):
+    localizacoes = db.scalars(encomenda_localizacao_query(encomenda_id, since, until, limit)).all()
+
+    if not localizacoes and since is None and until is None:
         raise ValueError(f"Localizações da encomenda com id {encomenda_id} não encontradas.")
 
     return localizacoes
@@ -297,9 +766,170 @@ def get_encomenda_produtos(db: Session, encomenda_id: int):
     return produtos
 
 def get_cliente_encomendas(db: Session, cliente_id: int):
-    encomendas = db.query(models.Encomenda).filter(models.Encomenda.cliente_id == cliente_id).all()
+    encomendas = db.query(models.Encomenda).options(*ENCOMENDA_RELACOES).filter(models.Encomenda.cliente_id == cliente_id).all()
 
     if not encomendas:
         raise ValueError(f"Encomendas do cliente com id {cliente_id} não encontradas.")
 
-    return encomendas
\ No newline at end of file
+    return encomendas
+
+# Resumo das encomendas de cada cliente (clientes_resumos): cada escrita em encomendas
+# aplica, na própria transação, a diferença que causou na quantidade e no valor de
+# cada (cliente, status). Os valores são arredondados a centavos como no ROUND da
+# reconstrução, para que as duas contas coincidam.
+
+def _centavos(valor) -> Decimal:
+    return Decimal(str(valor or 0)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+def _conta_resumo(resumos: dict, cliente_id: Optional[int], status: Optional[str], quantidade: int, valor):
+    if cliente_id is None or status is None:
+        return resumos
+    atual_quantidade, atual_valor = resumos.get((cliente_id, status), (0, Decimal(0)))
+    resumos[(cliente_id, status)] = (atual_quantidade + quantidade, atual_valor + quantidade * _centavos(valor))
+    return resumos
+
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _aplica_resumos(db: Session, resumos: dict):
+    linhas = [
+        {"cliente_id": cliente_id, "status": status, "quantidade": quantidade, "valor_total": valor}
+        for (cliente_id, status), (quantidade, valor) in resumos.items()
+        if quantidade or valor
+    ]
+    if not linhas:
+        return
+
+    # Upsert: a linha de um (cliente, status) é criada na primeira encomenda e somada nas seguintes
+    tabela = models.ResumoCliente.__table__
+    dialeto = db.get_bind().dialect.name
+    if dialeto == "mysql":
+        stmt = mysql.insert(tabela)
+        stmt = stmt.on_duplicate_key_update(
+            quantidade=tabela.c.quantidade + stmt.inserted.quantidade,
+            valor_total=tabela.c.valor_total + stmt.inserted.valor_total,
+        )
+    else:
+        stmt = _UPSERTS[dialeto](tabela)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabela.c.cliente_id, tabela.c.status],
+            set_={"quantidade": tabela.c.quantidade + stmt.excluded.quantidade, "valor_total": tabela.c.valor_total + stmt.excluded.valor_total},
+        )
+    db.execute(stmt, linhas)
+
+def get_cliente_resumo(db: Session, cliente_id: int):
+    resumos = db.scalars(select(models.ResumoCliente).where(models.ResumoCliente.cliente_id == cliente_id)).all()
+    if not resumos:
+        # Sem encomendas, o resumo só existe se o cliente existir
+        get_cliente(db, cliente_id)
+
+    por_status = {status.value: {"quantidade": 0, "valor_total": Decimal(0)} for status in EncomendaStatus}
+    for resumo in resumos:
+        por_status[resumo.status] = {"quantidade": resumo.quantidade, "valor_total": resumo.valor_total}
+
+    # A encomenda de maior id é a mais recente, entre as ativas e as arquivadas, que também
+    # contam no resumo; lida pelo índice (cliente_id, encomenda_id) de cada tabela
+    ultimas = [
+        db.execute(
+            select(modelo.encomenda_id, modelo.data_criacao)
+            .where(modelo.cliente_id == cliente_id)
+            .order_by(modelo.encomenda_id.desc())
+            .limit(1)
+        ).first()
+        for modelo in (models.Encomenda, models.EncomendaArquivo)
+    ]
+    ultima_encomenda = max((ultima for ultima in ultimas if ultima is not None), default=(None, None))[1]
+
+    return {
+        "cliente_id": cliente_id,
+        "total_encomendas": sum(resumo["quantidade"] for resumo in por_status.values()),
+        "valor_gasto": sum(resumo["valor_total"] for status, resumo in por_status.items() if status != EncomendaStatus.CANCELADA.value),
+        "ultima_encomenda": ultima_encomenda,
+        "por_status": por_status,
+    }
+
+def _resumos_calculados():
+    # As encomendas arquivadas continuam no resumo do cliente
+    encomendas = union_all(*(
+        select(modelo.cliente_id, modelo.status, func.round(modelo.valor_total, 2).label("valor_total"))
+        .where(modelo.cliente_id.is_not(None), modelo.status.is_not(None))
+        for modelo in (models.Encomenda, models.EncomendaArquivo)
+    )).subquery()
+    return (
+        select(encomendas.c.cliente_id, encomendas.c.status, func.count(), func.sum(encomendas.c.valor_total))
+        .group_by(encomendas.c.cliente_id, encomendas.c.status)
+    )
+
+def diferencas_resumos(db: Session):
+    '''
+    Compara clientes_resumos com os resumos recalculados a partir de encomendas e de
+    encomendas_arquivo.
+    Retorna um item para cada (cliente, status) divergente.
+    '''
+    esperados = {
+        (cliente_id, status): (quantidade, _centavos(valor))
+        for cliente_id, status, quantidade, valor in db.execute(_resumos_calculados())
+    }
+    gravados = {
+        (resumo.cliente_id, resumo.status): (resumo.quantidade, _centavos(resumo.valor_total))
+        for resumo in db.scalars(select(models.ResumoCliente))
+    }
+
+    diferencas = []
+    for chave in sorted(esperados.keys() | gravados.keys()):
+        esperado = esperados.get(chave, (0, Decimal("0.00")))
+        gravado = gravados.get(chave, (0, Decimal("0.00")))
+        if esperado != gravado:
+            diferencas.append({
+                "cliente_id": chave[0],
+                "status": chave[1],
+                "esperado": {"quantidade": esperado[0], "valor_total": str(esperado[1])},
+                "gravado": {"quantidade": gravado[0], "valor_total": str(gravado[1])},
+            })
+    return diferencas
+
+def reconstroi_resumos(db: Session):
+    '''
+    Recalcula clientes_resumos a partir de encomendas e de encomendas_arquivo em uma
+    única transação.
+    '''
+    try:
+        db.execute(delete(models.ResumoCliente))
+        db.execute(insert(models.ResumoCliente).from_select(
+            ["cliente_id", "status", "quantidade", "valor_total"],
+            _resumos_calculados()
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+# Tabelas exportadas para análise e, para cada uma, a coluna de data e a coluna de
+# status usadas nos filtros. Itens e localizações são filtrados pelo status da encomenda.
+EXPORTACAO_TABELAS = {
+    "encomendas": (models.Encomenda, models.Encomenda.data_criacao, models.Encomenda.status),
+    "encomendas_produtos": (models.EncomendaProduto, models.Encomenda.data_criacao, models.Encomenda.status),
+    "produtos": (models.Produto, models.Produto.ultima_atualizacao, models.Produto.status),
+    "encomendas_localizacoes": (models.EncomendaLocalizacao, models.EncomendaLocalizacao.data, models.Encomenda.status),
+}
+
+def exportacao_query(tabela: str, desde: Optional[datetime] = None, ate: Optional[datetime] = None, status: Optional[str] = None):
+    '''
+    Monta o SELECT das colunas de uma tabela exportada, em ordem de chave primária,
+    filtrado por data (desde inclusive, ate exclusive) e por status.
+    '''
+    if tabela not in EXPORTACAO_TABELAS:
+        raise ValueError(f"Tabela {tabela} não pode ser exportada.")
+    modelo, coluna_data, coluna_status = EXPORTACAO_TABELAS[tabela]
+
+    query = select(*modelo.__table__.columns)
+    filtra_data = desde is not None or ate is not None
+    if (filtra_data and coluna_data.class_ is not modelo) or (status is not None and coluna_status.class_ is not modelo):
+        query = query.join(models.Encomenda, models.Encomenda.encomenda_id == modelo.encomenda_id)
+    if desde is not None:
+        query = query.where(coluna_data >= desde)
+    if ate is not None:
+        query = query.where(coluna_data < ate)
+    if status is not None:
+        query = query.where(coluna_status == status)
+    return query.order_by(*modelo.__table__.primary_key.columns)
@@ -1,18 +1,359 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from dotenv import load_dotenv
+from fastapi import Depends
+from starlette.requests import Request
+from threading import Lock
+from typing import Optional
+import asyncio
+import logging
 import os
+import time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Configuração do pool de conexões, por worker do gunicorn
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Réplicas de leitura, separadas por vírgula, e os seus pesos na mesma ordem (padrão 1).
+# Sem réplicas, todas as rotas usam o primário
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DATABASE_REPLICA_PESOS = [int(peso) for peso in os.getenv("DATABASE_REPLICA_PESOS", "").split(",") if peso.strip()]
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_REPLICA_CHECK_TIMEOUT = float(os.getenv("DB_REPLICA_CHECK_TIMEOUT", "2"))
+# Segundos em que um cliente continua lendo do primário depois de uma escrita
+DB_PRIMARIO_APOS_ESCRITA = float(os.getenv("DB_PRIMARIO_APOS_ESCRITA", "5"))
+
+# Limites (em segundos) do histograma de espera por uma conexão do pool
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+
+class PoolMetrics:
+    '''
+    Acumula as métricas de checkout de um pool: tempo de espera, timeouts e
+    conexões abertas além do pool_size (overflow).
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.overflow_events = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(POOL_WAIT_BUCKETS)
+
+    def record_checkout(self, wait: float, opened_overflow: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            for i, limite in enumerate(POOL_WAIT_BUCKETS):
+                if wait <= limite:
+                    self.wait_buckets[i] += 1
+                    break
+            if opened_overflow:
+                self.overflow_events += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": POOL_MAX_OVERFLOW,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "overflow_events": self.overflow_events,
+                "wait_seconds": {
+                    "total": self.wait_total,
+                    "max": self.wait_max,
+                    "mean": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                    "buckets": {
+                        ("+Inf" if limite == float("inf") else str(limite)): sum(self.wait_buckets[:i + 1])
+                        for i, limite in enumerate(POOL_WAIT_BUCKETS)
+                    },
+                },
+            }
+
+
+class _MeasuredPoolMixin:
+    '''
+    Mede quanto tempo cada checkout espera por uma conexão. A instância de
+    PoolMetrics fica na classe para sobreviver ao Pool.recreate().
+    '''
+    metrics: PoolMetrics
+
+    def connect(self):
+        overflow_antes = self.overflow()
+        inicio = time.perf_counter()
+        try:
+            conexao = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            logger.warning("Timeout ao obter conexão do pool após %.1fs (%s)", time.perf_counter() - inicio, self.status())
+            raise
+        overflow_depois = self.overflow()
+        self.metrics.record_checkout(time.perf_counter() - inicio, overflow_depois > 0 and overflow_depois > overflow_antes)
+        return conexao
+
+
+class MeasuredQueuePool(_MeasuredPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+
+class MeasuredAsyncQueuePool(_MeasuredPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+POOL_OPTIONS = {
+    "pool_size": POOL_SIZE,
+    "max_overflow": POOL_MAX_OVERFLOW,
+    "pool_timeout": POOL_TIMEOUT,
+    "pool_recycle": POOL_RECYCLE,
+    "pool_pre_ping": POOL_PRE_PING,
+}
+
+# Drivers assíncronos equivalentes aos drivers síncronos suportados
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def get_async_database_url(url: str) -> str:
+    '''
+    Deriva a URL assíncrona do banco a partir da URL síncrona, trocando o driver.
+    Pode ser sobrescrita pela variável de ambiente ASYNC_DATABASE_URL.
+    '''
+    async_url = os.getenv("ASYNC_DATABASE_URL")
+    if async_url:
+        return async_url
+    return _troca_driver(url)
+
+def _troca_driver(url: str) -> str:
+    sync_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sync_url.drivername, sync_url.drivername)
+    return sync_url.set(drivername=drivername).render_as_string(hide_password=False)
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=MeasuredQueuePool,
+    **POOL_OPTIONS
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+async_engine = create_async_engine(
+    get_async_database_url(SQLALCHEMY_DATABASE_URL),
+    poolclass=MeasuredAsyncQueuePool,
+    **POOL_OPTIONS
+)
+
+# expire_on_commit=False para que os objetos retornados possam ser serializados
+# após o commit sem disparar novas consultas fora do event loop
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+
+class Replica:
+    '''
+    Réplica de leitura com o seu próprio engine assíncrono e pool, medido como o do
+    primário. atual é o peso acumulado usado pelo round-robin ponderado.
+    '''
+    def __init__(self, url: str, peso: int = 1):
+        self.url = make_url(url).render_as_string(hide_password=True)
+        self.peso = peso
+        pool = type("MeasuredReplicaPool", (MeasuredAsyncQueuePool,), {"metrics": PoolMetrics()})
+        self.engine = create_async_engine(_troca_driver(url), poolclass=pool, **POOL_OPTIONS)
+        self.sessoes = async_sessionmaker(self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+        self.saudavel = True
+        self.erro: Optional[str] = None
+        self.atual = 0
+        self.leituras = 0
+        self.falhas = 0
+
+
+class Replicas:
+    '''
+    Distribui as sessões de leitura entre as réplicas saudáveis por round-robin
+    ponderado suave: cada réplica recebe leituras na proporção do seu peso, intercaladas
+    em vez de em rajadas. Uma tarefa do worker confere as réplicas a cada intervalo com
+    um SELECT 1; uma réplica que falha nessa verificação, ou com erro de conexão em uma
+    leitura, deixa de receber leituras até passar na verificação seguinte. Sem réplicas
+    saudáveis as leituras vão para o primário. Usado apenas no event loop do worker.
+    '''
+    def __init__(self, replicas: list[Replica], intervalo: float = DB_REPLICA_CHECK_INTERVAL, timeout: float = DB_REPLICA_CHECK_TIMEOUT):
+        self.replicas = replicas
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.leituras_primario = 0
+        self._tarefa: Optional[asyncio.Task] = None
+        for replica in replicas:
+            event.listen(replica.engine.sync_engine, "handle_error", self._erro_de_conexao(replica))
+
+    def _erro_de_conexao(self, replica: Replica):
+        # As rotas convertem os erros em HTTPException, então a falha é vista no engine
+        def handle_error(contexto):
+            if contexto.is_disconnect or contexto.connection is None:
+                self.marca_falha(replica, contexto.original_exception)
+        return handle_error
+
+    def escolhe(self) -> Optional[Replica]:
+        saudaveis = [replica for replica in self.replicas if replica.saudavel]
+        if not saudaveis:
+            return None
+        for replica in saudaveis:
+            replica.atual += replica.peso
+        escolhida = max(saudaveis, key=lambda replica: replica.atual)
+        escolhida.atual -= sum(replica.peso for replica in saudaveis)
+        escolhida.leituras += 1
+        return escolhida
+
+    def marca_falha(self, replica: Replica, erro: Exception):
+        replica.falhas += 1
+        replica.erro = f"{erro}" or type(erro).__name__
+        if replica.saudavel:
+            replica.saudavel = False
+            logger.warning("Réplica %s fora do rodízio: %s", replica.url, erro)
+
+    async def _verifica(self, replica: Replica):
+        async def consulta():
+            async with replica.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        try:
+            await asyncio.wait_for(consulta(), self.timeout)
+        except Exception as e:
+            self.marca_falha(replica, e)
+            return
+        if not replica.saudavel:
+            logger.info("Réplica %s de volta ao rodízio", replica.url)
+        replica.saudavel = True
+        replica.erro = None
+
+    async def verifica(self):
+        await asyncio.gather(*(self._verifica(replica) for replica in self.replicas))
+
+    async def _verifica_periodicamente(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            await self.verifica()
+
+    async def start(self):
+        if self.replicas:
+            await self.verifica()
+            self._tarefa = asyncio.create_task(self._verifica_periodicamente())
+
+    async def stop(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "leituras_primario": self.leituras_primario,
+            "primario_apos_escrita_segundos": DB_PRIMARIO_APOS_ESCRITA,
+            "replicas": [
+                {"url": replica.url, "peso": replica.peso, "saudavel": replica.saudavel, "erro": replica.erro, "leituras": replica.leituras, "falhas": replica.falhas}
+                for replica in self.replicas
+            ],
+        }
+
+
+replicas = Replicas([
+    Replica(url, DATABASE_REPLICA_PESOS[i] if i < len(DATABASE_REPLICA_PESOS) else 1)
+    for i, url in enumerate(DATABASE_REPLICA_URLS)
+])
+
+def get_pool_metrics() -> dict:
+    return {
+        "async": MeasuredAsyncQueuePool.metrics.snapshot(async_engine.pool),
+        "sync": MeasuredQueuePool.metrics.snapshot(engine.pool),
+        "replicas": {replica.url: type(replica.engine.pool).metrics.snapshot(replica.engine.pool) for replica in replicas.replicas},
+    }
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Cookie com o instante (epoch) até o qual o cliente lê do primário, para que veja as
+# próprias escritas mesmo com as réplicas atrasadas. Vale para qualquer worker
+COOKIE_PRIMARIO = "db_primario"
+
+def le_do_primario(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(COOKIE_PRIMARIO, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_sessoes_leitura(request: Request):
+    '''
+    Fábrica de sessões das rotas que só leem: a de uma réplica escolhida por
+    replicas.escolhe, ou a do primário se não houver réplica saudável ou se o cliente
+    escreveu há pouco. Escolhida uma vez por requisição, como toda dependência.
+    '''
+    replica = None if le_do_primario(request) else replicas.escolhe()
+    if replica is None:
+        replicas.leituras_primario += 1
+        return AsyncSessionLocal
+    return replica.sessoes
+
+async def get_db_leitura(sessoes: async_sessionmaker = Depends(get_sessoes_leitura)):
+    '''
+    Sessão da fábrica escolhida por get_sessoes_leitura. Respostas em streaming, que
+    continuam depois que a sessão da dependência é fechada, abrem a sua própria sessão
+    com get_sessoes_leitura.
+    '''
+    async with sessoes() as db:
+        yield db
+
+
+class PrimarioAposEscritaMiddleware:
+    '''
+    Middleware ASGI que, havendo réplicas, marca com o cookie COOKIE_PRIMARIO os
+    clientes cujas escritas (métodos que não são GET, HEAD ou OPTIONS) tiveram sucesso.
+    '''
+    def __init__(self, app, janela: float = DB_PRIMARIO_APOS_ESCRITA):
+        self.app = app
+        self.janela = janela
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replicas.replicas or self.janela <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marcando(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = f"{COOKIE_PRIMARIO}={time.time() + self.janela:.3f}; Max-Age={int(self.janela) or 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_marcando)
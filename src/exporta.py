@@ -0,0 +1,53 @@
+"""
+Exporta uma tabela para análise em Parquet, Arrow IPC (stream) ou CSV, lendo de um
+cursor do lado do servidor em blocos, com memória limitada a um bloco.
+
+Tabelas: encomendas, encomendas_produtos, produtos e encomendas_localizacoes. As
+datas filtram a criação da encomenda, a data da localização ou a última atualização
+do produto; o status filtra a encomenda (ou o produto, em produtos).
+
+Uso (a partir de src/):
+
+    python exporta.py encomendas --formato parquet --desde 2026-01-01 --status ENTREGUE
+    python exporta.py encomendas_localizacoes --formato csv --saida - > localizacoes.csv
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import crud
+import exportacao
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tabela", choices=sorted(crud.EXPORTACAO_TABELAS))
+    parser.add_argument("--formato", choices=sorted(exportacao.FORMATOS), default=exportacao.formato_padrao())
+    parser.add_argument("--saida", help="arquivo de saída; - para a saída padrão (padrão: <tabela>.<extensão>)")
+    parser.add_argument("--desde", type=datetime.fromisoformat)
+    parser.add_argument("--ate", type=datetime.fromisoformat)
+    parser.add_argument("--status")
+    parser.add_argument("--chunk-size", type=int, default=exportacao.EXPORTACAO_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    try:
+        exportacao.valida_formato(args.formato)
+    except ValueError as e:
+        parser.error(f"{e}")
+
+    saida = args.saida or f"{args.tabela}.{exportacao.FORMATOS[args.formato][1]}"
+    inicio = time.perf_counter()
+    if saida == "-":
+        linhas = exportacao.exporta(sys.stdout.buffer, args.tabela, args.formato, args.desde, args.ate, args.status, args.chunk_size)
+    else:
+        with open(saida, "wb") as destino:
+            linhas = exportacao.exporta(destino, args.tabela, args.formato, args.desde, args.ate, args.status, args.chunk_size)
+
+    print(json.dumps({"tabela": args.tabela, "formato": args.formato, "saida": saida, "linhas": linhas, "segundos": round(time.perf_counter() - inicio, 2)}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
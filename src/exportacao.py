@@ -0,0 +1,149 @@
+from contextlib import nullcontext
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Optional
+import asyncio
+import csv
+import io
+import os
+
+from sqlalchemy import DateTime, Float, Integer, Numeric, Table
+from sqlalchemy.orm import Session
+
+import crud
+from database import AsyncSessionLocal, SessionLocal
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # sem pyarrow a exportação só está disponível em CSV
+    pyarrow = None
+
+# Linhas lidas do cursor do servidor e gravadas de cada vez; cada bloco vira um
+# row group no Parquet e um record batch no Arrow
+EXPORTACAO_CHUNK_SIZE = int(os.getenv("EXPORTACAO_CHUNK_SIZE", "50000"))
+
+FORMATOS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def formato_padrao() -> str:
+    return "parquet" if pyarrow is not None else "csv"
+
+def valida_formato(formato: str):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato {formato} não suportado.")
+    if formato != "csv" and pyarrow is None:
+        raise ValueError(f"Formato {formato} indisponível sem o pacote pyarrow; use csv.")
+
+
+class _Saida(io.RawIOBase):
+    '''
+    Destino dos escritores do pyarrow que só acumula os bytes escritos, para que
+    cada bloco seja enviado e descartado em seguida.
+    '''
+    def __init__(self):
+        self._partes: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, dados) -> int:
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def retira(self) -> bytes:
+        dados, self._partes = b"".join(self._partes), []
+        return dados
+
+
+def _tipo_arrow(tipo):
+    if isinstance(tipo, Integer):
+        return pyarrow.int64()
+    if isinstance(tipo, Numeric) and not isinstance(tipo, Float):
+        return pyarrow.decimal128(tipo.precision, tipo.scale)
+    if isinstance(tipo, Float):
+        return pyarrow.float64()
+    if isinstance(tipo, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+class Escritor:
+    '''
+    Converte blocos de linhas de uma tabela em bytes de um formato de exportação.
+    escreve() retorna os bytes de cada bloco e fecha() os do fim do arquivo.
+    '''
+    def __init__(self, tabela: Table, formato: str):
+        valida_formato(formato)
+        self.formato = formato
+        if formato == "csv":
+            self._cabecalho = [[coluna.name for coluna in tabela.columns]]
+            return
+
+        self._saida = _Saida()
+        self.schema = pyarrow.schema([pyarrow.field(coluna.name, _tipo_arrow(coluna.type), nullable=coluna.nullable) for coluna in tabela.columns])
+        if formato == "parquet":
+            self._escritor = pyarrow.parquet.ParquetWriter(self._saida, self.schema, compression="snappy")
+        else:
+            self._escritor = pyarrow.ipc.new_stream(self._saida, self.schema)
+
+    def escreve(self, linhas: list) -> bytes:
+        if self.formato == "csv":
+            # O cabeçalho sai junto com o primeiro bloco
+            texto = io.StringIO(newline="")
+            csv.writer(texto).writerows(self._cabecalho + linhas)
+            self._cabecalho = []
+            return texto.getvalue().encode("utf-8")
+
+        if linhas:
+            colunas = zip(*linhas)
+            lote = pyarrow.RecordBatch.from_arrays([pyarrow.array(valores, type=campo.type) for valores, campo in zip(colunas, self.schema)], schema=self.schema)
+            self._escritor.write_batch(lote)
+        return self._saida.retira()
+
+    def fecha(self) -> bytes:
+        if self.formato == "csv":
+            return self.escreve([])
+        self._escritor.close()
+        return self._saida.retira()
+
+
+def _tabela(tabela: str) -> Table:
+    return crud.EXPORTACAO_TABELAS[tabela][0].__table__
+
+async def stream(tabela: str, formato: str, desde: Optional[datetime] = None, ate: Optional[datetime] = None, status: Optional[str] = None, chunk_size: int = EXPORTACAO_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    '''
+    Gera a exportação de uma tabela lendo de um cursor do lado do servidor em blocos
+    de chunk_size linhas, com memória limitada a um bloco. A conversão de cada bloco
+    roda em uma thread, fora do event loop. Usa uma sessão própria, que vive enquanto
+    a resposta é enviada.
+    '''
+    query = crud.exportacao_query(tabela, desde, ate, status).execution_options(yield_per=chunk_size)
+    escritor = Escritor(_tabela(tabela), formato)
+    async with AsyncSessionLocal() as db:
+        resultado = await db.stream(query)
+        async for bloco in resultado.partitions():
+            dados = await asyncio.to_thread(escritor.escreve, bloco)
+            if dados:
+                yield dados
+    yield escritor.fecha()
+
+def exporta(destino: BinaryIO, tabela: str, formato: str, desde: Optional[datetime] = None, ate: Optional[datetime] = None, status: Optional[str] = None, chunk_size: int = EXPORTACAO_CHUNK_SIZE, db: Optional[Session] = None) -> int:
+    '''
+    Versão síncrona de stream, usada pelo comando de exportação. Sem db, abre uma
+    sessão própria. Retorna o número de linhas exportadas.
+    '''
+    query = crud.exportacao_query(tabela, desde, ate, status).execution_options(stream_results=True, yield_per=chunk_size)
+    escritor = Escritor(_tabela(tabela), formato)
+    linhas = 0
+    with (SessionLocal() if db is None else nullcontext(db)) as sessao:
+        for bloco in sessao.execute(query).partitions():
+            destino.write(escritor.escreve(bloco))
+            linhas += len(bloco)
+    destino.write(escritor.fecha())
+    return linhas
+
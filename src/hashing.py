@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+
+import bcrypt
+
+# Custo do bcrypt: cada incremento dobra o tempo de cálculo do hash
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicadas ao bcrypt por worker. Com 0, o hash é calculado no próprio event loop
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+# Hashes aguardando ou em execução a partir dos quais novos pedidos são recusados
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "32"))
+
+
+class HashQueueFull(Exception):
+    pass
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+def check_password(password: str, hash_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hash_password.encode('utf-8'))
+
+
+class PasswordHasher:
+    '''
+    Calcula hashes bcrypt fora do event loop, em um pool limitado de threads. O bcrypt
+    libera o GIL durante o cálculo, então as threads rodam em paralelo com as rotas do
+    worker. Quando há max_pending hashes na fila, novos pedidos falham com HashQueueFull
+    em vez de acumular latência.
+    '''
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING, rounds: int = BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt") if workers > 0 else None
+        self._hash_ficticio = None
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            self.completed += 1
+            return func(*args)
+
+        # pending só é alterado no event loop, então não precisa de lock
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashQueueFull(f"Fila de hash de senhas cheia ({self.pending} pendentes).")
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def check(self, password: str, hash_password: str) -> bool:
+        return await self._run(check_password, password, hash_password)
+
+    async def check_inexistente(self, password: str) -> bool:
+        '''
+        Confere a senha contra um hash fictício e retorna False, para que o login de um
+        CPF inexistente leve o mesmo tempo que o de uma senha errada. O hash é calculado
+        no primeiro uso, e não na importação de cada worker.
+        '''
+        if self._hash_ficticio is None:
+            self._hash_ficticio = await self.hash("cliente-inexistente")
+        await self.check(password, self._hash_ficticio)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,178 @@
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+import crud
+import pubsub
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+LOCALIZACAO_BUFFER_MAX_SIZE = int(os.getenv("LOCALIZACAO_BUFFER_MAX_SIZE", "10000"))
+LOCALIZACAO_FLUSH_INTERVAL = float(os.getenv("LOCALIZACAO_FLUSH_INTERVAL", "1"))
+LOCALIZACAO_FLUSH_BATCH_SIZE = int(os.getenv("LOCALIZACAO_FLUSH_BATCH_SIZE", "500"))
+# Falhas seguidas de um lote antes de ele ser dividido para isolar as localizações recusadas
+LOCALIZACAO_FLUSH_TENTATIVAS = int(os.getenv("LOCALIZACAO_FLUSH_TENTATIVAS", "3"))
+
+
+class BufferCheio(Exception):
+    pass
+
+
+class LocalizacaoBuffer:
+    '''
+    Fila em memória das atualizações de localização de um worker. As localizações são
+    gravadas em lote a cada flush_interval segundos, ou assim que batch_size delas
+    estiverem na fila, por crud.flush_localizacoes. Se a gravação falhar, o lote continua
+    na fila para o próximo flush e, enquanto ela estiver cheia, put recusa as novas.
+    Depois de tentativas falhas seguidas, o lote é dividido até isolar as localizações
+    que o banco recusa, que são descartadas, para que uma linha inválida não pare a fila.
+    '''
+    def __init__(self, max_size: int = LOCALIZACAO_BUFFER_MAX_SIZE, flush_interval: float = LOCALIZACAO_FLUSH_INTERVAL, batch_size: int = LOCALIZACAO_FLUSH_BATCH_SIZE, tentativas: int = LOCALIZACAO_FLUSH_TENTATIVAS):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.tentativas = tentativas
+        self.enfileiradas = 0
+        self.gravadas = 0
+        self.descartadas = 0
+        self.recusadas = 0
+        self.flushes = 0
+        self.falhas = 0
+        self.invalidas = 0
+        self.ultimo_flush_segundos = 0.0
+        self._falhas_seguidas = 0
+        self._fila: deque = deque()
+        self._acordar = asyncio.Event()
+        self._tarefa = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._fila)
+
+    def put(self, encomenda_id: int, localizacao: str):
+        if len(self._fila) >= self.max_size:
+            self.recusadas += 1
+            raise BufferCheio(f"Fila de localizações cheia ({len(self._fila)} pendentes).")
+
+        self._fila.append((encomenda_id, localizacao, datetime.now()))
+        self.enfileiradas += 1
+        if len(self._fila) >= self.batch_size:
+            self._acordar.set()
+
+    async def start(self):
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        '''
+        Para a tarefa de flush e grava o que ainda estiver na fila.
+        '''
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.flush()
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+            await self.flush()
+
+    async def _grava(self, lote: list) -> list:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(crud.flush_localizacoes, lote)
+
+    async def _grava_separando(self, lote: list) -> tuple[list, list, list]:
+        '''
+        Grava o lote em partes cada vez menores, até isolar as localizações que o banco
+        recusa (DataError ou IntegrityError). Qualquer outra falha, como o banco fora do
+        ar, interrompe a divisão. Retorna as gravadas, as recusadas e as que ficaram
+        pendentes, na ordem original.
+        '''
+        gravadas, recusadas = [], []
+        partes = [lote]
+        while partes:
+            parte = partes.pop()
+            try:
+                gravadas += await self._grava(parte)
+            except (DataError, IntegrityError) as e:
+                if len(parte) > 1:
+                    meio = len(parte) // 2
+                    partes += [parte[meio:], parte[:meio]]
+                    continue
+                recusadas += parte
+                logger.error("Localização descartada, recusada pelo banco: %r (%s)", parte[0], e.orig)
+            except Exception:
+                logger.exception("Erro ao gravar %d localizações da fila", len(parte))
+                return gravadas, recusadas, [localizacao for pendente in (parte, *reversed(partes)) for localizacao in pendente]
+        return gravadas, recusadas, []
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._fila:
+                lote = [self._fila.popleft() for _ in range(min(self.batch_size, len(self._fila)))]
+                inicio = time.perf_counter()
+                recusadas, pendentes = [], []
+                try:
+                    gravadas = await self._grava(lote)
+                except Exception:
+                    self.falhas += 1
+                    self._falhas_seguidas += 1
+                    if self._falhas_seguidas < self.tentativas:
+                        gravadas, pendentes = [], lote
+                        logger.exception("Erro ao gravar %d localizações da fila", len(lote))
+                    else:
+                        gravadas, recusadas, pendentes = await self._grava_separando(lote)
+
+                # Além das recusadas, crud.flush_localizacoes descarta as de encomendas inexistentes
+                self.gravadas += len(gravadas)
+                self.invalidas += len(recusadas)
+                self.descartadas += len(lote) - len(pendentes) - len(gravadas)
+
+                # Só as gravadas são publicadas; as descartadas não chegam às inscrições
+                for encomenda_id, localizacao, data in gravadas:
+                    await pubsub.hub.publish_localizacao(encomenda_id, localizacao, data)
+
+                if pendentes:
+                    # As pendentes voltam para o início da fila, na ordem original, e são
+                    # gravadas no próximo flush; só o que não couber mais na fila é descartado
+                    espaco = max(0, self.max_size - len(self._fila))
+                    self._fila.extendleft(reversed(pendentes[:espaco]))
+                    self.descartadas += len(pendentes) - min(espaco, len(pendentes))
+                    break
+
+                self._falhas_seguidas = 0
+                self.flushes += 1
+                self.ultimo_flush_segundos = time.perf_counter() - inicio
+
+    def stats(self) -> dict:
+        return {
+            "profundidade": len(self),
+            "max_size": self.max_size,
+            "flush_interval": self.flush_interval,
+            "batch_size": self.batch_size,
+            "enfileiradas": self.enfileiradas,
+            "gravadas": self.gravadas,
+            "descartadas": self.descartadas,
+            "recusadas": self.recusadas,
+            "flushes": self.flushes,
+            "falhas": self.falhas,
+            "invalidas": self.invalidas,
+            "ultimo_flush_segundos": self.ultimo_flush_segundos,
+        }
+
+
+buffer = LocalizacaoBuffer()
@@ -1,13 +1,22 @@
-from typing import Optional, Annotated
+import prontidao
 
-from fastapi import FastAPI, HTTPException, status, Body, Depends
+from contextlib import asynccontextmanager
+import asyncio
+from datetime import datetime
+from typing import Optional, Annotated, Literal
+
+from fastapi import FastAPI, HTTPException, status, Body, Depends, Query, Request, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from schemas.produto.Produto import Produto
 from schemas.produto.ProdutoIn import ProdutoIn
 from schemas.produto.ProdutoUpdate import ProdutoUpdate
+from schemas.produto.ProdutoBusca import ProdutoBusca
 
 from schemas.encomenda.Encomenda import Encomenda
 from schemas.encomenda.EncomendaIn import EncomendaIn
+from schemas.encomenda.EncomendaBatchResultado import EncomendaBatchResultado
 from schemas.encomenda.EncomendaHasProduto import EncomendaHasProduto
 from schemas.encomenda.EncomendaLocalizacao import EncomendaLocalizacao
 from schemas.encomenda.EncomendaStatus import EncomendaStatus
@@ -17,21 +26,19 @@ from schemas.cliente.Cliente import Cliente
 from schemas.cliente.ClienteIn import ClienteIn
 from schemas.cliente.ClienteUpdate import ClienteUpdate
 from schemas.cliente.ClienteStatus import ClienteStatus
+from schemas.cliente.ClienteLogin import ClienteLogin
+from schemas.cliente.ClienteToken import ClienteToken
+from schemas.cliente.ClienteResumo import ClienteResumo
 
-import crud, models
-from database import SessionLocal, engine
-
-from sqlalchemy.orm import Session
+from schemas.paginacao.Pagina import Pagina
 
+import async_crud, auth, busca, cache, compressao, condicional, database, exportacao, hashing, localizacao_buffer, metricas, paginacao, pubsub, serializacao
+from database import AsyncSessionLocal, async_engine, engine, get_db, get_db_leitura, get_pool_metrics, get_sessoes_leitura
 
-models.Base.metadata.create_all(bind=engine)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# O esquema do banco é criado e atualizado pelas migrações (alembic upgrade head),
+# executadas uma vez antes do deploy e não na importação de cada worker
 
 
 description = """
@@ -79,9 +86,32 @@ tags_metadata = [
     {
         "name": "Clientes",
         "description": "Operações com clientes. 📦",
+    },
+    {
+        "name": "Exportação",
+        "description": "Exportação das tabelas para análise. 📊",
+    },
+    {
+        "name": "Monitoramento",
+        "description": "Métricas de funcionamento da API. 📈",
     }
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await metricas.registro.start()
+    await database.replicas.start()
+    await pubsub.hub.backend.start()
+    await localizacao_buffer.buffer.start()
+    # Uma falha aqui não impede o worker de subir: /health responde 503 e tenta de novo
+    await prontidao.estado.aquecer()
+    yield
+    await localizacao_buffer.buffer.stop()
+    await pubsub.hub.backend.stop()
+    hashing.hasher.shutdown()
+    await database.replicas.stop()
+    await metricas.registro.stop()
+
 app = FastAPI(
     title="EJ Encomendas",
     description=description,
@@ -95,46 +125,157 @@ app = FastAPI(
         "name": "Apache 2.0",
         "url": "https://www.apache.org/licenses/LICENSE-2.0.html",
     },
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    lifespan=lifespan,
+    # Respostas com response_model são codificadas com orjson em vez do json da stdlib
+    default_response_class=ORJSONResponse
 )
 
+app.add_middleware(prontidao.PrimeiraRequisicaoMiddleware, estado=prontidao.estado)
+app.add_middleware(compressao.CompressaoMiddleware)
+app.add_middleware(database.PrimarioAposEscritaMiddleware)
+# Por fora da compressão, para que a latência inclua o tempo de comprimir a resposta
+app.add_middleware(metricas.MetricasMiddleware, metricas=metricas.registro)
+metricas.instrumenta(engine, async_engine.sync_engine, *(replica.engine.sync_engine for replica in database.replicas.replicas))
+
 @app.get("/")
 async def root() -> dict[str, str]:
     return {"message": "Hello World"}
 
 
+# ROTAS DE MONITORAMENTO
+@app.get("/health", tags=["Monitoramento"])
+async def health(response: Response) -> dict:
+    """
+    Verificação de prontidão do worker. Responde 503 enquanto o banco não estiver na
+    última migração, o pool de conexões não tiver sido aberto ou o cache do catálogo
+    não tiver sido carregado, e também quando o banco deixa de responder.
+
+    Inclui o tempo entre a importação do app e o worker ficar pronto e entre a
+    importação e a primeira requisição atendida.
+    """
+    if not await prontidao.estado.verifica():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return prontidao.estado.stats()
+
+@app.get("/database/pool", tags=["Monitoramento"])
+async def read_pool_metrics() -> dict:
+    """
+    Retorna as métricas do pool de conexões deste worker: conexões em uso,
+    overflow, timeouts e o histograma do tempo de espera por uma conexão, para o
+    primário e para cada réplica de leitura.
+    """
+    return get_pool_metrics()
+
+@app.get("/database/replicas", tags=["Monitoramento"])
+async def read_replicas() -> dict:
+    """
+    Retorna as réplicas de leitura deste worker com peso, estado da última verificação
+    e leituras atendidas, e quantas leituras foram para o primário por falta de réplica
+    saudável ou porque o cliente escreveu há pouco.
+    """
+    return database.replicas.stats()
+
+@app.get("/cache/produtos", tags=["Monitoramento"])
+async def read_produto_cache_metrics() -> dict:
+    """
+    Retorna os contadores de acerto e falha do cache de produtos deste worker,
+    junto com a versão do catálogo conhecida e o número de invalidações.
+    """
+    return cache.catalogo.stats()
+
+@app.get("/busca/produtos", tags=["Monitoramento"])
+async def read_busca_produtos_metrics() -> dict:
+    """
+    Retorna o estado do índice de busca de produtos deste worker: versão do catálogo
+    aplicada, produtos e termos indexados, consultas e a duração da última sincronização.
+    """
+    return busca.indice.stats()
+
+@app.get("/hashing", tags=["Monitoramento"])
+async def read_hashing_metrics() -> dict:
+    """
+    Retorna o estado da fila de hash de senhas deste worker: hashes pendentes,
+    concluídos e recusados por falta de vaga.
+    """
+    return hashing.hasher.stats()
+
+@app.get("/buffer/localizacoes", tags=["Monitoramento"])
+async def read_localizacao_buffer_metrics() -> dict:
+    """
+    Retorna o estado da fila de localizações deste worker: profundidade atual,
+    localizações gravadas, descartadas e recusadas, e a duração do último flush.
+    """
+    return localizacao_buffer.buffer.stats()
+
+@app.get("/metrics", tags=["Monitoramento"], response_class=PlainTextResponse)
+async def read_metrics():
+    """
+    Métricas das requisições no formato de texto do Prometheus: histograma de latência
+    por rota e status, consultas ao banco por requisição, tempo no banco e requisições
+    acima do orçamento de consultas. Com METRICAS_DIR, soma as de todos os workers.
+    """
+    estado = await asyncio.to_thread(metricas.registro.coleta)
+    return PlainTextResponse(metricas.formata_prometheus(estado), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/pubsub", tags=["Monitoramento"])
+async def read_pubsub_metrics() -> dict:
+    """
+    Retorna o estado do hub de eventos de encomendas deste worker: inscrições abertas,
+    eventos publicados e entregues, e eventos descartados por clientes lentos.
+    """
+    return pubsub.hub.stats()
+
+
 # ROTAS DE ENCOMENDA
-@app.get("/encomendas/", tags=["Encomendas"], response_model=list[Encomenda])
-def read_encomendas(status: Optional[Annotated[EncomendaStatus, "status"]] = None, db:Session = Depends(get_db)):
+@app.get("/encomendas/", tags=["Encomendas"], response_model=Pagina[Encomenda])
+async def read_encomendas(request: Request, response: Response, status: Optional[Annotated[EncomendaStatus, "status"]] = None, cursor: Optional[str] = None, limit: int = Query(default=100, ge=1, le=1000), db: AsyncSession = Depends(get_db_leitura)):
     """
-    Retorna todas as encomendas.
+    Retorna as encomendas, paginadas por id. A página tem um ETag; com If-None-Match,
+    responde 304 se nenhuma encomenda da página mudou.
 
     Query Params:
 
         status (EncomendaStatus): Filtra as encomendas por status.
+
+        cursor (str): Cursor da página, retornado em proximo_cursor pela página anterior.
+
+        limit (int): Quantidade máxima de encomendas na página.
     """
+    try:
+        chave = paginacao.decode_cursor(cursor, (int,))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
     if status:
-        return crud.get_encomendas_by_status(db, status.value)
-    return crud.get_encomendas(db)
+        encomendas = await async_crud.get_encomendas_by_status(db, status.value, chave, limit)
+    else:
+        encomendas = await async_crud.get_encomendas(db, chave, limit)
+    pagina = paginacao.pagina(encomendas, limit, lambda encomenda: (encomenda.encomenda_id,))
+    return condicional.responde(request, response, condicional.etag_pagina("encomendas", pagina, "encomenda_id")) or serializacao.resposta(Pagina[Encomenda], pagina, response)
 
 @app.get("/encomendas/{encomendaId}", tags=["Encomendas"], response_model=Encomenda)
-def read_encomenda(encomendaId: int, db:Session = Depends(get_db)):
+async def read_encomenda(encomendaId: int, request: Request, response: Response, db: AsyncSession = Depends(get_db_leitura)):
     """
-    Retorna uma encomenda a partir de seu id.
+    Retorna uma encomenda a partir de seu id. Com If-None-Match ou If-Modified-Since,
+    responde 304 se a encomenda não mudou.
 
     Path Params:
 
         encomendaId (int): Id da encomenda.
     """
     try:
-        return crud.get_encomenda(db, encomendaId)
+        encomenda = await async_crud.get_encomenda(db, encomendaId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    etag = condicional.etag("encomenda", encomenda.encomenda_id, encomenda.versao)
+    return condicional.responde(request, response, etag, encomenda.ultima_atualizacao) or encomenda
+
 @app.post("/encomendas/", status_code=status.HTTP_201_CREATED, tags=["Encomendas"], response_model=Encomenda)
-def create_encomenda(encomendaIn: EncomendaIn, db:Session = Depends(get_db)):
+async def create_encomenda(encomendaIn: EncomendaIn, db: AsyncSession = Depends(get_db)):
     """
     Cria uma nova encomenda, suas relações com produtos e localizações e a insere no banco de dados.
 
@@ -144,14 +285,35 @@ def create_encomenda(encomendaIn: EncomendaIn, db:Session = Depends(get_db)):
     """
 
     try:
-        return crud.create_encomenda(db, encomendaIn)
+        return await async_crud.create_encomenda(db, encomendaIn)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+@app.post("/encomendas/batch", status_code=status.HTTP_201_CREATED, tags=["Encomendas"], response_model=list[EncomendaBatchResultado])
+async def create_encomendas_batch(encomendasIn: list[EncomendaIn], chunk_size: int = Query(default=500, ge=1, le=5000), db: AsyncSession = Depends(get_db)):
+    """
+    Cria várias encomendas de uma vez. As encomendas são validadas e inseridas em blocos de
+    chunk_size, com um número fixo de consultas por bloco. Cada bloco é confirmado separadamente.
+
+    Retorna, para cada encomenda do lote, o id criado ou o motivo da falha.
+
+    Query Params:
+
+        chunk_size (int): Quantidade de encomendas gravadas por transação.
+
+    Body:
+
+        encomendasIn (list[EncomendaIn]): Dados das encomendas.
+    """
+    try:
+        return await async_crud.create_encomendas_batch(db, encomendasIn, chunk_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{e}")
+
 @app.put("/encomendas/{encomendaId}/status", status_code=status.HTTP_201_CREATED, tags=["Encomendas"], response_model=Encomenda)
-def update_encomenda_status(encomendaId: int, status: EncomendaStatus = Body(embed=True), db: Session = Depends(get_db)):
+async def update_encomenda_status(encomendaId: int, status: EncomendaStatus = Body(embed=True), db: AsyncSession = Depends(get_db)):
     """
     Atualiza o status de uma encomenda.
 
@@ -164,14 +326,17 @@ def update_encomenda_status(encomendaId: int, status: EncomendaStatus = Body(emb
         status (EncomendaStatus): Novo status da encomenda.
     """
     try:
-        return crud.update_encomenda_status(db, encomendaId, status.value)
+        encomenda = await async_crud.update_encomenda_status(db, encomendaId, status.value)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"Encomenda de id {encomendaId} não encontrada")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    await pubsub.hub.publish_status(encomenda)
+    return encomenda
+
 @app.put("/encomendas/{encomendaId}", status_code=status.HTTP_201_CREATED, tags=["Encomendas"], response_model=Encomenda)
-def update_encomenda(encomendaId: int, encomendaUpdate: EncomendaUpdate, db: Session = Depends(get_db)):
+async def update_encomenda(encomendaId: int, encomendaUpdate: EncomendaUpdate, db: AsyncSession = Depends(get_db)):
     """
     Atualiza uma encomenda a partir de seu id.
 
@@ -184,15 +349,19 @@ def update_encomenda(encomendaId: int, encomendaUpdate: EncomendaUpdate, db: Ses
         encomendaUpdate (EncomendaUpdate): Dados da encomenda a serem atualizados.
     """
     try:
-        return crud.update_encomenda(db, encomendaId, encomendaUpdate)
+        encomenda = await async_crud.update_encomenda(db, encomendaId, encomendaUpdate)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    if encomendaUpdate.localizacaoAtual is not None:
+        await pubsub.hub.publish_localizacao(encomenda.encomenda_id, encomenda.localizacao_atual.localizacao, encomenda.localizacao_atual.data)
+    return encomenda
+
 
 @app.post("/encomendas/localizacao", status_code=status.HTTP_201_CREATED, tags=["Encomendas"], response_model=Encomenda)
-def update_localizacao(localizacao: EncomendaLocalizacao, db: Session = Depends(get_db)):
+async def update_localizacao(localizacao: EncomendaLocalizacao, db: AsyncSession = Depends(get_db)):
     """
     Atualiza a localização de uma encomenda, que contém o id e a nova localização no histórico.
 
@@ -201,14 +370,35 @@ def update_localizacao(localizacao: EncomendaLocalizacao, db: Session = Depends(
         localizacao (EncomendaLocalizacao): Dados da localização.
     """
     try:
-        return crud.update_localizacao_encomenda(db, localizacao)
+        encomenda = await async_crud.update_localizacao_encomenda(db, localizacao)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    await pubsub.hub.publish_localizacao(encomenda.encomenda_id, encomenda.localizacao_atual.localizacao, encomenda.localizacao_atual.data)
+    return encomenda
+
+@app.post("/encomendas/localizacao/buffer", status_code=status.HTTP_202_ACCEPTED, tags=["Encomendas"])
+async def update_localizacao_buffer(localizacao: EncomendaLocalizacao) -> dict[str, int]:
+    """
+    Enfileira a atualização da localização de uma encomenda para gravação em lote.
+    A localização é registrada com a data de chegada e gravada em até
+    LOCALIZACAO_FLUSH_INTERVAL segundos; apenas a última de cada encomenda no lote
+    vira a localização atual. Localizações de encomendas inexistentes são descartadas.
+
+    Body:
+
+        localizacao (EncomendaLocalizacao): Dados da localização.
+    """
+    try:
+        localizacao_buffer.buffer.put(localizacao.encomenda_id, localizacao.localizacao)
+    except localizacao_buffer.BufferCheio as e:
+        raise HTTPException(status_code=503, detail=f"{e}", headers={"Retry-After": "1"})
+    return {"fila": len(localizacao_buffer.buffer)}
+
 @app.delete("/encomendas/{encomendaId}", status_code=status.HTTP_204_NO_CONTENT, tags=["Encomendas"])
-def delete_encomenda(encomendaId: int, db: Session = Depends(get_db)):
+async def delete_encomenda(encomendaId: int, db: AsyncSession = Depends(get_db)):
     """
     Deleta uma encomenda a partir de seu id.
 
@@ -217,31 +407,101 @@ def delete_encomenda(encomendaId: int, db: Session = Depends(get_db)):
         encomendaId (int): Id da encomenda.
     """
     try:
-        crud.delete_encomenda(db, encomendaId)
-        return
+        await async_crud.delete_encomenda(db, encomendaId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    await pubsub.hub.publish_removida(encomendaId)
+
 @app.get("/encomendas/{encomendaId}/localizacao", tags=["Encomendas"], response_model=list[EncomendaLocalizacao])
-def read_encomenda_localizacoes(encomendaId: int, db: Session = Depends(get_db)):
+async def read_encomenda_localizacoes(encomendaId: int, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: Optional[int] = Query(default=None, ge=1), formato: Literal["json", "ndjson"] = "json", db: AsyncSession = Depends(get_db_leitura), sessoes: async_sessionmaker = Depends(get_sessoes_leitura)):
     """
-    Lista todas as localizações de uma encomenda.
+    Lista as localizações de uma encomenda em ordem cronológica, podendo filtrar por janela de tempo.
+
+    Com formato=ndjson, o histórico é enviado em streaming, uma localização por linha,
+    lido do banco em blocos, sem carregar o histórico inteiro na memória.
 
     Path Params:
 
         encomendaId (int): Id da encomenda.
+
+    Query Params:
+
+        since (datetime): Retorna localizações registradas a partir desta data (inclusive).
+
+        until (datetime): Retorna localizações registradas antes desta data.
+
+        limit (int): Quantidade máxima de localizações.
+
+        formato (str): json (padrão) ou ndjson.
     """
+    if formato == "ndjson":
+        # O streaming começa depois que a resposta é criada; a encomenda é conferida antes, como no JSON
+        if not await async_crud.encomenda_existe(db, encomendaId):
+            raise HTTPException(status_code=404, detail=f"Encomenda com id {encomendaId} não encontrada.")
+        return StreamingResponse(async_crud.stream_encomenda_localizacao(sessoes, encomendaId, since, until, limit), media_type="application/x-ndjson")
+
     try:
-        return crud.get_encomenda_localizacao(db, encomendaId)
+        localizacoes = await async_crud.get_encomenda_localizacao(db, encomendaId, since, until, limit)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+    return serializacao.resposta(list[EncomendaLocalizacao], localizacoes)
+
+@app.get("/encomendas/{encomendaId}/eventos", tags=["Encomendas"], response_class=StreamingResponse)
+async def read_encomenda_eventos(encomendaId: int):
+    """
+    Acompanha uma encomenda por Server-Sent Events, substituindo a consulta periódica de
+    GET /encomendas/{encomendaId} e GET /encomendas/{encomendaId}/localizacao.
+
+    O primeiro evento (estado) traz o status e a localização atuais. Depois são enviados
+    os eventos status e localizacao a cada mudança, e removida quando a encomenda é
+    deletada, encerrando o fluxo. Os eventos são entregues pelo worker que recebeu a
+    inscrição.
+
+    Path Params:
+
+        encomendaId (int): Id da encomenda.
+    """
+    if pubsub.hub.cheio():
+        raise HTTPException(status_code=503, detail="Limite de inscrições deste worker atingido", headers={"Retry-After": "5"})
+
+    # A inscrição é aberta antes de ler o estado, para que nenhum evento publicado
+    # entre a leitura e o início do fluxo se perca
+    fila = pubsub.hub.inscreve(encomendaId)
+
+    # Sessão própria e curta: a conexão volta ao pool antes de o fluxo começar
+    try:
+        async with AsyncSessionLocal() as sessao:
+            encomenda = await async_crud.get_encomenda(sessao, encomendaId)
+    except ValueError as e:
+        pubsub.hub.cancela(encomendaId, fila)
+        raise HTTPException(status_code=404, detail=f"{e}")
+    except Exception as e:
+        pubsub.hub.cancela(encomendaId, fila)
+        raise HTTPException(status_code=500, detail=f"{e}")
+
+    localizacao = encomenda.localizacao_atual
+    estado = pubsub.formata_sse("estado", {
+        "encomenda_id": encomenda.encomenda_id,
+        "status": encomenda.status,
+        "localizacao": localizacao.localizacao if localizacao else None,
+        "data": localizacao.data.isoformat() if localizacao else None,
+    })
+    return StreamingResponse(
+        pubsub.hub.stream(encomendaId, fila, [estado]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Remove a inscrição mesmo se o cliente desconectar antes de o fluxo começar
+        background=BackgroundTask(pubsub.hub.cancela, encomendaId, fila),
+    )
+
 @app.get("/encomendas/{encomendaId}/produtos", tags=["Encomendas", "Produtos"], response_model=list[EncomendaHasProduto])
-def read_encomenda_produtos(encomendaId: int, db: Session = Depends(get_db)):
+async def read_encomenda_produtos(encomendaId: int, db: AsyncSession = Depends(get_db_leitura)):
     """
     Lista todos os produtos de uma encomenda.
 
@@ -250,51 +510,117 @@ def read_encomenda_produtos(encomendaId: int, db: Session = Depends(get_db)):
         encomendaId (int): Id da encomenda.
     """
     try:
-        return crud.get_encomenda_produtos(db, encomendaId)
+        return await async_crud.get_encomenda_produtos(db, encomendaId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"{e}")
 
+# ROTAS DE EXPORTAÇÃO
+@app.get("/exportacao/{tabela}", tags=["Exportação"], response_class=StreamingResponse)
+async def read_exportacao(tabela: Literal["encomendas", "encomendas_produtos", "produtos", "encomendas_localizacoes"], formato: Optional[Literal["parquet", "arrow", "csv"]] = None, desde: Optional[datetime] = None, ate: Optional[datetime] = None, status: Optional[str] = None):
+    """
+    Exporta uma tabela inteira em Parquet, Arrow IPC (stream) ou CSV, em streaming. As
+    linhas são lidas de um cursor do lado do servidor em blocos de EXPORTACAO_CHUNK_SIZE,
+    sem carregar a tabela na memória.
+
+    Path Params:
+
+        tabela (str): encomendas, encomendas_produtos, produtos ou encomendas_localizacoes.
+
+    Query Params:
+
+        formato (str): parquet (padrão, se o pyarrow estiver instalado), arrow ou csv.
+
+        desde (datetime): Exporta linhas a partir desta data (inclusive): criação da encomenda,
+        data da localização ou última atualização do produto.
+
+        ate (datetime): Exporta linhas antes desta data.
+
+        status (str): Filtra pelo status da encomenda ou, em produtos, do produto.
+    """
+    formato = formato or exportacao.formato_padrao()
+    try:
+        exportacao.valida_formato(formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
+    media_type, extensao = exportacao.FORMATOS[formato]
+    return StreamingResponse(
+        exportacao.stream(tabela, formato, desde, ate, status),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{tabela}.{extensao}"'},
+    )
+
 # ROTAS DE PRODUTO
-@app.get("/produtos/", tags=["Produtos"], response_model=list[Produto])
-def read_produtos(min_price: Optional[float] = None, max_price: Optional[float] = None, db: Session = Depends(get_db)):
+@app.get("/produtos/", tags=["Produtos"], response_model=Pagina[Produto])
+async def read_produtos(request: Request, response: Response, min_price: Optional[float] = None, max_price: Optional[float] = None, cursor: Optional[str] = None, limit: int = Query(default=100, ge=1, le=1000), db: AsyncSession = Depends(get_db)):
     """
-    Lista todos os produtos, podendo filtrar por preço mínimo e máximo.
+    Lista os produtos, podendo filtrar por preço mínimo e máximo. Sem filtro de preço
+    a paginação é por id; com filtro, os produtos são ordenados e paginados por preço.
+    A página tem um ETag; com If-None-Match, responde 304 se nenhum produto da página mudou.
 
     Query Params:
 
         min_price (float): Preço mínimo do produto.
 
         max_price (float): Preço máximo do produto.
+
+        cursor (str): Cursor da página, retornado em proximo_cursor pela página anterior.
+
+        limit (int): Quantidade máxima de produtos na página.
+    """
+    por_preco = min_price is not None or max_price is not None
+    try:
+        chave = paginacao.decode_cursor(cursor, (float, int) if por_preco else (int,))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
+    produtos = await async_crud.get_produtos(db, chave, limit, min_price=min_price, max_price=max_price)
+    if por_preco:
+        pagina = paginacao.pagina(produtos, limit, lambda produto: (produto.preco, produto.produto_id))
+    else:
+        pagina = paginacao.pagina(produtos, limit, lambda produto: (produto.produto_id,))
+    return condicional.responde(request, response, condicional.etag_pagina("produtos", pagina, "produto_id")) or serializacao.resposta(Pagina[Produto], pagina, response)
+
+@app.get("/produtos/busca", tags=["Produtos"], response_model=list[ProdutoBusca])
+async def busca_produtos(q: str = Query(min_length=1, max_length=200), limit: int = Query(default=20, ge=1, le=100), db: AsyncSession = Depends(get_db)):
     """
-    if min_price and max_price:
-        return crud.get_produtos(db, min_price=min_price, max_price=max_price)
-    elif min_price:
-        return crud.get_produtos(db, min_price=min_price)
-    elif max_price:
-        return crud.get_produtos(db, max_price=max_price)
-    return crud.get_produtos(db)
+    Busca produtos ativos pelo nome e pela descrição, do mais relevante para o menos
+    relevante. Todos os termos precisam aparecer no produto; o último termo também é
+    buscado como prefixo, e termos sem correspondência exata aceitam um erro de digitação.
+
+    Query Params:
+
+        q (str): Termos da busca.
+
+        limit (int): Quantidade máxima de produtos retornados.
+    """
+    produtos = await async_crud.busca_produtos(db, q, limit)
+    return serializacao.resposta(list[ProdutoBusca], produtos)
 
 @app.get("/produtos/{produto_id}", tags=["Produtos"], response_model=Produto)
-def read_produto(produto_id: int, db: Session = Depends(get_db)):
+async def read_produto(produto_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     '''
-    Encontra um produto a partir de seu id.
+    Encontra um produto a partir de seu id. Com If-None-Match ou If-Modified-Since,
+    responde 304 se o produto não mudou.
 
     Path Params:
 
         produtoId (int): Id do produto.
     '''
     try:
-        produto = crud.get_produto(db, produto_id)
-        return produto 
+        produto = await async_crud.get_produto(db, produto_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar produto de id {produto_id}: {e}")
 
+    etag = condicional.etag("produto", produto.produto_id, produto.versao)
+    return condicional.responde(request, response, etag, produto.ultima_atualizacao) or produto
+
 @app.post("/produtos/", status_code=status.HTTP_201_CREATED, tags=["Produtos"], response_model=Produto)
-def create_produto(produtoIn: ProdutoIn, db: Session = Depends(get_db)):
+async def create_produto(produtoIn: ProdutoIn, db: AsyncSession = Depends(get_db)):
     '''
     Cria um novo produto e o insere no banco de dados.
 
@@ -303,14 +629,14 @@ def create_produto(produtoIn: ProdutoIn, db: Session = Depends(get_db)):
         produtoIn (ProdutoIn): Dados do produto.
     '''
     try:
-        return crud.create_produto(db, produtoIn)
+        return await async_crud.create_produto(db, produtoIn)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"{e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar produto: {e}")
 
 @app.put("/produtos/{produtoId}", status_code=status.HTTP_201_CREATED, tags=["Produtos"], response_model=Produto)
-def update_produto(produtoId: int, produtoIn: ProdutoUpdate, db: Session = Depends(get_db)):
+async def update_produto(produtoId: int, produtoIn: ProdutoUpdate, db: AsyncSession = Depends(get_db)):
     '''
     Atualiza um produto a partir de seu id.
 
@@ -323,7 +649,7 @@ def update_produto(produtoId: int, produtoIn: ProdutoUpdate, db: Session = Depen
         produtoIn (ProdutoUpdate): Dados do produto a serem atualizados.
     '''
     try:
-        produto = crud.update_produto(db, produtoId, produtoIn)
+        produto = await async_crud.update_produto(db, produtoId, produtoIn)
         return produto
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
@@ -331,7 +657,7 @@ def update_produto(produtoId: int, produtoIn: ProdutoUpdate, db: Session = Depen
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar produto de id {produtoId}: {e}")
     
 @app.delete("/produtos/{produtoId}", status_code=status.HTTP_204_NO_CONTENT, tags=["Produtos"])
-def delete_produto(produtoId: int, db: Session = Depends(get_db)):
+async def delete_produto(produtoId: int, db: AsyncSession = Depends(get_db)):
     '''
     Deleta um produto a partir de seu id.
 
@@ -340,7 +666,7 @@ def delete_produto(produtoId: int, db: Session = Depends(get_db)):
         produtoId (int): Id do produto.
     '''
     try:
-        crud.delete_produto(db, produtoId)
+        await async_crud.delete_produto(db, produtoId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
@@ -348,40 +674,125 @@ def delete_produto(produtoId: int, db: Session = Depends(get_db)):
 
 
 # ROTAS DE CLIENTES
-@app.get("/clientes/", tags=["Clientes"], response_model=list[Cliente])
-def read_clientes(status: Optional[Annotated[ClienteStatus, "status"]] = None, db: Session = Depends(get_db)):
+@app.get("/clientes/", tags=["Clientes"], response_model=Pagina[Cliente])
+async def read_clientes(request: Request, response: Response, status: Optional[Annotated[ClienteStatus, "status"]] = None, cursor: Optional[str] = None, limit: int = Query(default=100, ge=1, le=1000), db: AsyncSession = Depends(get_db_leitura)):
     '''
-    Lista todos os clientes, podendo filtrar por status.
+    Lista os clientes, paginados por id, podendo filtrar por status. A página tem um
+    ETag; com If-None-Match, responde 304 se nenhum cliente da página mudou.
 
     Query Params:
 
         status (ClienteStatus): Filtra os clientes por status.
+
+        cursor (str): Cursor da página, retornado em proximo_cursor pela página anterior.
+
+        limit (int): Quantidade máxima de clientes na página.
     '''
+    try:
+        chave = paginacao.decode_cursor(cursor, (int,))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}")
+
     try:
         if status:
-            return crud.get_clientes_by_status(db, status.value)
-        return crud.get_clientes(db)
+            clientes = await async_crud.get_clientes_by_status(db, status.value, chave, limit)
+        else:
+            clientes = await async_crud.get_clientes(db, chave, limit)
+        pagina = paginacao.pagina(clientes, limit, lambda cliente: (cliente.cliente_id,))
     except:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar clientes")
 
+    return condicional.responde(request, response, condicional.etag_pagina("clientes", pagina, "cliente_id")) or serializacao.resposta(Pagina[Cliente], pagina, response)
+
+@app.post("/clientes/login", tags=["Clientes"], response_model=ClienteToken)
+async def login_cliente(login: ClienteLogin, request: Request, db: AsyncSession = Depends(get_db)):
+    '''
+    Confere a senha do cliente e emite um token de acesso assinado. As rotas protegidas
+    validam o token sem consultar o banco, então o bcrypt roda uma vez por sessão.
+
+    Falhas seguidas de um mesmo CPF ou IP são bloqueadas por um tempo antes de calcular o hash.
+
+    Body:
+
+        login (ClienteLogin): CPF e senha do cliente.
+    '''
+    if auth.AUTH_SECRET is None:
+        raise HTTPException(status_code=503, detail="AUTH_SECRET não definido: tokens de acesso indisponíveis.")
+
+    chaves = ((f"cpf:{login.cpf}", auth.LOGIN_MAX_FALHAS), (f"ip:{request.client.host if request.client else ''}", auth.LOGIN_MAX_FALHAS_IP))
+    retry_after = max(auth.login_limiter.retry_after(chave, limite) for chave, limite in chaves)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Muitas tentativas de login. Tente novamente mais tarde.", headers={"Retry-After": str(retry_after)})
+
+    db_cliente = await async_crud.get_cliente_by_cpf(db, login.cpf)
+    try:
+        if db_cliente is None:
+            senha_correta = await hashing.hasher.check_inexistente(login.password)
+        else:
+            senha_correta = await hashing.hasher.check(login.password, db_cliente.hash_password)
+    except hashing.HashQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"{e}", headers={"Retry-After": "1"})
+
+    if db_cliente is None or not senha_correta or db_cliente.status != ClienteStatus.ATIVO.value:
+        for chave, _ in chaves:
+            auth.login_limiter.registra_falha(chave)
+        raise HTTPException(status_code=401, detail="CPF ou senha inválidos")
+
+    auth.login_limiter.limpa(chaves[0][0])
+    return {"access_token": auth.create_token(db_cliente.cliente_id), "token_type": "bearer", "expires_in": auth.AUTH_TOKEN_TTL}
+
+@app.get("/clientes/me", tags=["Clientes"], response_model=Cliente)
+async def read_cliente_autenticado(cliente_id: int = Depends(auth.get_cliente_autenticado), db: AsyncSession = Depends(get_db_leitura)):
+    '''
+    Retorna o cliente dono do token de acesso.
+
+    Headers:
+
+        Authorization (str): Bearer <token>, obtido em /clientes/login.
+    '''
+    try:
+        return await async_crud.get_cliente(db, cliente_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=f"{e}")
+
+@app.get("/clientes/me/encomendas/", tags=["Clientes", "Encomendas"], response_model=list[Encomenda])
+async def read_cliente_autenticado_encomendas(cliente_id: int = Depends(auth.get_cliente_autenticado), db: AsyncSession = Depends(get_db_leitura)):
+    '''
+    Lista as encomendas do cliente dono do token de acesso.
+
+    Headers:
+
+        Authorization (str): Bearer <token>, obtido em /clientes/login.
+    '''
+    try:
+        encomendas = await async_crud.get_cliente_encomendas(db, cliente_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=f"{e}")
+
+    return serializacao.resposta(list[Encomenda], encomendas)
+
 @app.get("/clientes/{clienteId}", tags=["Clientes"], response_model=Cliente)
-def read_cliente(clienteId: int, db: Session = Depends(get_db)):
+async def read_cliente(clienteId: int, request: Request, response: Response, db: AsyncSession = Depends(get_db_leitura)):
     '''
-    Lista um cliente a partir de seu id.
+    Lista um cliente a partir de seu id. Com If-None-Match ou If-Modified-Since,
+    responde 304 se o cliente não mudou.
 
     Path Params:
 
         clienteId (int): Id do cliente.
     '''
     try:
-        return crud.get_cliente(db, clienteId)
+        cliente = await async_crud.get_cliente(db, clienteId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar cliente de id {clienteId}")
 
+    etag = condicional.etag("cliente", cliente.cliente_id, cliente.versao)
+    return condicional.responde(request, response, etag, cliente.ultima_atualizacao) or cliente
+
 @app.post("/clientes/", status_code=status.HTTP_201_CREATED, tags=["Clientes"], response_model=Cliente)
-def create_cliente(clienteIn: ClienteIn, db: Session = Depends(get_db)):
+async def create_cliente(clienteIn: ClienteIn, db: AsyncSession = Depends(get_db)):
     '''
     Cria um novo cliente e o insere no banco de dados.
 
@@ -390,15 +801,18 @@ def create_cliente(clienteIn: ClienteIn, db: Session = Depends(get_db)):
         clienteIn (ClienteIn): Dados do cliente.
     '''
     try:
-        if crud.get_cliente_by_cpf(db, clienteIn.cpf):
+        if await async_crud.get_cliente_by_cpf(db, clienteIn.cpf):
             raise HTTPException(status_code=400, detail=f"Cliente com CPF {clienteIn.cpf} já existe")
 
-        return crud.create_cliente(db, clienteIn)
+        hash_password = await hashing.hasher.hash(clienteIn.password)
+        return await async_crud.create_cliente(db, clienteIn, hash_password)
+    except hashing.HashQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"{e}", headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar cliente: {e}")
 
 @app.put("/clientes/{clienteId}", status_code=status.HTTP_201_CREATED, tags=["Clientes"], response_model=Cliente)
-def update_cliente(clienteId: int, clienteUpdate: ClienteUpdate, db: Session = Depends(get_db)):
+async def update_cliente(clienteId: int, clienteUpdate: ClienteUpdate, db: AsyncSession = Depends(get_db)):
     '''
     Atualiza um cliente a partir de seu id.
 
@@ -411,15 +825,18 @@ def update_cliente(clienteId: int, clienteUpdate: ClienteUpdate, db: Session = D
         clienteUpdate (ClienteUpdate): Dados do cliente a serem atualizados.
     '''
     try:
-        if crud.get_cliente(db, clienteId) is None:
+        if await async_crud.get_cliente(db, clienteId) is None:
             raise HTTPException(status_code=404, detail=f"Cliente de id {clienteId} não encontrado")
-        cliente = crud.update_cliente(db, clienteId, clienteUpdate)
+        hash_password = await hashing.hasher.hash(clienteUpdate.password) if clienteUpdate.password is not None else None
+        cliente = await async_crud.update_cliente(db, clienteId, clienteUpdate, hash_password)
         return cliente
+    except hashing.HashQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"{e}", headers={"Retry-After": "1"})
     except:
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar cliente de id {clienteId}")
 
 @app.delete("/clientes/{clienteId}", status_code=status.HTTP_204_NO_CONTENT, tags=["Clientes"])
-def delete_cliente(clienteId: int, db:Session = Depends(get_db)):
+async def delete_cliente(clienteId: int, db: AsyncSession = Depends(get_db)):
     '''
     Faz a deleção lógica de um cliente a partir de seu id.
 
@@ -428,24 +845,46 @@ def delete_cliente(clienteId: int, db:Session = Depends(get_db)):
         clienteId (int): Id do cliente.
     '''
     try:
-        if crud.get_cliente(db, clienteId) is None:
+        if await async_crud.get_cliente(db, clienteId) is None:
             raise HTTPException(status_code=404, detail=f"Cliente de id {clienteId} não encontrado")
-        crud.delete_cliente(db, clienteId)
+        await async_crud.delete_cliente(db, clienteId)
     except:
         raise HTTPException(status_code=500, detail=f"Erro ao deletar cliente de id {clienteId}")
 
 @app.get("/clientes/{clienteId}/encomendas/", tags=["Clientes", "Encomendas"], response_model=list[Encomenda])
-def read_cliente_encomendas(clienteId: int, db: Session = Depends(get_db)):
+async def read_cliente_encomendas(clienteId: int, request: Request, response: Response, db: AsyncSession = Depends(get_db_leitura)):
+    '''
+    Lista todas as encomendas de um cliente. Com If-None-Match, responde 304 se
+    nenhuma encomenda do cliente mudou.
+
+    Path Params:
+
+        clienteId (int): Id do cliente.
+    '''
+    try:
+        encomendas = await async_crud.get_cliente_encomendas(db, clienteId)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=f"{e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar encomendas do cliente de id {clienteId}: {e}")
+
+    etag = condicional.etag("encomendas-cliente", [(encomenda.encomenda_id, encomenda.versao) for encomenda in encomendas])
+    return condicional.responde(request, response, etag) or serializacao.resposta(list[Encomenda], encomendas, response)
+
+@app.get("/clientes/{clienteId}/resumo", tags=["Clientes", "Encomendas"], response_model=ClienteResumo)
+async def read_cliente_resumo(clienteId: int, db: AsyncSession = Depends(get_db_leitura)):
     '''
-    Lista todas as encomendas de um cliente.
+    Retorna o resumo das encomendas de um cliente: quantidade e valor por status, valor
+    gasto e data da última encomenda. O resumo é mantido a cada escrita em encomendas,
+    sem carregar as encomendas do cliente.
 
     Path Params:
 
         clienteId (int): Id do cliente.
     '''
     try:
-        return crud.get_cliente_encomendas(db, clienteId)
+        return await async_crud.get_cliente_resumo(db, clienteId)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"{e}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao buscar encomendas do cliente de id {clienteId}: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar resumo do cliente de id {clienteId}: {e}")
\ No newline at end of file
@@ -0,0 +1,285 @@
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional
+import asyncio
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Diretório compartilhado pelos workers do gunicorn; cada worker grava nele as suas
+# métricas e o /metrics soma as de todos. Sem ele, o /metrics mostra só o worker que respondeu
+METRICAS_DIR = os.getenv("METRICAS_DIR")
+# Intervalo, em segundos, entre as gravações das métricas do worker em METRICAS_DIR
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "5"))
+# Requisições com mais consultas que isso são contadas e registradas no log, o sinal de um N+1
+METRICAS_ORCAMENTO_CONSULTAS = int(os.getenv("METRICAS_ORCAMENTO_CONSULTAS", "20"))
+
+# Limites dos histogramas de latência (em segundos) e de consultas por requisição
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+CONSULTAS_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, float("inf"))
+
+# Rótulo das requisições que não correspondem a nenhuma rota, para não criar uma série por caminho
+SEM_ROTA = "(sem rota)"
+
+
+class _Requisicao:
+    __slots__ = ("consultas", "tempo_db")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+
+
+_requisicao: ContextVar[Optional[_Requisicao]] = ContextVar("metricas_requisicao", default=None)
+
+
+def _observa(contagens: list, limites: tuple, valor: float):
+    for i, limite in enumerate(limites):
+        if valor <= limite:
+            contagens[i] += 1
+            return
+
+
+class Metricas:
+    '''
+    Métricas das requisições de um worker, por rota (o modelo do caminho, como
+    /produtos/{produto_id}): histograma de latência por método, rota e status, e
+    quantidade de consultas e tempo no banco por requisição. Os histogramas guardam a
+    contagem de cada faixa; a forma acumulada do Prometheus é montada na exportação.
+    '''
+    def __init__(self, orcamento_consultas: int = METRICAS_ORCAMENTO_CONSULTAS):
+        self.orcamento_consultas = orcamento_consultas
+        self._lock = Lock()
+        self.latencias: dict[tuple, dict] = {}
+        self.consultas: dict[tuple, dict] = {}
+        self.diretorio: Optional[str] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def registra(self, metodo: str, rota: str, status: int, duracao: float, consultas: int, tempo_db: float):
+        acima = consultas > self.orcamento_consultas
+        with self._lock:
+            latencia = self.latencias.setdefault((metodo, rota, str(status)), {"buckets": [0] * len(LATENCIA_BUCKETS), "soma": 0.0})
+            _observa(latencia["buckets"], LATENCIA_BUCKETS, duracao)
+            latencia["soma"] += duracao
+
+            banco = self.consultas.setdefault((metodo, rota), {"buckets": [0] * len(CONSULTAS_BUCKETS), "soma": 0, "tempo_db": 0.0, "acima_orcamento": 0})
+            _observa(banco["buckets"], CONSULTAS_BUCKETS, consultas)
+            banco["soma"] += consultas
+            banco["tempo_db"] += tempo_db
+            banco["acima_orcamento"] += acima
+
+        if acima:
+            logger.warning("%s %s fez %d consultas ao banco (orçamento: %d, %.1f ms no banco)", metodo, rota, consultas, self.orcamento_consultas, tempo_db * 1000)
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "latencias": [[list(chave), {**valor, "buckets": list(valor["buckets"])}] for chave, valor in self.latencias.items()],
+                "consultas": [[list(chave), {**valor, "buckets": list(valor["buckets"])}] for chave, valor in self.consultas.items()],
+            }
+
+    def salva(self, diretorio: str):
+        '''
+        Grava o estado do worker em <diretorio>/<pid>.json. A escrita é atômica para
+        que o /metrics de outro worker nunca leia um arquivo pela metade.
+        '''
+        fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+        with os.fdopen(fd, "w") as arquivo:
+            json.dump(self.estado(), arquivo)
+        os.replace(temporario, os.path.join(diretorio, f"{os.getpid()}.json"))
+
+    async def start(self, diretorio: Optional[str] = METRICAS_DIR, intervalo: float = METRICAS_INTERVALO):
+        self.diretorio = diretorio
+        self._tarefa = asyncio.create_task(self._grava(intervalo)) if diretorio else None
+
+    async def stop(self):
+        if self._tarefa is None:
+            return
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(self.salva, self.diretorio)
+
+    async def _grava(self, intervalo: float):
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await asyncio.to_thread(self.salva, self.diretorio)
+            except OSError as e:
+                logger.warning("Falha ao gravar as métricas em %s: %s", self.diretorio, e)
+
+    def coleta(self) -> dict:
+        '''
+        Estado somado de todos os workers que gravaram em METRICAS_DIR, com o deste
+        worker atualizado. Os arquivos de workers encerrados continuam somados, para que
+        os contadores nunca diminuam; o diretório deve ser limpo a cada deploy.
+        '''
+        if not self.diretorio:
+            return self.estado()
+
+        self.salva(self.diretorio)
+        estados = []
+        for caminho in glob.glob(os.path.join(self.diretorio, "*.json")):
+            try:
+                with open(caminho) as arquivo:
+                    estados.append(json.load(arquivo))
+            except (OSError, ValueError) as e:
+                logger.warning("Métricas ignoradas em %s: %s", caminho, e)
+        return agrega(estados)
+
+
+def agrega(estados: list[dict]) -> dict:
+    somados = {"latencias": {}, "consultas": {}}
+    for estado in estados:
+        for tipo, series in somados.items():
+            for chave, valor in estado[tipo]:
+                chave = tuple(chave)
+                if chave not in series:
+                    series[chave] = {**valor, "buckets": list(valor["buckets"])}
+                    continue
+                atual = series[chave]
+                for campo, quantidade in valor.items():
+                    if campo == "buckets":
+                        atual["buckets"] = [a + b for a, b in zip(atual["buckets"], quantidade)]
+                    else:
+                        atual[campo] += quantidade
+    return {tipo: [[list(chave), valor] for chave, valor in series.items()] for tipo, series in somados.items()}
+
+
+def _rotulos(**rotulos) -> str:
+    def escapa(valor: str) -> str:
+        return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{nome}="{escapa(str(valor))}"' for nome, valor in rotulos.items())
+
+
+def _limite(limite: float) -> str:
+    return "+Inf" if limite == float("inf") else repr(limite)
+
+
+def _histograma(linhas: list, nome: str, rotulos: dict, limites: tuple, buckets: list, soma: float):
+    acumulado = 0
+    for limite, quantidade in zip(limites, buckets):
+        acumulado += quantidade
+        linhas.append(f"{nome}_bucket{{{_rotulos(**rotulos, le=_limite(limite))}}} {acumulado}")
+    linhas.append(f"{nome}_sum{{{_rotulos(**rotulos)}}} {soma}")
+    linhas.append(f"{nome}_count{{{_rotulos(**rotulos)}}} {acumulado}")
+
+
+def formata_prometheus(estado: dict) -> str:
+    '''
+    Formato de texto do Prometheus (versão 0.0.4).
+    '''
+    linhas = [
+        "# HELP http_request_duration_seconds Latência das requisições por rota e status.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (metodo, rota, status), valor in sorted(estado["latencias"], key=lambda serie: serie[0]):
+        _histograma(linhas, "http_request_duration_seconds", {"method": metodo, "route": rota, "status": status}, LATENCIA_BUCKETS, valor["buckets"], valor["soma"])
+
+    consultas = sorted(estado["consultas"], key=lambda serie: serie[0])
+    linhas += [
+        "# HELP db_queries_per_request Consultas ao banco por requisição.",
+        "# TYPE db_queries_per_request histogram",
+    ]
+    for (metodo, rota), valor in consultas:
+        _histograma(linhas, "db_queries_per_request", {"method": metodo, "route": rota}, CONSULTAS_BUCKETS, valor["buckets"], valor["soma"])
+
+    linhas += [
+        "# HELP db_query_duration_seconds_total Tempo gasto no banco pelas requisições.",
+        "# TYPE db_query_duration_seconds_total counter",
+    ]
+    linhas += [f"db_query_duration_seconds_total{{{_rotulos(method=metodo, route=rota)}}} {valor['tempo_db']}" for (metodo, rota), valor in consultas]
+
+    linhas += [
+        "# HELP http_requests_over_query_budget_total Requisições com mais consultas que METRICAS_ORCAMENTO_CONSULTAS.",
+        "# TYPE http_requests_over_query_budget_total counter",
+    ]
+    linhas += [f"http_requests_over_query_budget_total{{{_rotulos(method=metodo, route=rota)}}} {valor['acima_orcamento']}" for (metodo, rota), valor in consultas]
+    return "\n".join(linhas) + "\n"
+
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    if _requisicao.get() is not None:
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+def _conta_consulta(conn):
+    if not conn.info.get("metricas_inicio"):
+        return
+    duracao = time.perf_counter() - conn.info["metricas_inicio"].pop()
+    requisicao = _requisicao.get()
+    if requisicao is not None:
+        requisicao.consultas += 1
+        requisicao.tempo_db += duracao
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    _conta_consulta(conn)
+
+def _erro_na_consulta(contexto):
+    # Consultas com erro não chegam ao after_cursor_execute; sem isso, o início ficaria na pilha
+    if contexto.connection is not None:
+        _conta_consulta(contexto.connection)
+
+def instrumenta(*engines):
+    '''
+    Conta as consultas e o tempo no banco da requisição em andamento. A requisição é
+    encontrada por uma ContextVar, que o SQLAlchemy repassa ao greenlet do run_sync e o
+    Starlette às threads das rotas síncronas; consultas fora de uma requisição, como as
+    do flush do buffer de localizações, não são contadas.
+    '''
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+        event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+        event.listen(engine, "handle_error", _erro_na_consulta)
+
+
+class MetricasMiddleware:
+    '''
+    Middleware ASGI que mede cada requisição até o fim da resposta e a registra com a
+    rota que o FastAPI deixou no scope. Respostas em streaming, como os eventos SSE e as
+    exportações, duram o quanto o cliente ficar conectado; delas é registrado só o tempo
+    até o início da resposta, para não distorcer os percentis da rota.
+    '''
+    def __init__(self, app, metricas: Metricas):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requisicao = _Requisicao()
+        token = _requisicao.set(requisicao)
+        status = 500
+        inicio = time.perf_counter()
+        inicio_resposta = None
+        streaming = False
+
+        async def send_medindo(message):
+            nonlocal status, inicio_resposta, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                inicio_resposta = time.perf_counter()
+            elif message["type"] == "http.response.body" and message.get("more_body", False):
+                streaming = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_medindo)
+        finally:
+            _requisicao.reset(token)
+            rota = scope.get("route")
+            fim = inicio_resposta if streaming else time.perf_counter()
+            self.metricas.registra(scope["method"], getattr(rota, "path", SEM_ROTA), status, fim - inicio, requisicao.consultas, requisicao.tempo_db)
+
+
+registro = Metricas()
@@ -0,0 +1,96 @@
+"""Esquema inicial, como criado pelo create_all antes das migrações
+
+Bancos criados pelo create_all devem ser marcados com `alembic stamp 0001_esquema_inicial`
+antes do primeiro `alembic upgrade head`.
+
+Revision ID: 0001_esquema_inicial
+Revises:
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0001_esquema_inicial"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "clientes",
+        sa.Column("cliente_id", sa.Integer(), primary_key=True),
+        sa.Column("nome", sa.String(200)),
+        sa.Column("email", sa.String(200)),
+        sa.Column("cpf", sa.String(14)),
+        sa.Column("telefone", sa.String(200)),
+        sa.Column("endereco", sa.String(200)),
+        sa.Column("hash_password", sa.String(200)),
+        sa.Column("status", sa.String(36)),
+        sa.Column("data_cadastro", sa.DateTime()),
+    )
+    for coluna in ("cliente_id", "nome", "email", "telefone", "endereco", "hash_password", "status"):
+        op.create_index(f"ix_clientes_{coluna}", "clientes", [coluna])
+    op.create_index("ix_clientes_cpf", "clientes", ["cpf"], unique=True)
+
+    op.create_table(
+        "produtos",
+        sa.Column("produto_id", sa.Integer(), primary_key=True),
+        sa.Column("nome", sa.String(200)),
+        sa.Column("preco", sa.Float()),
+        sa.Column("descricao", sa.String(200), nullable=True),
+        sa.Column("ultima_atualizacao", sa.DateTime()),
+        sa.Column("status", sa.String(36)),
+    )
+    for coluna in ("produto_id", "nome", "preco", "descricao", "status"):
+        op.create_index(f"ix_produtos_{coluna}", "produtos", [coluna])
+
+    # encomendas e encomendas_localizacoes se referenciam; a chave estrangeira da
+    # localização atual é criada depois das duas tabelas
+    op.create_table(
+        "encomendas",
+        sa.Column("encomenda_id", sa.Integer(), primary_key=True),
+        sa.Column("cliente_id", sa.Integer(), sa.ForeignKey("clientes.cliente_id")),
+        sa.Column("descricao", sa.String(200), nullable=True),
+        sa.Column("valor_total", sa.Float()),
+        sa.Column("status", sa.String(36)),
+        sa.Column("localizacao_atual_id", sa.Integer(), nullable=True),
+    )
+    for coluna in ("encomenda_id", "descricao", "valor_total", "status"):
+        op.create_index(f"ix_encomendas_{coluna}", "encomendas", [coluna])
+
+    op.create_table(
+        "encomendas_produtos",
+        sa.Column("encomenda_id", sa.Integer(), sa.ForeignKey("encomendas.encomenda_id"), primary_key=True),
+        sa.Column("produto_id", sa.Integer(), sa.ForeignKey("produtos.produto_id"), primary_key=True),
+        sa.Column("quantidade", sa.Integer()),
+    )
+    op.create_index("ix_encomendas_produtos_quantidade", "encomendas_produtos", ["quantidade"])
+
+    op.create_table(
+        "encomendas_localizacoes",
+        sa.Column("localizacao_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("encomenda_id", sa.Integer(), sa.ForeignKey("encomendas.encomenda_id"), primary_key=True),
+        sa.Column("localizacao", sa.String(200)),
+        sa.Column("data", sa.DateTime()),
+    )
+    for coluna in ("localizacao_id", "localizacao"):
+        op.create_index(f"ix_encomendas_localizacoes_{coluna}", "encomendas_localizacoes", [coluna])
+
+    op.create_foreign_key(
+        "fk_encomendas_localizacao_atual_id", "encomendas", "encomendas_localizacoes",
+        ["localizacao_atual_id"], ["localizacao_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("fk_encomendas_localizacao_atual_id", "encomendas", type_="foreignkey")
+    op.drop_table("encomendas_localizacoes")
+    op.drop_table("encomendas_produtos")
+    op.drop_table("encomendas")
+    op.drop_table("produtos")
+    op.drop_table("clientes")
@@ -0,0 +1,47 @@
+"""Versão do catálogo de produtos e índice (encomenda_id, data) do histórico de localizações
+
+Os dois objetos podem já existir em bancos que rodaram o create_all da aplicação,
+por isso só são criados quando faltam.
+
+Revision ID: 0002_catalogo_versao_historico
+Revises: 0001_esquema_inicial
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision: str = "0002_catalogo_versao_historico"
+down_revision: Union[str, Sequence[str], None] = "0001_esquema_inicial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # No modo --sql não há banco para inspecionar: os dois objetos são criados
+    offline = context.is_offline_mode()
+    inspector = None if offline else sa.inspect(op.get_bind())
+
+    if offline or not inspector.has_table("catalogo_versao"):
+        catalogo_versao = op.create_table(
+            "catalogo_versao",
+            sa.Column("catalogo_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("versao", sa.Integer(), nullable=False),
+        )
+        # A linha única é criada aqui para que os workers só precisem de um UPDATE ao
+        # incrementar a versão, sem disputar o INSERT da primeira escrita
+        op.bulk_insert(catalogo_versao, [{"catalogo_id": 1, "versao": 0}])
+    elif not op.get_bind().scalar(sa.text("SELECT COUNT(*) FROM catalogo_versao WHERE catalogo_id = 1")):
+        op.execute("INSERT INTO catalogo_versao (catalogo_id, versao) VALUES (1, 0)")
+
+    indices = set() if offline else {indice["name"] for indice in inspector.get_indexes("encomendas_localizacoes")}
+    if "ix_encomendas_localizacoes_encomenda_id_data" not in indices:
+        op.create_index("ix_encomendas_localizacoes_encomenda_id_data", "encomendas_localizacoes", ["encomenda_id", "data"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_encomendas_localizacoes_encomenda_id_data", table_name="encomendas_localizacoes")
+    op.drop_table("catalogo_versao")
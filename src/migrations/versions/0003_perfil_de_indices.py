@@ -0,0 +1,65 @@
+"""Perfil de índices a partir das consultas de crud.py
+
+Remove os índices de coluna única que nenhuma consulta usa (inclusive os índices
+secundários redundantes sobre as chaves primárias), cria os índices compostos das
+listagens paginadas e reduz a chave primária de encomendas_localizacoes a localizacao_id.
+
+Revision ID: 0003_perfil_de_indices
+Revises: 0002_catalogo_versao_historico
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0003_perfil_de_indices"
+down_revision: Union[str, Sequence[str], None] = "0002_catalogo_versao_historico"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDICES_REMOVIDOS = {
+    "clientes": ("cliente_id", "nome", "email", "telefone", "endereco", "hash_password", "status"),
+    "produtos": ("produto_id", "preco", "descricao", "status"),
+    "encomendas": ("encomenda_id", "descricao", "valor_total", "status"),
+    "encomendas_produtos": ("quantidade",),
+    "encomendas_localizacoes": ("localizacao",),
+}
+
+INDICES_COMPOSTOS = {
+    "ix_clientes_status_cliente_id": ("clientes", ["status", "cliente_id"]),
+    "ix_produtos_preco_produto_id": ("produtos", ["preco", "produto_id"]),
+    "ix_encomendas_status_encomenda_id": ("encomendas", ["status", "encomenda_id"]),
+    "ix_encomendas_cliente_id_encomenda_id": ("encomendas", ["cliente_id", "encomenda_id"]),
+}
+
+
+def upgrade() -> None:
+    for nome, (tabela, colunas) in INDICES_COMPOSTOS.items():
+        op.create_index(nome, tabela, colunas)
+
+    for tabela, colunas in INDICES_REMOVIDOS.items():
+        for coluna in colunas:
+            op.drop_index(f"ix_{tabela}_{coluna}", table_name=tabela)
+
+    # encomenda_id não precisa fazer parte da chave primária: localizacao_id já é único e
+    # o índice (encomenda_id, data) atende as buscas por encomenda. O índice de
+    # localizacao_id mantém a coluna auto_increment indexada durante a troca da chave.
+    op.drop_constraint("PRIMARY", "encomendas_localizacoes", type_="primary")
+    op.create_primary_key("pk_encomendas_localizacoes", "encomendas_localizacoes", ["localizacao_id"])
+    op.drop_index("ix_encomendas_localizacoes_localizacao_id", table_name="encomendas_localizacoes")
+
+
+def downgrade() -> None:
+    op.create_index("ix_encomendas_localizacoes_localizacao_id", "encomendas_localizacoes", ["localizacao_id"])
+    op.drop_constraint("PRIMARY", "encomendas_localizacoes", type_="primary")
+    op.create_primary_key("pk_encomendas_localizacoes", "encomendas_localizacoes", ["localizacao_id", "encomenda_id"])
+
+    for tabela, colunas in INDICES_REMOVIDOS.items():
+        for coluna in colunas:
+            op.create_index(f"ix_{tabela}_{coluna}", tabela, [coluna])
+
+    for nome, (tabela, _) in INDICES_COMPOSTOS.items():
+        op.drop_index(nome, table_name=tabela)
@@ -0,0 +1,30 @@
+"""Chave de lote das encomendas
+
+create_encomendas_batch insere as encomendas com um executemany e recupera os ids
+gerados pela chave_lote de cada linha, em uma única consulta.
+
+Revision ID: 0004_chave_lote_encomendas
+Revises: 0003_perfil_de_indices
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004_chave_lote_encomendas"
+down_revision: Union[str, Sequence[str], None] = "0003_perfil_de_indices"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("encomendas", sa.Column("chave_lote", sa.String(36), nullable=True))
+    op.create_unique_constraint("uq_encomendas_chave_lote", "encomendas", ["chave_lote"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_encomendas_chave_lote", "encomendas", type_="unique")
+    op.drop_column("encomendas", "chave_lote")
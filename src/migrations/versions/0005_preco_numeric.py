@@ -0,0 +1,28 @@
+"""Preço dos produtos como NUMERIC(10, 2)
+
+Com FLOAT de precisão simples o preço gravado (19.8999996) nunca é igual ao preço
+do cursor de paginação (19.9), e produtos com o mesmo preço eram pulados.
+
+Revision ID: 0005_preco_numeric
+Revises: 0004_chave_lote_encomendas
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0005_preco_numeric"
+down_revision: Union[str, Sequence[str], None] = "0004_chave_lote_encomendas"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column("produtos", "preco", existing_type=sa.Float(), type_=sa.Numeric(10, 2))
+
+
+def downgrade() -> None:
+    op.alter_column("produtos", "preco", existing_type=sa.Numeric(10, 2), type_=sa.Float())
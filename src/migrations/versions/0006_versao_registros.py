@@ -0,0 +1,35 @@
+"""Versão e data de atualização de produtos, encomendas e clientes
+
+A versão de cada linha é incrementada a cada UPDATE e compõe os ETags das leituras.
+As linhas existentes começam na versão 1; clientes e encomendas já gravados ficam sem
+data de atualização até a primeira alteração.
+
+Revision ID: 0006_versao_registros
+Revises: 0005_preco_numeric
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0006_versao_registros"
+down_revision: Union[str, Sequence[str], None] = "0005_preco_numeric"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for tabela in ("produtos", "encomendas", "clientes"):
+        op.add_column(tabela, sa.Column("versao", sa.Integer(), nullable=False, server_default="1"))
+    for tabela in ("encomendas", "clientes"):
+        op.add_column(tabela, sa.Column("ultima_atualizacao", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    for tabela in ("encomendas", "clientes"):
+        op.drop_column(tabela, "ultima_atualizacao")
+    for tabela in ("produtos", "encomendas", "clientes"):
+        op.drop_column(tabela, "versao")
@@ -0,0 +1,41 @@
+"""Resumo das encomendas por cliente e data de criação das encomendas
+
+Cria clientes_resumos, já preenchida a partir das encomendas existentes. Encomendas
+já gravadas ficam sem data de criação.
+
+Revision ID: 0007_resumos_clientes
+Revises: 0006_versao_registros
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0007_resumos_clientes"
+down_revision: Union[str, Sequence[str], None] = "0006_versao_registros"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("encomendas", sa.Column("data_criacao", sa.DateTime(), nullable=True))
+    op.create_table(
+        "clientes_resumos",
+        sa.Column("cliente_id", sa.Integer(), sa.ForeignKey("clientes.cliente_id"), primary_key=True),
+        sa.Column("status", sa.String(36), primary_key=True),
+        sa.Column("quantidade", sa.Integer(), nullable=False),
+        sa.Column("valor_total", sa.Numeric(14, 2), nullable=False),
+    )
+    op.execute(
+        "INSERT INTO clientes_resumos (cliente_id, status, quantidade, valor_total) "
+        "SELECT cliente_id, status, COUNT(*), SUM(ROUND(valor_total, 2)) FROM encomendas "
+        "WHERE cliente_id IS NOT NULL AND status IS NOT NULL GROUP BY cliente_id, status"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("clientes_resumos")
+    op.drop_column("encomendas", "data_criacao")
@@ -0,0 +1,30 @@
+"""Versão do catálogo da última escrita em cada produto
+
+Usada pelo índice de busca de produtos para reler apenas os produtos alterados.
+Produtos já gravados ficam com versão 0 e entram na primeira carga do índice.
+
+Revision ID: 0008_busca_produtos
+Revises: 0007_resumos_clientes
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008_busca_produtos"
+down_revision: Union[str, Sequence[str], None] = "0007_resumos_clientes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("produtos", sa.Column("versao_catalogo", sa.Integer(), nullable=False, server_default="0"))
+    op.create_index("ix_produtos_versao_catalogo", "produtos", ["versao_catalogo"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_produtos_versao_catalogo", table_name="produtos")
+    op.drop_column("produtos", "versao_catalogo")
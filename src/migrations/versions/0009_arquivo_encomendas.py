@@ -0,0 +1,54 @@
+"""Tabelas de arquivo das encomendas finalizadas
+
+Recebem, de arquiva.py, as encomendas ENTREGUE ou CANCELADA antigas, com os seus
+itens e localizações. Não têm chaves estrangeiras nem índices secundários.
+
+Revision ID: 0009_arquivo_encomendas
+Revises: 0008_busca_produtos
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0009_arquivo_encomendas"
+down_revision: Union[str, Sequence[str], None] = "0008_busca_produtos"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "encomendas_arquivo",
+        sa.Column("encomenda_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("cliente_id", sa.Integer()),
+        sa.Column("descricao", sa.String(200), nullable=True),
+        sa.Column("valor_total", sa.Float()),
+        sa.Column("status", sa.String(36)),
+        sa.Column("localizacao_atual_id", sa.Integer(), nullable=True),
+        sa.Column("data_criacao", sa.DateTime()),
+        sa.Column("ultima_atualizacao", sa.DateTime()),
+        sa.Column("arquivado_em", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "encomendas_produtos_arquivo",
+        sa.Column("encomenda_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("produto_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("quantidade", sa.Integer()),
+    )
+    op.create_table(
+        "encomendas_localizacoes_arquivo",
+        sa.Column("localizacao_id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("encomenda_id", sa.Integer(), nullable=False),
+        sa.Column("localizacao", sa.String(200)),
+        sa.Column("data", sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("encomendas_localizacoes_arquivo")
+    op.drop_table("encomendas_produtos_arquivo")
+    op.drop_table("encomendas_arquivo")
@@ -0,0 +1,27 @@
+"""Índice de cliente em encomendas_arquivo
+
+Atende a leitura da última encomenda de um cliente no resumo, que também considera
+as encomendas arquivadas.
+
+Revision ID: 0010_arquivo_cliente
+Revises: 0009_arquivo_encomendas
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0010_arquivo_cliente"
+down_revision: Union[str, Sequence[str], None] = "0009_arquivo_encomendas"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_encomendas_arquivo_cliente_id_encomenda_id", "encomendas_arquivo", ["cliente_id", "encomenda_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_encomendas_arquivo_cliente_id_encomenda_id", table_name="encomendas_arquivo")
@@ -1,21 +1,41 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import DDL, event, Column, Integer, String, ForeignKey, DateTime, Float, Index, Numeric, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from database import Base
 
+# Os índices seguem as consultas de crud.py: cada índice extra é mantido em toda escrita,
+# então só são indexadas as colunas usadas em filtros e ordenações. As chaves primárias
+# já são indexadas e não recebem um índice secundário.
+
+def coluna_versao():
+    '''
+    Versão do registro, usada nos ETags das leituras. Começa em 1 e é incrementada pelo
+    banco em todo UPDATE da linha, inclusive nos UPDATEs em lote de crud.py.
+    '''
+    return Column(Integer, nullable=False, default=1, onupdate=literal_column("versao", Integer) + 1)
+
+def coluna_ultima_atualizacao():
+    return Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 class Cliente(Base):
     __tablename__ = "clientes"
+    __table_args__ = (
+        # get_clientes_by_status, paginado por cliente_id
+        Index("ix_clientes_status_cliente_id", "status", "cliente_id"),
+    )
 
-    cliente_id = Column(Integer, primary_key=True, index=True)
-    nome = Column(String(200), index=True)
-    email = Column(String(200), index=True)
+    cliente_id = Column(Integer, primary_key=True)
+    nome = Column(String(200))
+    email = Column(String(200))
     cpf = Column(String(14), index=True, unique=True)
-    telefone = Column(String(200), index=True)
-    endereco = Column(String(200), index=True)
-    hash_password = Column(String(200), index=True)
-    status = Column(String(36), index=True, default="ATIVO")
+    telefone = Column(String(200))
+    endereco = Column(String(200))
+    hash_password = Column(String(200))
+    status = Column(String(36), default="ATIVO")
     data_cadastro = Column(DateTime, default=datetime.now())
+    versao = coluna_versao()
+    ultima_atualizacao = coluna_ultima_atualizacao()
 
     encomendas = relationship("Encomenda", back_populates="cliente")
     
@@ -25,14 +45,24 @@ class Cliente(Base):
 
 class Produto(Base):
     __tablename__ = "produtos"
+    __table_args__ = (
+        # get_produtos com filtro de preço, paginado por (preco, produto_id)
+        Index("ix_produtos_preco_produto_id", "preco", "produto_id"),
+        # sincronização incremental do índice de busca (busca.py)
+        Index("ix_produtos_versao_catalogo", "versao_catalogo"),
+    )
 
-    produto_id = Column(Integer, primary_key=True, index=True)
+    produto_id = Column(Integer, primary_key=True)
     nome = Column(String(200), index=True)
-    preco = Column(Float, index=True)
-    descricao = Column(String(200), index=True, nullable=True)
-    ultima_atualizacao = Column(DateTime, default=datetime.now())
+    # Numeric para que o preço do cursor de get_produtos seja comparado com o valor exato gravado
+    preco = Column(Numeric(10, 2))
+    descricao = Column(String(200), nullable=True)
+    ultima_atualizacao = coluna_ultima_atualizacao()
+    versao = coluna_versao()
+    # Versão do catálogo (catalogo_versao) da última escrita no produto
+    versao_catalogo = Column(Integer, nullable=False, default=0)
 
-    status = Column(String(36), index=True, default="ATIVO")
+    status = Column(String(36), default="ATIVO")
     
     def __repr__(self):
         return f"<Produto(produtoId={self.produtoId}, nome={self.nome}, preco={self.preco}, descricao={self.descricao}, ultima_atualizacao={self.ultima_atualizacao})>"
@@ -40,13 +70,25 @@ class Produto(Base):
 
 class Encomenda(Base):
     __tablename__ = "encomendas"
+    __table_args__ = (
+        # get_encomendas_by_status, paginado por encomenda_id
+        Index("ix_encomendas_status_encomenda_id", "status", "encomenda_id"),
+        # get_cliente_encomendas
+        Index("ix_encomendas_cliente_id_encomenda_id", "cliente_id", "encomenda_id"),
+    )
 
-    encomenda_id = Column(Integer, primary_key=True, index=True)
+    encomenda_id = Column(Integer, primary_key=True)
     cliente_id = Column(Integer, ForeignKey("clientes.cliente_id"))
-    descricao = Column(String(200), index=True, nullable=True)
-    valor_total = Column(Float, index=True)
-    status = Column(String(36), index=True, default="PENDENTE")
+    descricao = Column(String(200), nullable=True)
+    valor_total = Column(Float)
+    status = Column(String(36), default="PENDENTE")
     localizacao_atual_id = Column(Integer, ForeignKey("encomendas_localizacoes.localizacao_id"), nullable=True)
+    # Chave gerada por create_encomendas_batch para recuperar, em uma consulta, os ids
+    # das encomendas inseridas em lote; nula nas encomendas criadas uma a uma
+    chave_lote = Column(String(36), nullable=True, unique=True)
+    data_criacao = Column(DateTime, default=datetime.now)
+    versao = coluna_versao()
+    ultima_atualizacao = coluna_ultima_atualizacao()
 
     localizacao_atual = relationship("EncomendaLocalizacao", foreign_keys=[localizacao_atual_id])
     cliente = relationship("Cliente", back_populates="encomendas", foreign_keys=[cliente_id])
@@ -59,9 +101,10 @@ class Encomenda(Base):
 class EncomendaProduto(Base):
     __tablename__ = "encomendas_produtos"
 
+    # A chave primária (encomenda_id, produto_id) atende as buscas pelos produtos de uma encomenda
     encomenda_id = Column(Integer, ForeignKey("encomendas.encomenda_id"), primary_key=True)
     produto_id = Column(Integer, ForeignKey("produtos.produto_id"), primary_key=True)
-    quantidade = Column(Integer, index=True)
+    quantidade = Column(Integer)
     
     def __repr__(self):
         return f"<EncomendaProduto(encomendaId={self.encomendaId}, produtoId={self.produtoId})>"
@@ -69,11 +112,90 @@ class EncomendaProduto(Base):
 
 class EncomendaLocalizacao(Base):
     __tablename__ = "encomendas_localizacoes"
+    __table_args__ = (
+        # Histórico de uma encomenda filtrado e ordenado por data
+        Index("ix_encomendas_localizacoes_encomenda_id_data", "encomenda_id", "data"),
+    )
 
-    localizacao_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    encomenda_id = Column(Integer, ForeignKey("encomendas.encomenda_id"), primary_key=True)
-    localizacao = Column(String(200), index=True)
-    data = Column(DateTime, default=datetime.now())
+    localizacao_id = Column(Integer, primary_key=True, autoincrement=True)
+    encomenda_id = Column(Integer, ForeignKey("encomendas.encomenda_id"), nullable=False)
+    localizacao = Column(String(200))
+    data = Column(DateTime, default=datetime.now)
     
     def __repr__(self):
-        return f"<EncomendaLocalizacao(encomendaId={self.encomendaId}, localizacao={self.localizacao}, data={self.data})>"
\ No newline at end of file
+        return f"<EncomendaLocalizacao(encomendaId={self.encomendaId}, localizacao={self.localizacao}, data={self.data})>"
+
+# Tabelas de arquivo: encomendas finalizadas movidas por arquiva.py, com os seus itens e
+# localizações. Sem chaves estrangeiras, para que as linhas arquivadas não prendam as vivas,
+# e sem índices além das chaves primárias, já que nenhuma rota as consulta.
+
+class EncomendaArquivo(Base):
+    __tablename__ = "encomendas_arquivo"
+    __table_args__ = (
+        # Última encomenda do cliente em get_cliente_resumo
+        Index("ix_encomendas_arquivo_cliente_id_encomenda_id", "cliente_id", "encomenda_id"),
+    )
+
+    encomenda_id = Column(Integer, primary_key=True, autoincrement=False)
+    cliente_id = Column(Integer)
+    descricao = Column(String(200), nullable=True)
+    valor_total = Column(Float)
+    status = Column(String(36))
+    localizacao_atual_id = Column(Integer, nullable=True)
+    data_criacao = Column(DateTime)
+    ultima_atualizacao = Column(DateTime)
+    arquivado_em = Column(DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return f"<EncomendaArquivo(encomendaId={self.encomenda_id}, clienteId={self.cliente_id}, status={self.status}, arquivadoEm={self.arquivado_em})>"
+
+class EncomendaProdutoArquivo(Base):
+    __tablename__ = "encomendas_produtos_arquivo"
+
+    encomenda_id = Column(Integer, primary_key=True, autoincrement=False)
+    produto_id = Column(Integer, primary_key=True, autoincrement=False)
+    quantidade = Column(Integer)
+
+    def __repr__(self):
+        return f"<EncomendaProdutoArquivo(encomendaId={self.encomenda_id}, produtoId={self.produto_id})>"
+
+class EncomendaLocalizacaoArquivo(Base):
+    __tablename__ = "encomendas_localizacoes_arquivo"
+
+    localizacao_id = Column(Integer, primary_key=True, autoincrement=False)
+    encomenda_id = Column(Integer, nullable=False)
+    localizacao = Column(String(200))
+    data = Column(DateTime)
+
+    def __repr__(self):
+        return f"<EncomendaLocalizacaoArquivo(encomendaId={self.encomenda_id}, localizacao={self.localizacao}, data={self.data})>"
+
+class ResumoCliente(Base):
+    '''
+    Quantidade e valor das encomendas de um cliente em cada status, incluindo as movidas
+    para encomendas_arquivo. Mantido por crud.py na mesma transação de cada escrita em
+    encomendas e reconstruído por resumos.py.
+    '''
+    __tablename__ = "clientes_resumos"
+
+    # A chave primária (cliente_id, status) atende a leitura do resumo de um cliente
+    cliente_id = Column(Integer, ForeignKey("clientes.cliente_id"), primary_key=True)
+    status = Column(String(36), primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    valor_total = Column(Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ResumoCliente(clienteId={self.cliente_id}, status={self.status}, quantidade={self.quantidade}, valorTotal={self.valor_total})>"
+
+class CatalogoVersao(Base):
+    __tablename__ = "catalogo_versao"
+
+    catalogo_id = Column(Integer, primary_key=True, autoincrement=False)
+    versao = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogoVersao(catalogoId={self.catalogo_id}, versao={self.versao})>"
+
+# A única linha da tabela é criada junto com ela, para que as escritas no catálogo só
+# precisem de um UPDATE. Nas migrações a linha é criada pela 0002
+event.listen(CatalogoVersao.__table__, "after_create", DDL("INSERT INTO catalogo_versao (catalogo_id, versao) VALUES (1, 0)"))
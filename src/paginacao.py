@@ -0,0 +1,42 @@
+import base64
+import json
+from typing import Any, Callable, Optional
+
+# Os cursores são os valores da chave de ordenação do último item da página,
+# serializados em JSON e codificados em base64 para que o cliente os trate como opacos.
+
+def encode_cursor(*chave: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(chave, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+def _tipo_valido(valor: Any, tipo: type) -> bool:
+    # bool é subclasse de int, mas nunca é uma chave válida
+    if isinstance(valor, bool):
+        return False
+    if tipo is float:
+        return isinstance(valor, (int, float))
+    return isinstance(valor, tipo)
+
+def decode_cursor(cursor: Optional[str], tipos: tuple[type, ...]) -> Optional[tuple]:
+    '''
+    Decodifica um cursor cuja chave deve ter um valor de cada tipo em tipos, na ordem.
+    '''
+    if cursor is None:
+        return None
+
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido.")
+
+    if not isinstance(chave, list) or len(chave) != len(tipos) or not all(_tipo_valido(valor, tipo) for valor, tipo in zip(chave, tipos)):
+        raise ValueError("Cursor inválido para esta listagem.")
+
+    return tuple(chave)
+
+def pagina(itens: list, limit: int, chave: Callable[[Any], tuple]) -> dict:
+    '''
+    Monta a resposta paginada a partir de até limit + 1 itens: o item extra
+    indica que existe uma próxima página e não é retornado.
+    '''
+    proximo_cursor = encode_cursor(*chave(itens[limit - 1])) if len(itens) > limit else None
+    return {"itens": itens[:limit], "proximo_cursor": proximo_cursor}
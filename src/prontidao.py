@@ -0,0 +1,158 @@
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+# Marcado antes das demais importações do app; main.py importa este módulo primeiro
+IMPORTADO_EM = time.perf_counter()
+
+from sqlalchemy import text
+
+import async_crud
+from database import AsyncSessionLocal, POOL_SIZE, async_engine
+
+logger = logging.getLogger(__name__)
+
+# Com true, o worker só fica pronto se o banco estiver na última migração
+DB_CHECK_MIGRATIONS = os.getenv("DB_CHECK_MIGRATIONS", "true").lower() in ("1", "true", "yes")
+MIGRACOES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def _revisao_atual(conn) -> Optional[str]:
+    from alembic.runtime.migration import MigrationContext
+    return MigrationContext.configure(conn).get_current_revision()
+
+def _revisao_esperada() -> Optional[str]:
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory(MIGRACOES_DIR).get_current_head()
+
+
+class Prontidao:
+    '''
+    Estado de inicialização de um worker. O esquema do banco não é mais criado na
+    importação: as migrações são aplicadas antes do deploy, e o worker só confere a
+    revisão do banco, abre as conexões do pool e carrega o cache do catálogo antes de
+    receber tráfego. Os tempos são medidos a partir da importação deste módulo.
+    '''
+    def __init__(self, check_migrations: bool = DB_CHECK_MIGRATIONS):
+        self.check_migrations = check_migrations
+        self.importado_em = IMPORTADO_EM
+        self.pronto = False
+        self.erro: Optional[str] = None
+        self.revisao: Optional[str] = None
+        self.pronto_segundos: Optional[float] = None
+        self.aquecimento_segundos: Optional[float] = None
+        self.primeira_requisicao_segundos: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def aquecer(self) -> bool:
+        '''
+        Executa as verificações de inicialização até que todas passem. Em caso de
+        falha o erro fica em self.erro e uma nova tentativa é feita na próxima chamada.
+        '''
+        async with self._lock:
+            if self.pronto:
+                return True
+
+            inicio = time.perf_counter()
+            try:
+                await self._verifica_migracoes()
+                await self._aquece_pool()
+                await self._aquece_cache()
+            except Exception as e:
+                self.erro = f"{e}"
+                logger.warning("Worker ainda não está pronto: %s", e)
+                return False
+
+            agora = time.perf_counter()
+            self.pronto = True
+            self.erro = None
+            self.aquecimento_segundos = agora - inicio
+            self.pronto_segundos = agora - self.importado_em
+            logger.info("Worker pronto %.3fs após a importação (aquecimento de %.3fs)", self.pronto_segundos, self.aquecimento_segundos)
+            return True
+
+    async def _verifica_migracoes(self):
+        if not self.check_migrations:
+            return
+
+        async with async_engine.connect() as conn:
+            self.revisao = await conn.run_sync(_revisao_atual)
+        esperada = _revisao_esperada()
+        if self.revisao != esperada:
+            raise RuntimeError(f"Banco na revisão {self.revisao}, esperada {esperada}. Execute 'alembic upgrade head'.")
+
+    async def _aquece_pool(self):
+        # As conexões são abertas ao mesmo tempo para que o pool fique com POOL_SIZE delas
+        async def conecta():
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(conecta() for _ in range(POOL_SIZE)))
+
+    async def _aquece_cache(self):
+        # Carrega a versão do catálogo, a primeira página da listagem de produtos e o
+        # índice de busca, cuja carga completa é a parte mais demorada
+        async with AsyncSessionLocal() as db:
+            await async_crud.get_produtos(db, None, 100)
+            await async_crud.sincroniza_indice_produtos(db)
+
+    async def verifica(self) -> bool:
+        '''
+        Verificação de prontidão: aquece o worker se ainda não estiver pronto e
+        confere que o banco continua respondendo.
+        '''
+        if not await self.aquecer():
+            return False
+
+        try:
+            async with async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self.erro = f"{e}"
+            logger.warning("Banco indisponível na verificação de prontidão: %s", e)
+            return False
+
+        self.erro = None
+        return True
+
+    def registra_primeira_requisicao(self):
+        if self.primeira_requisicao_segundos is None:
+            self.primeira_requisicao_segundos = time.perf_counter() - self.importado_em
+            logger.info("Primeira requisição atendida %.3fs após a importação", self.primeira_requisicao_segundos)
+
+    def stats(self) -> dict:
+        return {
+            "pronto": self.pronto,
+            "erro": self.erro,
+            "revisao": self.revisao,
+            "pronto_segundos": self.pronto_segundos,
+            "aquecimento_segundos": self.aquecimento_segundos,
+            "primeira_requisicao_segundos": self.primeira_requisicao_segundos,
+        }
+
+
+class PrimeiraRequisicaoMiddleware:
+    '''
+    Middleware ASGI que registra quando a primeira requisição (fora de /health) termina
+    de ser respondida. Depois disso apenas repassa as requisições.
+    '''
+    def __init__(self, app, estado: Prontidao):
+        self.app = app
+        self.estado = estado
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.estado.primeira_requisicao_segundos is not None or scope["path"] == "/health":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_registrando(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                self.estado.registra_primeira_requisicao()
+
+        await self.app(scope, receive, send_registrando)
+
+
+estado = Prontidao()
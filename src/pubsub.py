@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime
+from typing import Optional
+import asyncio
+import json
+import os
+
+# Eventos guardados por inscrição; um cliente lento perde os mais antigos
+PUBSUB_FILA_INSCRICAO = int(os.getenv("PUBSUB_FILA_INSCRICAO", "16"))
+PUBSUB_MAX_INSCRICOES = int(os.getenv("PUBSUB_MAX_INSCRICOES", "50000"))
+# Intervalo, em segundos, dos comentários enviados em conexões sem eventos
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+
+_FIM = None
+
+
+class Backend(ABC):
+    '''
+    Transporte dos eventos entre quem publica e os hubs que os entregam. Um backend
+    recebe os eventos em publish e os repassa a todos os receptores conectados,
+    inclusive os de outros processos se o transporte permitir. Os receptores devem
+    ser chamados no event loop do worker.
+    '''
+    def __init__(self):
+        self._receptores: list[Callable[[dict], None]] = []
+
+    def conecta(self, receptor: Callable[[dict], None]):
+        self._receptores.append(receptor)
+
+    @abstractmethod
+    async def publish(self, evento: dict):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class InProcessBackend(Backend):
+    '''
+    Entrega os eventos apenas aos receptores do próprio processo. Com vários workers,
+    cada um só vê o que foi publicado nele; para entregar entre workers, troque por um
+    backend que publique em um broker e chame os receptores ao receber as mensagens.
+    '''
+    async def publish(self, evento: dict):
+        for receptor in self._receptores:
+            receptor(evento)
+
+
+def formata_sse(tipo: str, dados: dict) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+
+class EncomendaHub:
+    '''
+    Distribui os eventos de encomendas às inscrições abertas neste worker. Cada inscrição
+    é só uma fila limitada indexada pelo id da encomenda, e cada evento é formatado uma
+    única vez para todas as inscrições da encomenda, então uma inscrição ociosa não
+    consome nada além da própria fila e da conexão.
+    '''
+    def __init__(self, backend: Backend, tamanho_fila: int = PUBSUB_FILA_INSCRICAO, max_inscricoes: int = PUBSUB_MAX_INSCRICOES):
+        self.backend = backend
+        self.tamanho_fila = tamanho_fila
+        self.max_inscricoes = max_inscricoes
+        self.inscricoes = 0
+        self.recusadas = 0
+        self.publicados = 0
+        self.entregues = 0
+        self.descartados = 0
+        self._filas: dict[int, set[asyncio.Queue]] = {}
+        backend.conecta(self._recebe)
+
+    def cheio(self) -> bool:
+        if self.inscricoes >= self.max_inscricoes:
+            self.recusadas += 1
+            return True
+        return False
+
+    async def publish(self, encomenda_id: int, tipo: str, dados: dict):
+        self.publicados += 1
+        await self.backend.publish({"encomenda_id": encomenda_id, "tipo": tipo, "dados": dados})
+
+    async def publish_status(self, encomenda):
+        await self.publish(encomenda.encomenda_id, "status", {"encomenda_id": encomenda.encomenda_id, "status": encomenda.status})
+
+    async def publish_localizacao(self, encomenda_id: int, localizacao: str, data: datetime):
+        await self.publish(encomenda_id, "localizacao", {"encomenda_id": encomenda_id, "localizacao": localizacao, "data": data.isoformat()})
+
+    async def publish_removida(self, encomenda_id: int):
+        await self.publish(encomenda_id, "removida", {"encomenda_id": encomenda_id})
+
+    def _recebe(self, evento: dict):
+        filas = self._filas.get(evento["encomenda_id"])
+        if not filas:
+            return
+
+        mensagem = formata_sse(evento["tipo"], evento["dados"])
+        fim = evento["tipo"] == "removida"
+        for fila in filas:
+            self._entrega(fila, mensagem)
+            if fim:
+                self._entrega(fila, _FIM)
+
+    def _entrega(self, fila: asyncio.Queue, mensagem: Optional[str]):
+        if fila.full():
+            fila.get_nowait()
+            self.descartados += 1
+        fila.put_nowait(mensagem)
+        self.entregues += 1
+
+    def inscreve(self, encomenda_id: int) -> asyncio.Queue:
+        '''
+        Abre uma inscrição para a encomenda. A fila passa a receber os eventos a partir
+        daqui, então deve ser criada antes de ler o estado inicial da encomenda.
+        '''
+        fila = asyncio.Queue(self.tamanho_fila)
+        self._filas.setdefault(encomenda_id, set()).add(fila)
+        self.inscricoes += 1
+        return fila
+
+    def cancela(self, encomenda_id: int, fila: asyncio.Queue):
+        filas = self._filas.get(encomenda_id)
+        if filas is None or fila not in filas:
+            return
+        filas.discard(fila)
+        if not filas:
+            del self._filas[encomenda_id]
+        self.inscricoes -= 1
+
+    async def stream(self, encomenda_id: int, fila: asyncio.Queue, iniciais: list[str], heartbeat: float = SSE_HEARTBEAT) -> AsyncIterator[str]:
+        '''
+        Gera o fluxo Server-Sent Events de uma inscrição aberta com inscreve: as
+        mensagens iniciais e depois cada evento publicado, com um comentário a cada
+        heartbeat segundos sem eventos para manter a conexão aberta em proxies. A
+        inscrição é removida quando o cliente desconecta ou a encomenda é removida.
+        '''
+        try:
+            for mensagem in iniciais:
+                yield mensagem
+            while True:
+                try:
+                    mensagem = await asyncio.wait_for(fila.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if mensagem is _FIM:
+                    return
+                yield mensagem
+        finally:
+            self.cancela(encomenda_id, fila)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "inscricoes": self.inscricoes,
+            "encomendas": len(self._filas),
+            "max_inscricoes": self.max_inscricoes,
+            "recusadas": self.recusadas,
+            "publicados": self.publicados,
+            "entregues": self.entregues,
+            "descartados": self.descartados,
+        }
+
+
+hub = EncomendaHub(InProcessBackend())
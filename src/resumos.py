@@ -0,0 +1,43 @@
+"""
+Confere o resumo das encomendas de cada cliente (clientes_resumos) contra as
+encomendas e as encomendas arquivadas e, com --reconstruir, recalcula a tabela inteira.
+
+Sem --reconstruir, sai com código 1 se encontrar divergências, para uso em
+verificações periódicas. A reconstrução substitui a tabela em uma única transação;
+escritas concorrentes em encomendas esperam por ela.
+
+Uso (a partir de src/):
+
+    python resumos.py
+    python resumos.py --reconstruir
+"""
+import argparse
+import json
+import sys
+
+import crud
+from database import SessionLocal
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reconstruir", action="store_true", help="recalcula clientes_resumos a partir de encomendas e de encomendas_arquivo")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        diferencas = crud.diferencas_resumos(db)
+        for diferenca in diferencas:
+            print(json.dumps(diferenca))
+        print(json.dumps({"divergencias": len(diferencas)}), file=sys.stderr)
+
+        if args.reconstruir:
+            crud.reconstroi_resumos(db)
+            restantes = crud.diferencas_resumos(db)
+            print(json.dumps({"reconstruido": True, "divergencias_restantes": len(restantes)}), file=sys.stderr)
+            return 1 if restantes else 0
+
+    return 1 if diferencas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
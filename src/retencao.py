@@ -0,0 +1,72 @@
+"""
+Compacta o histórico de encomendas_localizacoes das encomendas finalizadas. Cada
+política STATUS:DIAS:MINUTOS faz com que as encomendas no status, sem alterações há
+mais de DIAS dias, fiquem com a primeira e a última localização e com uma a cada
+MINUTOS minutos (0 mantém só a primeira e a última). Encomendas em status sem política,
+como as ainda em andamento, mantêm o histórico completo, e a localização atual de cada
+encomenda nunca é apagada.
+
+As políticas vêm de --politica, que pode ser repetida, ou de RETENCAO_POLITICAS,
+separadas por vírgula. Cada lote de até --lote encomendas é compactado em uma
+transação própria; a execução pode ser interrompida e repetida, já que compactar de
+novo um histórico já compactado não apaga nada. Cada lote é impresso como uma linha
+JSON e o total de localizações removidas sai em stderr.
+
+Uso (a partir de src/):
+
+    python retencao.py
+    python retencao.py --politica ENTREGUE:30:60 --politica CANCELADA:7:0 --lote 200 --pausa 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import crud
+from database import SessionLocal
+
+RETENCAO_POLITICAS = os.getenv("RETENCAO_POLITICAS", "ENTREGUE:7:60,CANCELADA:7:0")
+
+
+def politica(texto: str) -> tuple[str, int, int]:
+    try:
+        status, dias, minutos = texto.strip().split(":")
+        return status.upper(), int(dias), int(minutos)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Política inválida: {texto!r}; use STATUS:DIAS:MINUTOS")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--politica", type=politica, action="append", help="STATUS:DIAS:MINUTOS (padrão: RETENCAO_POLITICAS)")
+    parser.add_argument("--lote", type=int, default=500, help="encomendas compactadas por transação")
+    parser.add_argument("--pausa", type=float, default=0.0, help="segundos de espera entre os lotes")
+    parser.add_argument("--max-lotes", type=int, default=None, help="para depois desta quantidade de lotes")
+    args = parser.parse_args()
+
+    politicas = args.politica or [politica(texto) for texto in RETENCAO_POLITICAS.split(",") if texto.strip()]
+    politicas = {status: (dias, minutos) for status, dias, minutos in politicas}
+    total = {"lotes": 0, "encomendas": 0, "localizacoes_lidas": 0, "localizacoes_removidas": 0}
+    inicio = time.perf_counter()
+    depois_de = 0
+
+    with SessionLocal() as db:
+        while politicas and (args.max_lotes is None or total["lotes"] < args.max_lotes):
+            resultado = crud.compacta_localizacoes(db, politicas, args.lote, depois_de)
+            if resultado is None:
+                break
+            contagens, depois_de = resultado
+            total["lotes"] += 1
+            for chave, valor in contagens.items():
+                total[chave] += valor
+            print(json.dumps({"lote": total["lotes"], "ate_encomenda_id": depois_de, **contagens}))
+            if args.pausa:
+                time.sleep(args.pausa)
+
+    print(json.dumps({**total, "politicas": {status: {"dias": dias, "minutos": minutos} for status, (dias, minutos) in politicas.items()}, "segundos": round(time.perf_counter() - inicio, 1)}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,10 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 from schemas.cliente.ClienteStatus import ClienteStatus
 from schemas.encomenda.Encomenda import Encomenda
-import bcrypt
+import hashing
 
 class Cliente(BaseModel):
     cliente_id: int = Field(examples=[123], description="Id do cliente", title="Id do cliente")
@@ -26,12 +26,11 @@ class Cliente(BaseModel):
         title="Status do cliente"
     )
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
     @staticmethod
     def hash_pswd(password: str) -> str:
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        return hashing.hash_password(password)
     
     def check_password(self, password: str) -> bool:
-        return bcrypt.checkpw(Cliente.hash_pswd(password), self.hash_password)
\ No newline at end of file
+        return hashing.check_password(password, self.hash_password)
\ No newline at end of file
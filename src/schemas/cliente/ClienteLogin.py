@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class ClienteLogin(BaseModel):
+    cpf: str = Field(examples=["123.456.789-00"], description="CPF do cliente", title="CPF do cliente")
+    password: str = Field(examples=["123456"], description="Senha do cliente", title="Senha do cliente")
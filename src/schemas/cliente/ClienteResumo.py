@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from schemas.cliente.ClienteResumoStatus import ClienteResumoStatus
+
+class ClienteResumo(BaseModel):
+    cliente_id: int = Field(examples=[123], description="Id do cliente", title="Id do cliente")
+    total_encomendas: int = Field(examples=[5], description="Quantidade de encomendas do cliente", title="Total de encomendas")
+    valor_gasto: float = Field(examples=[420.0], description="Soma do valor das encomendas do cliente, exceto as canceladas", title="Valor gasto")
+    ultima_encomenda: Optional[datetime] = Field(default=None, examples=["2021-09-01T00:00:00"], description="Data da encomenda mais recente do cliente", title="Última encomenda")
+    por_status: dict[str, ClienteResumoStatus] = Field(description="Quantidade e valor das encomendas em cada status", title="Encomendas por status")
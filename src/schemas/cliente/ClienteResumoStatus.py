@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class ClienteResumoStatus(BaseModel):
+    quantidade: int = Field(examples=[3], description="Quantidade de encomendas no status", title="Quantidade de encomendas")
+    valor_total: float = Field(examples=[250.0], description="Soma do valor das encomendas no status", title="Valor total")
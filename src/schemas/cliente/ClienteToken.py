@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+
+class ClienteToken(BaseModel):
+    access_token: str = Field(description="Token de acesso assinado, enviado no header Authorization: Bearer", title="Token de acesso")
+    token_type: str = Field(default="bearer", examples=["bearer"], description="Tipo do token", title="Tipo do token")
+    expires_in: int = Field(examples=[3600], description="Validade do token em segundos", title="Validade do token")
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from schemas.encomenda.EncomendaStatus import EncomendaStatus
 from schemas.encomenda.EncomendaLocalizacao import EncomendaLocalizacao
@@ -17,5 +17,4 @@ class Encomenda(BaseModel):
 
     produtos: Optional[List[EncomendaHasProduto]] = []
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
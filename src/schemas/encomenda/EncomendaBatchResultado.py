@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class EncomendaBatchResultado(BaseModel):
+    indice: int = Field(examples=[0], description="Posição da encomenda no lote enviado", title="Posição no lote")
+    encomenda_id: Optional[int] = Field(default=None, examples=[1234], description="ID da encomenda criada, se a criação teve sucesso", title="ID da encomenda")
+    erro: Optional[str] = Field(default=None, examples=["Cliente com id 123 não encontrado."], description="Motivo da falha, se a encomenda não foi criada", title="Erro")
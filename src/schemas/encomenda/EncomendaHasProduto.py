@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 
 class EncomendaHasProduto(BaseModel):
@@ -7,5 +7,4 @@ class EncomendaHasProduto(BaseModel):
     produto_id: int = Field(examples=[123], description="ID do produto", title="ID do produto")
     quantidade: int = Field(examples=[10], description="Quantidade do produto", title="Quantidade do produto")
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
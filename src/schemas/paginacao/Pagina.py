@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+class Pagina(BaseModel, Generic[T]):
+    itens: list[T] = Field(description="Itens da página", title="Itens da página")
+    proximo_cursor: Optional[str] = Field(default=None, examples=["WzEwMF0"], description="Cursor para buscar a próxima página. Nulo quando não há mais itens", title="Próximo cursor")
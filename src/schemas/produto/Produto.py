@@ -1,5 +1,5 @@
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from schemas.produto.ProdutoIn import ProdutoIn
 from schemas.produto.ProdutoUpdate import ProdutoUpdate
@@ -12,6 +12,6 @@ class Produto(BaseModel):
     descricao: Optional[str] = Field(default=None, examples=["Refrigerante de cola"], description="Descrição do produto", title="Descrição do produto")
     ultima_atualizacao: Optional[datetime] = Field(default=None, examples=[datetime.now()], description="Data da última atualização do produto", title="Data da última atualização do produto")
     status: Optional[str] = Field(default="ATIVO", examples=["ATIVO"], description="Status do produto", title="Status do produto")
+    versao: int = Field(default=1, examples=[3], description="Versão do produto, incrementada a cada alteração", title="Versão do produto")
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
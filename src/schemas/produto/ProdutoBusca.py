@@ -0,0 +1,5 @@
+from pydantic import Field
+from schemas.produto.Produto import Produto
+
+class ProdutoBusca(Produto):
+    relevancia: float = Field(examples=[2.7], description="Relevância do produto para a busca; maior é mais relevante", title="Relevância do produto")
@@ -0,0 +1,31 @@
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+# Caminho rápido das listagens: o resultado é validado a partir dos objetos do ORM
+# e serializado direto para bytes pelo pydantic-core, sem o dict intermediário que o
+# response_model do FastAPI monta e depois passa ao encoder de JSON.
+
+@lru_cache(maxsize=None)
+def adapter(tipo: Any) -> TypeAdapter:
+    '''
+    TypeAdapter de um tipo de resposta. Montar o validador e o serializador é caro,
+    então cada tipo é compilado uma única vez por worker.
+    '''
+    return TypeAdapter(tipo)
+
+def dump_json(tipo: Any, valor: Any) -> bytes:
+    tipo_adapter = adapter(tipo)
+    return tipo_adapter.dump_json(tipo_adapter.validate_python(valor, from_attributes=True))
+
+def resposta(tipo: Any, valor: Any, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    '''
+    Resposta JSON de valor serializado como tipo. A rota continua declarando o mesmo
+    tipo em response_model, para a documentação. Os cabeçalhos já definidos em response
+    (como o ETag) são copiados, já que o FastAPI não os aplica a uma Response retornada
+    pela rota.
+    '''
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=dump_json(tipo, valor), status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+
+# database.py lê DATABASE_URL na importação, então o banco de teste é definido antes
+BANCO_DIR = tempfile.mkdtemp(prefix="testes-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(BANCO_DIR, 'app.db')}"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import busca
+import cache
+import models
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    '''
+    Banco próprio do teste. O cache do catálogo e o índice de busca são do worker, então
+    cada teste começa com os seus vazios, sem versões ou produtos de outro banco.
+    '''
+    monkeypatch.setattr(cache, "catalogo", cache.CatalogoCache())
+    monkeypatch.setattr(busca, "indice", busca.IndiceProdutos())
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as sessao:
+        yield sessao
+
+
+@pytest.fixture
+def semeia(db):
+    '''
+    Grava clientes e produtos ativos: semeia(clientes=[1, 2], produtos={1: 2.5}), com
+    os preços por id de produto.
+    '''
+    def semeia(clientes=(), produtos=None):
+        if clientes:
+            db.execute(insert(models.Cliente), [{"cliente_id": i, "nome": f"Cliente {i}"} for i in clientes])
+        if produtos:
+            db.execute(insert(models.Produto), [{"produto_id": i, "nome": f"Produto {i}", "preco": preco, "status": "ATIVO"} for i, preco in produtos.items()])
+        db.commit()
+    return semeia
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+import crud
+import models
+from schemas.encomenda.EncomendaIn import EncomendaIn
+from schemas.encomenda.EncomendaLocalizacao import EncomendaLocalizacao
+
+
+@pytest.fixture(autouse=True)
+def catalogo(semeia):
+    semeia(clientes=[1], produtos={1: 5, 2: 5})
+
+
+def nova_encomenda(db, status="PENDENTE", dias=0):
+    encomenda_id = crud.create_encomenda(db, EncomendaIn(cliente_id=1, produtos={"1": 1, "2": 2}, localizacaoAtual="Depósito")).encomenda_id
+    crud.update_localizacao_encomenda(db, EncomendaLocalizacao(encomenda_id=encomenda_id, localizacao="Em rota"))
+    crud.update_encomenda_status(db, encomenda_id, status)
+    db.execute(update(models.Encomenda).where(models.Encomenda.encomenda_id == encomenda_id).values(ultima_atualizacao=datetime.now() - timedelta(days=dias)))
+    db.commit()
+    return encomenda_id
+
+
+def conta(db, modelo):
+    return db.scalar(select(func.count()).select_from(modelo))
+
+
+def test_delete_encomenda_apaga_itens_e_localizacoes(db):
+    encomenda_id = nova_encomenda(db)
+
+    crud.delete_encomenda(db, encomenda_id)
+
+    assert conta(db, models.Encomenda) == conta(db, models.EncomendaProduto) == conta(db, models.EncomendaLocalizacao) == 0
+    assert crud.diferencas_resumos(db) == []
+
+
+def test_arquiva_em_lotes_apenas_as_finalizadas_antigas(db):
+    antigas = [nova_encomenda(db, "ENTREGUE", 200), nova_encomenda(db, "CANCELADA", 200), nova_encomenda(db, "ENTREGUE", 200)]
+    recente = nova_encomenda(db, "ENTREGUE", 1)
+    pendente = nova_encomenda(db, "PENDENTE", 200)
+    antes_de = datetime.now() - timedelta(days=180)
+
+    movidas, ultimo = crud.arquiva_encomendas(db, antes_de, lote=2)
+    assert movidas == {"encomendas": 2, "itens": 4, "localizacoes": 4}
+    assert ultimo == antigas[1]
+    movidas, ultimo = crud.arquiva_encomendas(db, antes_de, lote=2, depois_de=ultimo)
+    assert movidas["encomendas"] == 1 and ultimo == antigas[2]
+    assert crud.arquiva_encomendas(db, antes_de, lote=2, depois_de=ultimo) is None
+
+    assert set(db.scalars(select(models.Encomenda.encomenda_id))) == {recente, pendente}
+    assert set(db.scalars(select(models.EncomendaArquivo.encomenda_id))) == set(antigas)
+    assert conta(db, models.EncomendaLocalizacaoArquivo) == 6
+    assert set(db.scalars(select(models.EncomendaLocalizacao.encomenda_id))) == {recente, pendente}
+    assert crud.diferencas_resumos(db) == []
+
+
+def test_resumo_continua_contando_as_arquivadas(db):
+    nova_encomenda(db, "ENTREGUE", 200)
+    nova_encomenda(db, "CANCELADA", 200)
+    recente = nova_encomenda(db, "ENTREGUE", 1)
+    antes = crud.get_cliente_resumo(db, 1)
+
+    crud.arquiva_encomendas(db, datetime.now() - timedelta(days=180))
+
+    depois = crud.get_cliente_resumo(db, 1)
+    assert depois["total_encomendas"] == antes["total_encomendas"] == 3
+    assert depois["valor_gasto"] == antes["valor_gasto"] == 30
+    assert depois["por_status"] == antes["por_status"]
+    assert set(db.scalars(select(models.Encomenda.encomenda_id))) == {recente}
+
+    # A reconstrução soma as encomendas e as arquivadas
+    crud.reconstroi_resumos(db)
+    assert crud.get_cliente_resumo(db, 1)["por_status"] == antes["por_status"]
+    assert crud.diferencas_resumos(db) == []
+
+
+def data_criacao(db, encomenda_id):
+    return db.scalar(select(models.Encomenda.data_criacao).where(models.Encomenda.encomenda_id == encomenda_id))
+
+
+def test_ultima_encomenda_com_todas_arquivadas(db):
+    nova_encomenda(db, "CANCELADA", 200)
+    ultima = nova_encomenda(db, "ENTREGUE", 200)
+    criada = data_criacao(db, ultima)
+
+    crud.arquiva_encomendas(db, datetime.now() - timedelta(days=180))
+
+    resumo = crud.get_cliente_resumo(db, 1)
+    assert conta(db, models.Encomenda) == 0
+    assert resumo["total_encomendas"] == 2
+    assert resumo["ultima_encomenda"] == criada
+
+
+def test_ultima_encomenda_arquivada_mais_recente_que_uma_ativa(db):
+    nova_encomenda(db, "PENDENTE", 200)
+    ultima = nova_encomenda(db, "ENTREGUE", 200)
+    criada = data_criacao(db, ultima)
+
+    crud.arquiva_encomendas(db, datetime.now() - timedelta(days=180))
+
+    assert crud.get_cliente_resumo(db, 1)["ultima_encomenda"] == criada
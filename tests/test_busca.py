@@ -0,0 +1,84 @@
+import pytest
+
+import busca
+import crud
+from schemas.produto.ProdutoIn import ProdutoIn
+from schemas.produto.ProdutoUpdate import ProdutoUpdate
+
+PRODUTOS = [
+    (1, "Coca-Cola Zero", "Refrigerante de cola sem açúcar", "ATIVO", 1),
+    (2, "Pepsi", "Refrigerante de cola", "ATIVO", 1),
+    (3, "Guaraná Antártica", "Refrigerante de guaraná", "ATIVO", 1),
+    (4, "Cola branca", "Cola escolar", "INATIVO", 1),
+]
+
+
+@pytest.fixture
+def indice():
+    indice = busca.IndiceProdutos()
+    indice.sincroniza(1, lambda desde: [PRODUTOS])
+    return indice
+
+
+def ids(resultado):
+    return [produto_id for produto_id, _ in resultado]
+
+
+def test_tokeniza_sem_acentos():
+    assert busca.tokeniza("Guaraná Antártica 2L") == ["guarana", "antartica", "2l"]
+
+
+def test_termo_no_nome_vale_mais(indice):
+    # "cola" está no nome da Coca-Cola e só na descrição da Pepsi; a Cola branca está inativa
+    assert ids(indice.busca("cola")) == [1, 2]
+
+
+def test_todos_os_termos_precisam_aparecer(indice):
+    assert ids(indice.busca("refrigerante guarana")) == [3]
+    assert indice.busca("refrigerante laranja") == []
+
+
+def test_ultimo_termo_como_prefixo(indice):
+    assert set(ids(indice.busca("refri"))) == {1, 2, 3}
+    assert ids(indice.busca("refrigerante guar")) == [3]
+
+
+def test_um_erro_de_digitacao(indice):
+    assert ids(indice.busca("guarnaa")) == [3]
+    assert ids(indice.busca("pepsu")) == [2]
+    assert indice.busca("pxpsu") == []
+
+
+def test_sincronizacao_incremental(indice):
+    versoes = []
+
+    def carrega(desde):
+        versoes.append(desde)
+        return [[(2, "Pepsi Black", "Refrigerante", "ATIVO", 2), (1, "Coca-Cola Zero", "Refrigerante", "INATIVO", 2)]]
+
+    indice.sincroniza(2, carrega)
+    indice.sincroniza(2, carrega)
+
+    assert versoes == [1]
+    assert ids(indice.busca("black")) == [2]
+    assert indice.busca("cola") == []
+    # Linhas mais antigas que a já aplicada ao produto são ignoradas
+    indice.sincroniza(3, lambda desde: [[(2, "Pepsi", "Refrigerante", "ATIVO", 1)]])
+    assert ids(indice.busca("black")) == [2]
+
+
+def test_busca_acompanha_as_escritas(db):
+    laranja = crud.create_produto(db, ProdutoIn(nome="Suco de laranja", preco=8, descricao="Integral"))
+    assert [produto["produto_id"] for produto in crud.busca_produtos(db, "laranja")] == [laranja.produto_id]
+
+    uva = crud.create_produto(db, ProdutoIn(nome="Suco de uva", preco=9, descricao="Integral"))
+    assert uva.versao_catalogo == crud._get_catalogo_versao(db)
+    assert {produto["produto_id"] for produto in crud.busca_produtos(db, "suco integral")} == {laranja.produto_id, uva.produto_id}
+
+    crud.update_produto(db, uva.produto_id, ProdutoUpdate(nome="Néctar de uva"))
+    crud.delete_produto(db, laranja.produto_id)
+    resultado = crud.busca_produtos(db, "suco")
+    assert resultado == []
+    resultado = crud.busca_produtos(db, "nectar")
+    assert [produto["produto_id"] for produto in resultado] == [uva.produto_id]
+    assert resultado[0]["relevancia"] > 0
@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+
+import compressao
+
+
+def executa(app, accept_encoding):
+    mensagens = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        mensagens.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode("latin-1"))]}
+    asyncio.run(compressao.CompressaoMiddleware(app, minimum_size=100)(scope, receive, send))
+    inicio, *corpos = mensagens
+    return dict((nome.decode("latin-1"), valor.decode("latin-1")) for nome, valor in inicio["headers"]), b"".join(m["body"] for m in corpos)
+
+
+def resposta(corpos, content_type="application/json"):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type.encode("latin-1"))]
+        if len(corpos) == 1:
+            headers.append((b"content-length", str(len(corpos[0])).encode("latin-1")))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, corpo in enumerate(corpos):
+            await send({"type": "http.response.body", "body": corpo, "more_body": i < len(corpos) - 1})
+    return app
+
+
+def test_escolhe_codificacao():
+    assert compressao.escolhe_codificacao("gzip, deflate") == "gzip"
+    assert compressao.escolhe_codificacao("gzip;q=0, identity") is None
+    assert compressao.escolhe_codificacao("") is None
+    esperado = "br" if compressao.brotli is not None else "gzip"
+    assert compressao.escolhe_codificacao("gzip, br") == esperado
+
+
+def test_comprime_a_partir_do_minimo():
+    corpo = b'{"itens":[' + b",".join(b'{"encomenda_id":%d}' % i for i in range(50)) + b"]}"
+    headers, recebido = executa(resposta([corpo]), "gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["content-length"] == str(len(recebido))
+    assert "Accept-Encoding" in headers["vary"]
+    assert gzip.decompress(recebido) == corpo
+
+
+def test_respostas_pequenas_nao_sao_comprimidas():
+    headers, recebido = executa(resposta([b'{"message":"Hello World"}']), "gzip")
+
+    assert "content-encoding" not in headers
+    assert recebido == b'{"message":"Hello World"}'
+
+
+def test_streaming_comprimido_bloco_a_bloco():
+    blocos = [b'{"localizacao":"Ponto %d"}\n' % i for i in range(20)]
+    headers, recebido = executa(resposta(blocos, "application/x-ndjson"), "gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    assert gzip.decompress(recebido) == b"".join(blocos)
+
+
+def test_eventos_nao_sao_comprimidos():
+    blocos = [b"event: status\ndata: {}\n\n"] * 10
+    headers, recebido = executa(resposta(blocos, "text/event-stream"), "gzip")
+
+    assert "content-encoding" not in headers
+    assert recebido == b"".join(blocos)
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import condicional
+
+ULTIMA = datetime(2026, 10, 18, 12, 30, 15, 250000)
+
+
+def test_etag_muda_com_a_versao():
+    assert condicional.etag("produto", 1, 1) == condicional.etag("produto", 1, 1)
+    assert condicional.etag("produto", 1, 1) != condicional.etag("produto", 1, 2)
+    assert condicional.etag("produto", 1, 1).startswith('W/"')
+
+
+def test_if_none_match_compara_de_forma_fraca():
+    etag = condicional.etag("produto", 1, 1)
+    opaco = etag[2:]
+    assert condicional.nao_modificado({"if-none-match": etag}, etag)
+    assert condicional.nao_modificado({"if-none-match": f'"outro", {opaco}'}, etag)
+    assert condicional.nao_modificado({"if-none-match": "*"}, etag)
+    assert not condicional.nao_modificado({"if-none-match": '"outro"'}, etag)
+
+
+def test_if_none_match_tem_precedencia_sobre_if_modified_since():
+    etag = condicional.etag("produto", 1, 2)
+    headers = {
+        "if-none-match": condicional.etag("produto", 1, 1),
+        "if-modified-since": condicional.cabecalhos(etag, ULTIMA)["Last-Modified"],
+    }
+    assert not condicional.nao_modificado(headers, etag, ULTIMA)
+
+
+def test_if_modified_since_na_resolucao_de_segundos():
+    etag = condicional.etag("produto", 1, 1)
+    last_modified = condicional.cabecalhos(etag, ULTIMA)["Last-Modified"]
+
+    assert condicional.nao_modificado({"if-modified-since": last_modified}, etag, ULTIMA)
+    assert not condicional.nao_modificado({"if-modified-since": last_modified}, etag, ULTIMA + timedelta(seconds=1))
+    assert not condicional.nao_modificado({"if-modified-since": last_modified}, etag, None)
+    assert not condicional.nao_modificado({"if-modified-since": "ontem"}, etag, ULTIMA)
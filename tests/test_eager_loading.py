@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, insert
+
+import crud
+import models
+
+ENCOMENDAS = 150
+
+
+@pytest.fixture(autouse=True)
+def encomendas(db, semeia):
+    semeia(clientes=[1, 2], produtos={i: i for i in range(1, 4)})
+    db.execute(insert(models.Encomenda), [
+        {"encomenda_id": i, "cliente_id": 1 + i % 2, "valor_total": 6, "localizacao_atual_id": i}
+        for i in range(1, ENCOMENDAS + 1)
+    ])
+    db.execute(insert(models.EncomendaProduto), [
+        {"encomenda_id": i, "produto_id": produto_id, "quantidade": 1}
+        for i in range(1, ENCOMENDAS + 1)
+        for produto_id in range(1, 4)
+    ])
+    db.execute(insert(models.EncomendaLocalizacao), [
+        {"localizacao_id": i, "encomenda_id": i, "localizacao": f"Ponto {i}"}
+        for i in range(1, ENCOMENDAS + 1)
+    ])
+    db.commit()
+
+
+@contextmanager
+def conta_consultas(engine):
+    consultas = []
+
+    def registra(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", registra)
+    try:
+        yield consultas
+    finally:
+        event.remove(engine, "before_cursor_execute", registra)
+
+
+def carrega_relacoes(encomendas):
+    # O que o schema Encomenda serializa; não pode disparar consultas extras
+    for encomenda in encomendas:
+        encomenda.localizacao_atual.localizacao
+        [produto.quantidade for produto in encomenda.produtos]
+
+
+@pytest.mark.parametrize("limit", [1, 10, 100])
+def test_get_encomendas_consultas_constantes(engine, db, limit):
+    db.expunge_all()
+    with conta_consultas(engine) as consultas:
+        encomendas = crud.get_encomendas(db, None, limit)
+        carrega_relacoes(encomendas)
+
+    assert len(encomendas) == limit + 1
+    # Encomendas com a localização atual em JOIN e os produtos em um SELECT ... IN
+    assert len(consultas) == 2
+
+
+@pytest.mark.parametrize("limit", [1, 10, 100])
+def test_get_encomendas_by_status_consultas_constantes(engine, db, limit):
+    db.expunge_all()
+    with conta_consultas(engine) as consultas:
+        encomendas = crud.get_encomendas_by_status(db, "PENDENTE", None, limit)
+        carrega_relacoes(encomendas)
+
+    assert len(encomendas) == limit + 1
+    assert len(consultas) == 2
+
+
+def test_get_encomenda_consultas_constantes(engine, db):
+    db.expunge_all()
+    with conta_consultas(engine) as consultas:
+        carrega_relacoes([crud.get_encomenda(db, 7)])
+
+    assert len(consultas) == 2
+
+
+def test_get_cliente_encomendas_consultas_constantes(engine, db):
+    db.expunge_all()
+    with conta_consultas(engine) as consultas:
+        encomendas = crud.get_cliente_encomendas(db, 1)
+        carrega_relacoes(encomendas)
+
+    assert len(encomendas) == ENCOMENDAS // 2
+    assert len(consultas) == 2
@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+import exportacao
+import models
+
+
+@pytest.fixture(autouse=True)
+def encomendas(db, semeia):
+    semeia(clientes=[1], produtos={1: 2.5})
+    db.execute(insert(models.Encomenda), [
+        {"encomenda_id": i, "cliente_id": 1, "valor_total": 2.5 * i, "status": "ENTREGUE" if i % 2 else "PENDENTE", "data_criacao": datetime(2026, 1, i)}
+        for i in range(1, 11)
+    ])
+    db.execute(insert(models.EncomendaProduto), [{"encomenda_id": i, "produto_id": 1, "quantidade": i} for i in range(1, 11)])
+    db.commit()
+
+
+def exporta_csv(db, tabela, **filtros):
+    destino = io.BytesIO()
+    linhas = exportacao.exporta(destino, tabela, "csv", chunk_size=3, db=db, **filtros)
+    return linhas, list(csv.reader(io.StringIO(destino.getvalue().decode("utf-8"))))
+
+
+def test_csv_em_blocos(db):
+    linhas, conteudo = exporta_csv(db, "encomendas")
+
+    assert linhas == 10
+    cabecalho, *registros = conteudo
+    assert cabecalho[0] == "encomenda_id"
+    assert [int(registro[0]) for registro in registros] == list(range(1, 11))
+
+
+def test_filtros_de_data_e_status(db):
+    linhas, _ = exporta_csv(db, "encomendas", desde=datetime(2026, 1, 3), ate=datetime(2026, 1, 7))
+    assert linhas == 4
+
+    # Os itens são filtrados pela encomenda
+    linhas, conteudo = exporta_csv(db, "encomendas_produtos", status="ENTREGUE", desde=datetime(2026, 1, 4))
+    assert linhas == 3
+    assert [int(registro[0]) for registro in conteudo[1:]] == [5, 7, 9]
+
+
+def test_tabela_vazia_tem_cabecalho(db):
+    linhas, conteudo = exporta_csv(db, "encomendas_localizacoes")
+
+    assert linhas == 0
+    assert conteudo == [["localizacao_id", "encomenda_id", "localizacao", "data"]]
+
+
+def test_parquet(db):
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    destino = io.BytesIO()
+    exportacao.exporta(destino, "encomendas", "parquet", status="PENDENTE", chunk_size=2, db=db)
+    tabela = parquet.read_table(io.BytesIO(destino.getvalue()))
+
+    assert tabela.num_rows == 5
+    assert tabela.column("encomenda_id").to_pylist() == [2, 4, 6, 8, 10]
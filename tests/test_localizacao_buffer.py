@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError
+
+import crud
+import localizacao_buffer
+import models
+import pubsub
+
+
+class SessaoFalsa:
+    '''
+    Sessão assíncrona que falha enquanto o banco estiver fora e, depois, roda as funções
+    na sessão síncrona do teste, como o run_sync da AsyncSession.
+    '''
+    def __init__(self, db):
+        self.db = db
+        self.fora = True
+        self.recusadas = set()
+        self.lotes = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        if self.fora:
+            raise ConnectionError("banco indisponível")
+        return self
+
+    async def __aexit__(self, *erro):
+        return False
+
+    async def run_sync(self, funcao, lote):
+        self.lotes.append(list(lote))
+        if any(localizacao in self.recusadas for _, localizacao, _ in lote):
+            raise DataError("INSERT INTO encomendas_localizacoes", {}, Exception("Data too long for column 'localizacao'"))
+        return funcao(self.db, lote)
+
+
+@pytest.fixture
+def sessao(db, semeia, monkeypatch):
+    semeia(clientes=[1])
+    db.execute(insert(models.Encomenda), [{"encomenda_id": i, "cliente_id": 1, "valor_total": 1} for i in range(1, 6)])
+    db.commit()
+
+    sessao = SessaoFalsa(db)
+    monkeypatch.setattr(localizacao_buffer, "AsyncSessionLocal", sessao)
+    monkeypatch.setattr(pubsub, "hub", pubsub.EncomendaHub(pubsub.InProcessBackend()))
+    return sessao
+
+
+@pytest.fixture
+def publicadas(sessao, monkeypatch):
+    publicadas = []
+
+    async def publish_localizacao(encomenda_id, localizacao, data):
+        publicadas.append((encomenda_id, localizacao))
+
+    monkeypatch.setattr(pubsub.hub, "publish_localizacao", publish_localizacao)
+    return publicadas
+
+
+def test_falha_no_banco_mantem_as_localizacoes(sessao):
+    buffer = localizacao_buffer.LocalizacaoBuffer(max_size=10, batch_size=2)
+    for i in range(1, 6):
+        buffer.put(i, f"Ponto {i}")
+
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 5
+    assert buffer.falhas == 1 and buffer.descartadas == 0
+
+    sessao.fora = False
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 0
+    assert [encomenda_id for lote in sessao.lotes for encomenda_id, _, _ in lote] == [1, 2, 3, 4, 5]
+    assert buffer.gravadas == 5 and buffer.descartadas == 0
+
+
+def test_fila_cheia_recusa_enquanto_o_banco_esta_fora(sessao):
+    buffer = localizacao_buffer.LocalizacaoBuffer(max_size=3, batch_size=2)
+    for i in range(1, 4):
+        buffer.put(i, f"Ponto {i}")
+
+    asyncio.run(buffer.flush())
+    with pytest.raises(localizacao_buffer.BufferCheio):
+        buffer.put(4, "Ponto 4")
+    assert len(buffer) == 3 and buffer.descartadas == 0
+
+
+def test_publica_apenas_as_gravadas(db, sessao, publicadas):
+    sessao.fora = False
+    buffer = localizacao_buffer.LocalizacaoBuffer()
+    buffer.put(1, "Depósito")
+    buffer.put(999, "Em rota")
+
+    asyncio.run(buffer.flush())
+
+    assert publicadas == [(1, "Depósito")]
+    assert buffer.gravadas == 1 and buffer.descartadas == 1
+    assert list(db.scalars(select(models.EncomendaLocalizacao.encomenda_id))) == [1]
+    assert crud.flush_localizacoes(db, [(999, "Em rota", None)]) == []
+
+
+def test_localizacao_recusada_nao_para_a_fila(sessao, publicadas):
+    sessao.fora = False
+    sessao.recusadas = {"x" * 300}
+    buffer = localizacao_buffer.LocalizacaoBuffer(batch_size=10, tentativas=2)
+    for i in range(1, 6):
+        buffer.put(i, "x" * 300 if i == 3 else f"Ponto {i}")
+
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 5 and publicadas == []
+
+    # Na segunda falha seguida, o lote é dividido e só a localização recusada é descartada
+    asyncio.run(buffer.flush())
+    assert len(buffer) == 0
+    assert publicadas == [(i, f"Ponto {i}") for i in (1, 2, 4, 5)]
+    assert buffer.gravadas == 4 and buffer.invalidas == 1 and buffer.descartadas == 1
+
+    buffer.put(1, "Ponto 6")
+    asyncio.run(buffer.flush())
+    assert buffer.gravadas == 5 and buffer.falhas == 2
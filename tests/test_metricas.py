@@ -0,0 +1,130 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import metricas
+
+
+def executa(app, registro, metodo="GET"):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": metodo, "path": "/produtos/1", "headers": []}
+    asyncio.run(metricas.MetricasMiddleware(app, registro)(scope, receive, send))
+
+
+def rota(caminho, consultas=0, status=200, engine=None):
+    async def app(scope, receive, send):
+        # O roteador do FastAPI deixa a rota no scope
+        scope["route"] = SimpleNamespace(path=caminho)
+        if engine is not None:
+            with engine.connect() as conn:
+                for _ in range(consultas):
+                    conn.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+    return app
+
+
+def serie(estado, tipo, chave):
+    return dict((tuple(k), v) for k, v in estado[tipo])[chave]
+
+
+def test_registra_por_modelo_da_rota():
+    registro = metricas.Metricas()
+    executa(rota("/produtos/{produto_id}"), registro)
+    executa(rota("/produtos/{produto_id}", status=404), registro)
+
+    estado = registro.estado()
+    assert sum(serie(estado, "latencias", ("GET", "/produtos/{produto_id}", "200"))["buckets"]) == 1
+    assert sum(serie(estado, "latencias", ("GET", "/produtos/{produto_id}", "404"))["buckets"]) == 1
+
+
+def test_conta_consultas_e_orcamento():
+    engine = create_engine("sqlite://")
+    metricas.instrumenta(engine)
+    registro = metricas.Metricas(orcamento_consultas=3)
+
+    executa(rota("/encomendas/", consultas=2, engine=engine), registro)
+    executa(rota("/encomendas/", consultas=5, engine=engine), registro)
+    # Fora de uma requisição as consultas não são contadas
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    banco = serie(registro.estado(), "consultas", ("GET", "/encomendas/"))
+    assert banco["soma"] == 7
+    assert banco["acima_orcamento"] == 1
+    assert banco["tempo_db"] > 0
+
+
+def test_consulta_com_erro_sai_da_pilha():
+    engine = create_engine("sqlite://")
+    metricas.instrumenta(engine)
+    inicios = []
+
+    async def app(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/encomendas/")
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM nao_existe"))
+            conn.execute(text("SELECT 1"))
+            inicios.append(list(conn.info.get("metricas_inicio", [])))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    registro = metricas.Metricas()
+    executa(app, registro)
+
+    assert inicios == [[]]
+    assert serie(registro.estado(), "consultas", ("GET", "/encomendas/"))["soma"] == 2
+
+
+def test_streaming_registra_o_tempo_ate_a_resposta():
+    async def app(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/encomendas/{encomenda_id}/eventos")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            await send({"type": "http.response.body", "body": b"event: ping\n\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    registro = metricas.Metricas()
+    executa(app, registro)
+
+    latencia = serie(registro.estado(), "latencias", ("GET", "/encomendas/{encomenda_id}/eventos", "200"))
+    assert sum(latencia["buckets"]) == 1
+    assert latencia["soma"] < 0.1
+
+
+def test_agrega_workers(tmp_path):
+    a, b = metricas.Metricas(), metricas.Metricas()
+    a.registra("GET", "/produtos/", 200, 0.02, 1, 0.001)
+    b.registra("GET", "/produtos/", 200, 0.3, 2, 0.002)
+    b.registra("POST", "/encomendas/", 201, 0.04, 6, 0.01)
+
+    estado = metricas.agrega([a.estado(), b.estado()])
+    latencia = serie(estado, "latencias", ("GET", "/produtos/", "200"))
+    assert sum(latencia["buckets"]) == 2
+    assert abs(latencia["soma"] - 0.32) < 1e-9
+
+    a.diretorio = str(tmp_path)
+    a.salva(str(tmp_path))
+    assert serie(a.coleta(), "consultas", ("GET", "/produtos/"))["soma"] == 1
+
+
+def test_formato_prometheus():
+    registro = metricas.Metricas()
+    registro.registra("GET", '/produtos/{produto_id}', 200, 0.02, 3, 0.004)
+    texto = metricas.formata_prometheus(registro.estado())
+
+    assert "# TYPE http_request_duration_seconds histogram" in texto
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/produtos/{produto_id}",status="200",le="0.01"} 0' in texto
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/produtos/{produto_id}",status="200",le="+Inf"} 1' in texto
+    assert 'db_queries_per_request_bucket{method="GET",route="/produtos/{produto_id}",le="5"} 1' in texto
+    assert 'http_requests_over_query_budget_total{method="GET",route="/produtos/{produto_id}"} 0' in texto
@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import database
+
+
+def replicas(tmp_path, *pesos):
+    return database.Replicas([database.Replica(f"sqlite:///{tmp_path / f'replica{i}.db'}", peso) for i, peso in enumerate(pesos)])
+
+
+def test_round_robin_ponderado(tmp_path):
+    conjunto = replicas(tmp_path, 3, 1)
+    a, b = conjunto.replicas
+
+    escolhidas = [conjunto.escolhe() for _ in range(8)]
+    assert escolhidas[:4] == [a, a, b, a]
+    assert escolhidas.count(a) == 6 and escolhidas.count(b) == 2
+
+
+def test_replica_com_falha_sai_do_rodizio(tmp_path):
+    conjunto = replicas(tmp_path, 1, 1)
+    a, b = conjunto.replicas
+
+    conjunto.marca_falha(a, Exception("conexão recusada"))
+    assert {conjunto.escolhe() for _ in range(4)} == {b}
+    conjunto.marca_falha(b, Exception("conexão recusada"))
+    assert conjunto.escolhe() is None
+
+
+def test_verificacao(tmp_path):
+    conjunto = database.Replicas([
+        database.Replica(f"sqlite:///{tmp_path / 'replica.db'}"),
+        database.Replica(f"sqlite:///{tmp_path / 'nao-existe' / 'replica.db'}"),
+    ])
+    asyncio.run(conjunto.verifica())
+
+    saudavel, fora = conjunto.replicas
+    assert saudavel.saudavel and saudavel.erro is None
+    assert not fora.saudavel and fora.erro
+
+
+def requisicao(valor):
+    return SimpleNamespace(cookies={database.COOKIE_PRIMARIO: valor})
+
+
+def test_cookie_de_leitura_no_primario():
+    assert database.le_do_primario(requisicao(str(database.time.time() + 5)))
+    assert not database.le_do_primario(requisicao(str(database.time.time() - 1)))
+    assert not database.le_do_primario(requisicao("x"))
+    assert not database.le_do_primario(SimpleNamespace(cookies={}))
+
+
+def test_fabrica_de_sessoes_de_leitura(tmp_path, monkeypatch):
+    conjunto = replicas(tmp_path, 1)
+    monkeypatch.setattr(database, "replicas", conjunto)
+    replica, = conjunto.replicas
+
+    # A mesma fábrica serve a sessão da rota e as sessões próprias das respostas em streaming
+    assert database.get_sessoes_leitura(SimpleNamespace(cookies={})) is replica.sessoes
+    assert database.get_sessoes_leitura(requisicao(str(database.time.time() + 5))) is database.AsyncSessionLocal
+    assert conjunto.leituras_primario == 1
+
+
+def executa(metodo, status):
+    mensagens = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        mensagens.append(message)
+
+    asyncio.run(database.PrimarioAposEscritaMiddleware(app, janela=5)({"type": "http", "method": metodo}, None, send))
+    return [valor.decode("latin-1") for nome, valor in mensagens[0]["headers"] if nome == b"set-cookie"]
+
+
+def test_escrita_marca_o_cliente(tmp_path, monkeypatch):
+    assert executa("POST", 201) == []
+
+    monkeypatch.setattr(database, "replicas", replicas(tmp_path, 1))
+    cookie, = executa("POST", 201)
+    assert cookie.startswith(f"{database.COOKIE_PRIMARIO}=") and "Max-Age=5" in cookie
+    assert executa("PUT", 404) == []
+    assert executa("GET", 200) == []
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import update
+
+import crud
+import models
+from schemas.encomenda.EncomendaIn import EncomendaIn
+from schemas.encomenda.EncomendaUpdate import EncomendaUpdate
+
+
+@pytest.fixture(autouse=True)
+def catalogo(semeia):
+    semeia(clientes=[1, 2], produtos={1: 1, 2: 2})
+
+
+def nova_encomenda(db, cliente_id, produtos):
+    return crud.create_encomenda(db, EncomendaIn(cliente_id=cliente_id, produtos=produtos, localizacaoAtual="Depósito")).encomenda_id
+
+
+def test_resumo_acompanha_as_escritas(db):
+    primeira = nova_encomenda(db, 1, {"1": 2})
+    segunda = nova_encomenda(db, 1, {"2": 1})
+    terceira = nova_encomenda(db, 1, {"1": 1, "2": 1})
+
+    crud.update_encomenda_status(db, primeira, "ENTREGUE")
+    crud.update_encomenda_status(db, terceira, "CANCELADA")
+    crud.update_encomenda(db, segunda, EncomendaUpdate(clienteId=2, produtos={"2": 3}))
+    crud.create_encomendas_batch(db, [EncomendaIn(cliente_id=2, produtos={"1": 1}, localizacaoAtual="Depósito")])
+
+    resumo = crud.get_cliente_resumo(db, 1)
+    assert resumo["total_encomendas"] == 2
+    assert resumo["valor_gasto"] == 2
+    assert resumo["por_status"]["ENTREGUE"]["quantidade"] == 1
+    assert resumo["por_status"]["CANCELADA"]["valor_total"] == 3
+    assert resumo["ultima_encomenda"] is not None
+
+    resumo = crud.get_cliente_resumo(db, 2)
+    assert resumo["por_status"]["PENDENTE"] == {"quantidade": 2, "valor_total": 7}
+
+    crud.delete_encomenda(db, segunda)
+    assert crud.get_cliente_resumo(db, 2)["valor_gasto"] == 1
+
+    assert crud.diferencas_resumos(db) == []
+
+
+def test_resumo_de_cliente_inexistente(db):
+    with pytest.raises(ValueError):
+        crud.get_cliente_resumo(db, 999)
+
+
+def test_reconstrucao_corrige_divergencias(db):
+    nova_encomenda(db, 1, {"1": 1})
+    db.execute(update(models.ResumoCliente).values(quantidade=models.ResumoCliente.quantidade + 5))
+    db.commit()
+
+    assert crud.diferencas_resumos(db)
+
+    crud.reconstroi_resumos(db)
+    assert crud.diferencas_resumos(db) == []
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, update
+
+import crud
+import models
+
+POLITICAS = {"ENTREGUE": (7, 5), "CANCELADA": (7, 0)}
+
+
+@pytest.fixture(autouse=True)
+def clientes(semeia):
+    semeia(clientes=[1])
+
+
+def encomenda_com_historico(db, encomenda_id, status, pings=10, dias=30):
+    inicio = datetime.now() - timedelta(days=dias)
+    db.execute(insert(models.Encomenda), [{"encomenda_id": encomenda_id, "cliente_id": 1, "valor_total": 1, "status": status}])
+    db.execute(insert(models.EncomendaLocalizacao), [
+        {"encomenda_id": encomenda_id, "localizacao": f"Ponto {i}", "data": inicio + timedelta(minutes=i)}
+        for i in range(pings)
+    ])
+    db.execute(
+        update(models.Encomenda).where(models.Encomenda.encomenda_id == encomenda_id)
+        .values(localizacao_atual_id=crud._localizacao_mais_recente(), ultima_atualizacao=inicio + timedelta(minutes=pings))
+    )
+    db.commit()
+
+
+def pontos(db, encomenda_id):
+    return list(db.scalars(
+        select(models.EncomendaLocalizacao.localizacao)
+        .where(models.EncomendaLocalizacao.encomenda_id == encomenda_id)
+        .order_by(models.EncomendaLocalizacao.data)
+    ))
+
+
+def test_compacta_apenas_as_finalizadas(db):
+    encomenda_com_historico(db, 1, "ENTREGUE")
+    encomenda_com_historico(db, 2, "CANCELADA")
+    encomenda_com_historico(db, 3, "PENDENTE")
+    encomenda_com_historico(db, 4, "ENTREGUE", dias=1)
+
+    contagens, ultimo = crud.compacta_localizacoes(db, POLITICAS, lote=10)
+
+    assert contagens == {"encomendas": 2, "localizacoes_lidas": 20, "localizacoes_removidas": 7 + 8}
+    assert ultimo == 2
+    assert pontos(db, 1) == ["Ponto 0", "Ponto 5", "Ponto 9"]
+    assert pontos(db, 2) == ["Ponto 0", "Ponto 9"]
+    assert len(pontos(db, 3)) == len(pontos(db, 4)) == 10
+
+    # A localização atual continua válida e uma nova compactação não apaga nada
+    atual = db.scalar(select(models.EncomendaLocalizacao.localizacao).join(models.Encomenda, models.Encomenda.localizacao_atual_id == models.EncomendaLocalizacao.localizacao_id).where(models.Encomenda.encomenda_id == 1))
+    assert atual == "Ponto 9"
+    contagens, _ = crud.compacta_localizacoes(db, POLITICAS, lote=10)
+    assert contagens["localizacoes_removidas"] == 0
+
+
+def test_lotes_pelo_id(db):
+    for encomenda_id in (1, 2, 3):
+        encomenda_com_historico(db, encomenda_id, "CANCELADA", pings=3)
+
+    _, ultimo = crud.compacta_localizacoes(db, POLITICAS, lote=2)
+    assert ultimo == 2
+    contagens, ultimo = crud.compacta_localizacoes(db, POLITICAS, lote=2, depois_de=ultimo)
+    assert contagens == {"encomendas": 1, "localizacoes_lidas": 3, "localizacoes_removidas": 1}
+    assert crud.compacta_localizacoes(db, POLITICAS, lote=2, depois_de=ultimo) is None
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, select
+
+import crud
+import models
+from schemas.encomenda.EncomendaIn import EncomendaIn
+from schemas.encomenda.EncomendaUpdate import EncomendaUpdate
+
+PRODUTOS = range(1, 51)
+
+
+@pytest.fixture(autouse=True)
+def catalogo(semeia):
+    semeia(clientes=[1], produtos={i: 2 for i in PRODUTOS})
+
+
+@contextmanager
+def conta_escritas(engine):
+    escritas = []
+
+    def registra(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            escritas.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", registra)
+    try:
+        yield escritas
+    finally:
+        event.remove(engine, "before_cursor_execute", registra)
+
+
+def itens(db, encomenda_id):
+    return dict(db.execute(
+        select(models.EncomendaProduto.produto_id, models.EncomendaProduto.quantidade).where(models.EncomendaProduto.encomenda_id == encomenda_id)
+    ).all())
+
+
+def test_altera_apenas_as_linhas_modificadas(engine, db):
+    quantidades = {str(produto_id): 1 for produto_id in PRODUTOS}
+    encomenda = crud.create_encomenda(db, EncomendaIn(cliente_id=1, produtos=quantidades, localizacaoAtual="Depósito"))
+    versao = encomenda.versao
+
+    with conta_escritas(engine) as escritas:
+        atualizada = crud.update_encomenda(db, encomenda.encomenda_id, EncomendaUpdate(produtos={**quantidades, "1": 4}))
+
+    # Um único UPDATE nos itens, em vez de apagar e reinserir as 50 linhas
+    assert [statement.split()[0] for statement, _ in escritas if "encomendas_produtos" in statement] == ["UPDATE"]
+    assert itens(db, encomenda.encomenda_id)[1] == 4
+    assert atualizada.valor_total == 2 * (len(PRODUTOS) + 3)
+    assert atualizada.versao == versao + 1
+
+    # Remove uma linha e altera outra
+    novas = {**{str(produto_id): 1 for produto_id in PRODUTOS if produto_id != 2}, "1": 2}
+    crud.update_encomenda(db, encomenda.encomenda_id, EncomendaUpdate(produtos=novas))
+    assert itens(db, encomenda.encomenda_id) == {int(produto_id): quantidade for produto_id, quantidade in novas.items()}
+    assert crud.diferencas_resumos(db) == []
+
+
+def test_produto_invalido_nao_altera_a_encomenda(db):
+    encomenda = crud.create_encomenda(db, EncomendaIn(cliente_id=1, produtos={"10": 1, "11": 2}, localizacaoAtual="Depósito"))
+
+    with pytest.raises(ValueError):
+        crud.update_encomenda(db, encomenda.encomenda_id, EncomendaUpdate(produtos={"10": 5, "999": 1}))
+
+    assert itens(db, encomenda.encomenda_id) == {10: 1, 11: 2}
+    assert db.get(models.Encomenda, encomenda.encomenda_id).valor_total == 6